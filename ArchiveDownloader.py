@@ -0,0 +1,291 @@
+import logging
+import os
+import struct
+import tarfile
+import time
+import zlib
+
+import requests
+
+from FileBrowserClient import FileBrowserClient, FileBrowserError, DEFAULT_CHUNK_SIZE
+from Defaults import ARCHIVE_FORMATS
+
+"""
+Server-side archive download of a directory through /api/raw/<dir>?algo=...
+The archive is either saved as-is or extracted incrementally while it streams in: memory stays constant whatever the
+archive size and no temporary archive file is written.
+"""
+
+logger = logging.getLogger()
+
+STREAM_EXTRACTABLE = ('zip', 'tar', 'targz', 'tarbz2', 'tarxz')
+
+_LOCAL_HEADER = b'PK\x03\x04'
+_DATA_DESCRIPTOR = b'PK\x07\x08'
+_END_SIGNATURES = (b'PK\x01\x02', b'PK\x05\x06', b'PK\x06\x06', b'PK\x06\x07')
+_BLOCK_SIZE = 65536
+
+
+class ArchiveDownloader:
+    def __init__(self, client: FileBrowserClient, algo='zip', chunk_size=DEFAULT_CHUNK_SIZE):
+        if algo not in ARCHIVE_FORMATS:
+            raise ValueError(f'Unknown archive format {algo}, expected one of {tuple(ARCHIVE_FORMATS)}')
+        self.client = client
+        self.algo = algo
+        self.chunk_size = chunk_size
+
+    def download(self, target_path, local_path, extract=True):
+        if extract and self.algo not in STREAM_EXTRACTABLE:
+            raise FileBrowserError(f'{self.algo} archives cannot be extracted while streaming, '
+                                   f'save them as-is or use one of {STREAM_EXTRACTABLE}', 19)
+        url = f'{self.client.get_download_link(target_path)}&algo={self.algo}'
+        logger.info(f'Downloading {target_path} as a {self.algo} archive to {local_path}...')
+        start = time.perf_counter()
+        try:
+            with self.client.session.get(url, headers={'Accept-Encoding': 'identity'}, stream=True) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                counter = _CountingReader(response.raw)
+                if not extract:
+                    with open(local_path, 'wb') as file:
+                        while block := counter.read(self.chunk_size):
+                            file.write(block)
+                else:
+                    os.makedirs(local_path, exist_ok=True)
+                    # archives are rooted at the directory name, strip it so the result matches a folder download
+                    prefix = os.path.basename(target_path.rstrip('/')) + '/'
+                    if self.algo == 'zip':
+                        files = _extract_zip_stream(counter, local_path, prefix)
+                    else:
+                        files = _extract_tar_stream(counter, local_path, prefix, ARCHIVE_FORMATS[self.algo])
+        except requests.exceptions.RequestException as error:
+            raise FileBrowserError(f'Error while downloading archive: {str(error)}', 19) from error
+        except (tarfile.TarError, zlib.error, ValueError, EOFError) as error:
+            raise FileBrowserError(f'Error while extracting archive: {str(error)}', 19) from error
+
+        elapsed = time.perf_counter() - start
+        rate = counter.count / elapsed / 1048576 if elapsed > 0 else 0.0
+        if extract:
+            logger.info(f'Archive extracted: {files} files, {counter.count} archive bytes, {elapsed:.2f}s, '
+                        f'{rate:.2f} MB/s')
+        else:
+            logger.info(f'Archive saved: {counter.count} bytes, {elapsed:.2f}s, {rate:.2f} MB/s')
+
+
+class _CountingReader:
+    def __init__(self, raw):
+        self.raw = raw
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.count += len(data)
+        return data
+
+
+# Reader with a push back buffer, used to hand back bytes read past the end of a zip entry
+class _PushbackReader:
+    def __init__(self, raw):
+        self.raw = raw
+        self.buffer = b''
+
+    def read(self, size):
+        if self.buffer:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+            return data
+        return self.raw.read(size)
+
+    def read_exact(self, size):
+        data = self.read(size)
+        while len(data) < size:
+            more = self.read(size - len(data))
+            if not more:
+                raise EOFError('Unexpected end of archive')
+            data += more
+        return data
+
+    def unread(self, data):
+        self.buffer = data + self.buffer
+
+
+# Resolve an archive member name below dest, refusing absolute paths and parent references
+def _safe_path(dest, name, prefix):
+    if name.startswith(prefix) or name == prefix.rstrip('/'):
+        name = name[len(prefix):]
+    parts = [part for part in name.replace('\\', '/').split('/') if part not in ('', '.')]
+    if not parts:
+        return None
+    if '..' in parts or os.path.isabs(name) or ':' in parts[0]:
+        raise ValueError(f'Refusing unsafe archive member {name!r}')
+    return os.path.join(dest, *parts)
+
+
+def _extract_tar_stream(stream, dest, prefix, mode):
+    files = 0
+    with tarfile.open(fileobj=stream, mode=mode) as archive:
+        for member in archive:
+            if not (member.isfile() or member.isdir()):
+                logger.warning(f'Skipping archive member {member.name}: links and special files are not extracted')
+                continue
+            path = _safe_path(dest, member.name, prefix)
+            if path is None:
+                continue
+            if member.isdir():
+                os.makedirs(path, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            source = archive.extractfile(member)
+            with open(path, 'wb') as file:
+                while block := source.read(_BLOCK_SIZE):
+                    file.write(block)
+            os.utime(path, (member.mtime, member.mtime))
+            files += 1
+    return files
+
+
+# Extract a zip archive sequentially from its local file headers, without seeking to the central directory
+def _extract_zip_stream(stream, dest, prefix):
+    reader = _PushbackReader(stream)
+    files = 0
+    while True:
+        signature = reader.read_exact(4)
+        if signature in _END_SIGNATURES:
+            # central directory reached, drain it so the connection can be reused
+            while reader.read(_BLOCK_SIZE):
+                pass
+            return files
+        if signature != _LOCAL_HEADER:
+            raise ValueError(f'Unexpected zip signature {signature!r}')
+
+        (_, flags, method, _, _, crc, compressed_size, size, name_length,
+         extra_length) = struct.unpack('<HHHHHIIIHH', reader.read_exact(26))
+        raw_name = reader.read_exact(name_length)
+        extra = reader.read_exact(extra_length)
+        name = raw_name.decode('utf-8' if flags & 0x800 else 'cp437')
+        zip64 = compressed_size == 0xFFFFFFFF or size == 0xFFFFFFFF
+        if zip64:
+            compressed_size, size = _zip64_sizes(extra, compressed_size, size)
+        has_descriptor = bool(flags & 0x08)
+
+        path = _safe_path(dest, name, prefix)
+        is_dir = name.endswith('/')
+        if path is not None and is_dir:
+            os.makedirs(path, exist_ok=True)
+        elif path is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(os.devnull if path is None or is_dir else path, 'wb') as file:
+            if method == 8:
+                actual_crc, written = _inflate_entry(reader, file)
+            elif method == 0 and not has_descriptor:
+                actual_crc, written = _copy_entry(reader, file, compressed_size)
+            elif method == 0:
+                actual_crc, written = _copy_entry_until_descriptor(reader, file, zip64)
+            else:
+                raise ValueError(f'Unsupported zip compression method {method} for {name}')
+
+        if has_descriptor:
+            crc, _, size = _read_descriptor(reader, zip64, written)
+        if actual_crc != crc or written != size:
+            raise ValueError(f'Corrupted zip entry {name}')
+        if path is not None and not is_dir:
+            files += 1
+
+
+def _zip64_sizes(extra, compressed_size, size):
+    position = 0
+    while position + 4 <= len(extra):
+        header_id, length = struct.unpack('<HH', extra[position:position + 4])
+        data = extra[position + 4:position + 4 + length]
+        if header_id == 0x0001:
+            values = list(struct.unpack(f'<{len(data) // 8}Q', data[:len(data) // 8 * 8]))
+            if size == 0xFFFFFFFF and values:
+                size = values.pop(0)
+            if compressed_size == 0xFFFFFFFF and values:
+                compressed_size = values.pop(0)
+            break
+        position += 4 + length
+    return compressed_size, size
+
+
+def _inflate_entry(reader, file):
+    decompressor = zlib.decompressobj(-15)
+    crc = 0
+    written = 0
+    while not decompressor.eof:
+        data = reader.read(_BLOCK_SIZE)
+        if not data:
+            raise EOFError('Unexpected end of archive')
+        # bound the output of each step so a highly compressed entry cannot blow up memory
+        while data and not decompressor.eof:
+            output = decompressor.decompress(data, _BLOCK_SIZE)
+            crc = zlib.crc32(output, crc)
+            written += len(output)
+            file.write(output)
+            data = decompressor.unconsumed_tail
+    if decompressor.unused_data:
+        reader.unread(decompressor.unused_data)
+    return crc, written
+
+
+def _copy_entry(reader, file, remaining):
+    crc = 0
+    written = 0
+    while remaining:
+        data = reader.read(min(remaining, _BLOCK_SIZE))
+        if not data:
+            raise EOFError('Unexpected end of archive')
+        crc = zlib.crc32(data, crc)
+        written += len(data)
+        remaining -= len(data)
+        file.write(data)
+    return crc, written
+
+
+# Stored entries with a data descriptor do not announce their size: scan for a descriptor signature whose crc and
+# size match the bytes seen so far
+def _copy_entry_until_descriptor(reader, file, zip64):
+    crc = 0
+    written = 0
+    buffer = b''
+    search_from = 0
+    while True:
+        index = buffer.find(_DATA_DESCRIPTOR, search_from)
+        if index >= 0:
+            descriptor_format = _descriptor_format(zip64, written + index)
+            descriptor_end = index + 4 + struct.calcsize(descriptor_format)
+            if len(buffer) >= descriptor_end:
+                candidate_crc, candidate_size, _ = struct.unpack(descriptor_format, buffer[index + 4:descriptor_end])
+                entry_crc = zlib.crc32(buffer[:index], crc)
+                if candidate_size == written + index and candidate_crc == entry_crc:
+                    file.write(buffer[:index])
+                    reader.unread(buffer[index:])
+                    return entry_crc, written + index
+                search_from = index + 1
+                continue
+        # everything before a possible (partial) signature is entry data
+        keep_from = index if index >= 0 else max(len(buffer) - 3, 0)
+        if keep_from:
+            file.write(buffer[:keep_from])
+            crc = zlib.crc32(buffer[:keep_from], crc)
+            written += keep_from
+            buffer = buffer[keep_from:]
+        search_from = 0
+        data = reader.read(_BLOCK_SIZE)
+        if not data:
+            raise EOFError('Unexpected end of archive')
+        buffer += data
+
+
+# Writers only announce zip64 in the local header when they know the size up front, an entry that grew past 4 GiB
+# always gets a zip64 descriptor
+def _descriptor_format(zip64, size):
+    return '<IQQ' if zip64 or size >= 0xFFFFFFFF else '<III'
+
+
+def _read_descriptor(reader, zip64, size):
+    descriptor_format = _descriptor_format(zip64, size)
+    head = reader.read_exact(4)
+    if head == _DATA_DESCRIPTOR:
+        head = b''
+    return struct.unpack(descriptor_format, head + reader.read_exact(struct.calcsize(descriptor_format) - len(head)))
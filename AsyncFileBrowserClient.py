@@ -0,0 +1,331 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+from urllib.parse import urlparse
+
+import aiohttp
+
+import FileBrowserProtocol as protocol
+from FileBrowserClient import FileBrowserError, DEFAULT_CHUNK_SIZE, TOKEN_RENEW_MARGIN
+from TokenCache import token_expiry
+
+"""
+asyncio counterpart of FileBrowserClient for workloads issuing many operations from one event loop.
+All requests share one aiohttp connection pool, a semaphore bounds how many of them are in flight at once, and
+request bodies and downloads are streamed chunk by chunk. Requests and FileItem parsing come from FileBrowserProtocol,
+errors are raised as FileBrowserError with the exit codes of the blocking client.
+"""
+
+logger = logging.getLogger()
+
+
+class AsyncFileBrowserClient:
+    def __init__(self, home_url, username='', password='', api_url=None, token=None, verify=True, concurrency=64,
+                 pool_limit=100, pool_limit_per_host=0, token_cache=None):
+        self.home_url = home_url
+        self.hostname = urlparse(home_url).netloc
+        self.api_url = api_url or protocol.api_url_for(home_url)
+        self.username = username
+        self.password = password
+        self.verify = verify
+        self.token = token
+        self.token_cache = token_cache
+        # the semaphore bounds requests in flight, the pool limits bound open connections
+        self.concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._auth_lock = asyncio.Lock()
+        self._pool_limit = pool_limit
+        self._pool_limit_per_host = pool_limit_per_host
+        self._session = None
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        home_url = os.getenv('FILEBROWSER_HOME', 'https://demo.filebrowser.org/')
+        return cls(home_url,
+                   username=os.getenv('FILEBROWSER_USERNAME', 'demo'),
+                   password=os.getenv('FILEBROWSER_PASSWORD', 'demo'),
+                   api_url=os.getenv('FILEBROWSER_API'),
+                   **kwargs)
+
+    # The session is created on first use, inside the running event loop
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self._pool_limit, limit_per_host=self._pool_limit_per_host,
+                                             ssl=None if self.verify else False)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  headers=protocol.session_headers(self.home_url),
+                                                  timeout=aiohttp.ClientTimeout(total=None))
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    # Send a request holding a semaphore slot until the response is released. A 401 is answered by logging in again
+    # (once for all concurrent requests holding the same token) and sending the request once more. The slot is given
+    # up while logging in, the login request needs one itself.
+    @contextlib.asynccontextmanager
+    async def _request(self, method, url, headers=None, data=None):
+        response = await self._send(method, url, headers, data)
+        if response.status == 401 and self.username and not protocol.is_auth_url(self.api_url, url):
+            token = response.request_info.headers.get('X-Auth')
+            self._release(response)
+            async with self._auth_lock:
+                if self.token == token:
+                    logger.info('Access token rejected by the server, logging in again...')
+                    await self._login()
+            response = await self._send(method, url, headers, data)
+        try:
+            yield response
+        finally:
+            self._release(response)
+
+    async def _send(self, method, url, headers, data):
+        await self._semaphore.acquire()
+        try:
+            return await self._get_session().request(method, url, data=data,
+                                                     headers={**(headers or {}), **protocol.auth_headers(self.token)})
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    def _release(self, response):
+        response.release()
+        self._semaphore.release()
+
+    async def _login(self) -> str:
+        logger.info('Requesting access token...')
+        url, headers, body = protocol.login_request(self.api_url, self.home_url, self.hostname, self.username,
+                                                    self.password)
+        try:
+            async with self._request('POST', url, headers=headers, data=body) as response:
+                response.raise_for_status()
+                token = protocol.decode_token(await response.read(), response.charset)
+        except aiohttp.ClientError as error:
+            raise FileBrowserError(f"Error while requesting access token: {str(error)}", 13) from error
+        if not token:
+            raise FileBrowserError('No access token received. Aborting.', 20)
+        logger.info('Access token received.')
+        self.token = token
+        if self.token_cache is not None:
+            self.token_cache.put(self.api_url, self.username, token)
+        return token
+
+    async def login(self) -> str:
+        async with self._auth_lock:
+            return await self._login()
+
+    # Exchange the current token for a fresh one, None if the server rejects it (401)
+    async def renew(self):
+        logger.info('Renewing access token...')
+        url, headers = protocol.renew_request(self.api_url)
+        try:
+            async with self._request('POST', url, headers=headers) as response:
+                if response.status == 401:
+                    return None
+                response.raise_for_status()
+                token = protocol.decode_token(await response.read(), response.charset)
+        except aiohttp.ClientError as error:
+            raise FileBrowserError(f"Error while renewing access token: {str(error)}", 13) from error
+        if not token:
+            return None
+        self.token = token
+        if self.token_cache is not None:
+            self.token_cache.put(self.api_url, self.username, token)
+        return token
+
+    # Same policy as FileBrowserClient.authenticate: reuse, renew shortly before expiry, log in otherwise
+    async def authenticate(self) -> str:
+        async with self._auth_lock:
+            token = self.token
+            if not token and self.token_cache is not None:
+                token = self.token_cache.get(self.api_url, self.username)
+            expiry = token_expiry(token) if token else None
+            if expiry is None or expiry <= time.time():
+                return await self._login()
+            self.token = token
+            if expiry - time.time() > TOKEN_RENEW_MARGIN:
+                logger.debug('Reusing cached access token.')
+                return token
+            return await self.renew() or await self._login()
+
+    async def create_folder(self, target_path: str, override=False):
+        logger.debug(f'Creating folder at {target_path}')
+        request_url, headers = protocol.create_folder_request(self.api_url, target_path, override)
+        try:
+            async with self._request('POST', request_url, headers=headers) as response:
+                response.raise_for_status()
+        except aiohttp.ClientError as error:
+            raise FileBrowserError(f"Error while creating folder at {target_path}: {str(error)}", 15) from error
+        logger.info(f'Folder created successfully at {target_path}.')
+
+    async def get_file_info(self, target_path, allow_empty=True):
+        try:
+            async with self._request('GET', protocol.resource_url(self.api_url, target_path)) as response:
+                body = await response.read()
+                status = response.status
+        except aiohttp.ClientError as error:
+            raise FileBrowserError(f"Error while getting file info: {str(error)}", 18) from error
+        if status >= 400:
+            if allow_empty and status == 404:
+                return None, []
+            raise FileBrowserError(f"Error while getting file info: {status} - {body.decode(errors='replace')}",
+                                   18)
+        return protocol.parse_resource(json.loads(body))
+
+    # Children of a listing as they are parsed from the response body, the listed resource itself is only known at the
+    # end of the body and handed to on_current. Nothing is yielded if the path does not exist.
+    async def iter_file_info(self, target_path, on_current=None, chunk_size=65536):
+        parser = protocol.ListingParser()
+        try:
+            async with self._request('GET', protocol.resource_url(self.api_url, target_path)) as response:
+                if response.status == 404:
+                    return
+                response.raise_for_status()
+                async for data in response.content.iter_chunked(chunk_size):
+                    for item in parser.feed(data):
+                        yield item
+            for item in parser.close():
+                yield item
+        except aiohttp.ClientError as error:
+            raise FileBrowserError(f"Error while getting file info: {str(error)}", 18) from error
+        except ValueError as error:
+            raise FileBrowserError(f"Malformed file info response: {str(error)}", 18) from error
+        if on_current is not None:
+            on_current(parser.current)
+
+    async def check_remote_exists(self, target_path) -> bool:
+        current_file, _ = await self.get_file_info(target_path)
+        return current_file is not None
+
+    # Upload a file through the TUS endpoint. Chunks are read off the event loop, each PATCH is retried up to
+    # max_attempts times and continues from the server offset reported by HEAD after a failure.
+    async def upload_file(self, file_path, target_path, override=False, max_attempts=3,
+                          chunk_size=DEFAULT_CHUNK_SIZE):
+        logger.info(f'Uploading file {file_path} to remote {target_path}')
+        request_url = protocol.tus_url(self.api_url, target_path, override)
+        loop = asyncio.get_running_loop()
+        file_size = (await loop.run_in_executor(None, os.stat, file_path)).st_size
+        if not override and await self.check_remote_exists(target_path):
+            raise FileBrowserError(f'Remote path already exists at {target_path}. Aborting.', 11)
+        try:
+            async with self._request('POST', request_url,
+                                     headers=protocol.tus_create_headers(file_size)) as response:
+                response.raise_for_status()
+        except aiohttp.ClientError as error:
+            raise FileBrowserError(f'Error while uploading file: {str(error)}', 16) from error
+
+        completed = False
+        try:
+            with open(file_path, 'rb') as file:
+                offset = 0
+                while offset < file_size:
+                    await loop.run_in_executor(None, file.seek, offset)
+                    chunk = await loop.run_in_executor(None, file.read, min(chunk_size, file_size - offset))
+                    if not chunk:
+                        raise IOError(f'{file_path} was truncated during upload at offset {offset}')
+                    offset = await self._upload_chunk(request_url, chunk, offset, max_attempts)
+            completed = True
+            logger.info('File uploaded successfully.')
+        except IOError as error:
+            raise FileBrowserError(f'Error while uploading file: {str(error)}', 16) from error
+        finally:
+            if not completed:
+                logger.info('deleting unfinished file because of a failure...')
+                await self.delete_file(target_path)
+
+    async def _upload_chunk(self, request_url, chunk, offset, max_attempts) -> int:
+        headers = protocol.chunk_headers()
+        headers['Upload-Offset'] = str(offset)
+        attempt = 0
+        while True:
+            try:
+                async with self._request('PATCH', request_url, headers=headers, data=chunk) as response:
+                    response.raise_for_status()
+                    server_offset = protocol.upload_offset(response.headers)
+                return offset + len(chunk) if server_offset is None else server_offset
+            except aiohttp.ClientError as error:
+                attempt += 1
+                logger.error(f'Error while uploading chunk at {offset}, attempt {attempt}/{max_attempts}: {error}')
+                if attempt >= max_attempts:
+                    raise FileBrowserError(f'Max attempts reached while processing chunk at {offset}. Aborting.',
+                                           16) from error
+                server_offset = await self.tus_offset(request_url)
+                if server_offset is not None and server_offset != offset:
+                    logger.info(f'Server reports upload offset {server_offset}, continuing from there.')
+                    return server_offset
+
+    # Ask the server how many bytes of the upload it already has, None if it does not know the upload
+    async def tus_offset(self, request_url):
+        try:
+            async with self._request('HEAD', request_url, headers=protocol.tus_head_headers()) as response:
+                if response.status >= 400:
+                    return None
+                return protocol.upload_offset(response.headers)
+        except aiohttp.ClientError as error:
+            logger.debug(f'Could not read the upload offset: {error}')
+            return None
+
+    async def delete_file(self, target_path):
+        try:
+            async with self._request('DELETE', protocol.tus_url(self.api_url, target_path)):
+                pass
+        except aiohttp.ClientError as error:
+            logger.error(f'Error while deleting {target_path}: {str(error)}')
+
+    # Delete a file or a whole directory through the resources endpoint
+    async def delete_resource(self, target_path):
+        try:
+            async with self._request('DELETE', protocol.resource_url(self.api_url, target_path)) as response:
+                response.raise_for_status()
+        except aiohttp.ClientError as error:
+            raise FileBrowserError(f'Error while deleting {target_path}: {str(error)}', 21) from error
+        logger.info(f'Deleted {target_path}.')
+
+    # Server side copy and move (rename) of a file or directory
+    async def copy_resource(self, source_path, destination_path, override=False):
+        await self._patch_resource('copy', source_path, destination_path, override)
+
+    async def move_resource(self, source_path, destination_path, override=False):
+        await self._patch_resource('rename', source_path, destination_path, override)
+
+    async def _patch_resource(self, action, source_path, destination_path, override):
+        url = protocol.patch_resource_url(self.api_url, source_path, action, destination_path, override)
+        try:
+            async with self._request('PATCH', url) as response:
+                response.raise_for_status()
+        except aiohttp.ClientError as error:
+            verb = 'copying' if action == 'copy' else 'moving'
+            raise FileBrowserError(f'Error while {verb} {source_path} to {destination_path}: {str(error)}',
+                                   24) from error
+
+    def get_download_link(self, target_path):
+        return protocol.raw_url(self.api_url, target_path, self.token)
+
+    # Stream a remote file as chunks of at most chunk_size bytes
+    async def iter_download(self, target_path, chunk_size=DEFAULT_CHUNK_SIZE):
+        try:
+            async with self._request('GET', self.get_download_link(target_path)) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    yield chunk
+        except aiohttp.ClientError as error:
+            raise FileBrowserError(f'Error while requesting file download: {str(error)}', 19) from error
+
+    async def download_file(self, target_path, local_download_path, chunk_size=DEFAULT_CHUNK_SIZE):
+        logger.info(f'Downloading file {target_path} to {local_download_path}...')
+        loop = asyncio.get_running_loop()
+        with open(local_download_path, 'wb') as file:
+            async for chunk in self.iter_download(target_path, chunk_size):
+                await loop.run_in_executor(None, file.write, chunk)
+        logger.info('File downloaded successfully.')
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from FileBrowserClient import FileBrowserClient, FileBrowserError, DEFAULT_CHUNK_SIZE
+from FolderDownloader import FolderDownloader
+from MetadataCache import normalize
+from TransferMetrics import JsonEventWriter
+
+"""
+Batch execution of many operations in one warm process.
+Operations are JSON objects, one per line, read from a manifest file or from stdin. They run on a bounded thread pool
+sharing the client (token, connection pool, caches) and every operation produces one 'result' JSON line, in completion
+order. Operations touching the same path, or a path inside the other's, run one after the other in manifest order;
+all others run concurrently in no particular order. Fields follow the command line arguments:
+    {"id": "a", "op": "upload", "file_path": "local.bin", "target_path": "/remote/local.bin", "override": true}
+    {"id": "b", "op": "download", "target_path": "/remote/local.bin", "local_download_path": "copy.bin"}
+    {"id": "c", "op": "getfileinfo", "target_path": "/remote"}
+    {"id": "d", "op": "getdownloadlink", "target_path": "/remote/local.bin"}
+    {"id": "e", "op": "copy", "target_path": "/remote/local.bin", "destination_path": "/backup/local.bin"}
+    {"id": "f", "op": "move", "target_path": "/remote/local.bin", "destination_path": "/archive/local.bin"}
+    {"id": "g", "op": "delete", "target_path": "/remote/local.bin"}
+"""
+
+logger = logging.getLogger()
+
+OPERATIONS = ('upload', 'download', 'getfileinfo', 'getdownloadlink', 'copy', 'move', 'delete')
+
+
+class BatchRunner:
+    def __init__(self, client: FileBrowserClient, workers=4, max_attempts=3, chunk_size=DEFAULT_CHUNK_SIZE,
+                 writer: JsonEventWriter = None, renew=False):
+        self.client = client
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.chunk_size = chunk_size
+        self.writer = writer or JsonEventWriter()
+        # a long running process re-checks the token before every operation, so it is renewed before it expires
+        self.renew = renew
+
+    # Run the operations of an iterable of lines, at most two per worker are read ahead. Returns (ok, failed) counts
+    def run(self, lines):
+        ok = failed = 0
+        pending = set()
+        pending_paths = {}
+        start = time.perf_counter()
+
+        def collect(done):
+            nonlocal ok, failed
+            for future in done:
+                pending.discard(future)
+                pending_paths.pop(future, None)
+                if future.result()['ok']:
+                    ok += 1
+                else:
+                    failed += 1
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='batch') as pool:
+            try:
+                for number, line in enumerate(lines, 1):
+                    if not line.strip():
+                        continue
+                    while len(pending) >= self.workers * 2:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    # earlier operations are queued first, so a worker never waits on one that cannot start
+                    paths = _operation_paths(line)
+                    after = [future for future in pending if _overlap(paths, pending_paths[future])]
+                    future = pool.submit(self._run_line, number, line, after)
+                    pending.add(future)
+                    pending_paths[future] = paths
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+            except KeyboardInterrupt:
+                for future in pending:
+                    future.cancel()
+                raise
+        self.writer.emit('batch_end', operations=ok + failed, ok=ok, failed=failed,
+                         seconds=round(time.perf_counter() - start, 6))
+        return ok, failed
+
+    def _run_line(self, number, line, after=()) -> dict:
+        if after:
+            wait(after)
+        start = time.perf_counter()
+        operation_id, op = number, None
+        try:
+            try:
+                operation = json.loads(line)
+            except ValueError as error:
+                raise FileBrowserError(f'Invalid JSON on line {number}: {error}', 17)
+            if not isinstance(operation, dict):
+                raise FileBrowserError(f'Line {number} is not a JSON object', 17)
+            operation_id, op = operation.get('id', number), operation.get('op')
+            if self.renew:
+                self.client.authenticate()
+            result = {'ok': True, 'result': self.execute(operation)}
+        except FileBrowserError as error:
+            logger.error(f'Operation {operation_id} failed: {error}')
+            result = {'ok': False, 'error': str(error), 'exit_code': error.exit_code}
+        except (OSError, ValueError, TypeError) as error:
+            logger.error(f'Operation {operation_id} failed: {error}')
+            result = {'ok': False, 'error': str(error), 'exit_code': 1}
+        result = {'id': operation_id, 'op': op, **result, 'seconds': round(time.perf_counter() - start, 6)}
+        self.writer.emit('result', **result)
+        return result
+
+    # Execute one operation and return its JSON serializable result
+    def execute(self, operation: dict):
+        op = operation.get('op')
+        if op not in OPERATIONS:
+            raise FileBrowserError(f"Unknown operation '{op}', expected one of {OPERATIONS}", 17)
+        target_path = _required(operation, 'target_path')
+        max_attempts = operation.get('max_attempts', self.max_attempts)
+        chunk_size = operation.get('chunk_size', self.chunk_size)
+
+        if op == 'upload':
+            file_path = _required(operation, 'file_path')
+            self.client.upload_file_or_folder(file_path, target_path, operation.get('override', False),
+                                              max_attempts, chunk_size)
+            return {'target_path': target_path, 'bytes': _local_size(file_path)}
+
+        if op == 'download':
+            local_path = _required(operation, 'local_download_path')
+            current, _ = self.client.get_file_info(target_path, allow_empty=False)
+            if current.isDir:
+                # one worker per operation, the concurrency comes from running operations side by side
+                report = FolderDownloader(self.client, workers=1, list_workers=1, chunk_size=chunk_size).download(
+                    target_path, local_path, current)
+                if not report.ok:
+                    raise FileBrowserError(f'{len(report.failures)} downloads failed.', 19)
+                return {'local_download_path': local_path, 'bytes': report.bytes_downloaded,
+                        'files': report.files_downloaded}
+            self.client.download_file(target_path, local_path, chunk_size)
+            return {'local_download_path': local_path, 'bytes': current.size}
+
+        if op == 'getfileinfo':
+            current, children = self.client.get_file_info(target_path, allow_empty=False)
+            return {'current': current.to_dict(), 'items': [child.to_dict() for child in children]}
+
+        if op == 'getdownloadlink':
+            return {'link': self.client.get_download_link(target_path)}
+
+        if op in ('copy', 'move'):
+            destination_path = _required(operation, 'destination_path')
+            transfer = self.client.copy_resource if op == 'copy' else self.client.move_resource
+            transfer(target_path, destination_path, operation.get('override', False))
+            return {'target_path': target_path, 'destination_path': destination_path}
+
+        self.client.delete_resource(target_path)
+        return {'target_path': target_path}
+
+
+# Remote and local paths of an operation line as prefixes ending with /, empty when the line is not an operation
+def _operation_paths(line) -> tuple:
+    try:
+        operation = json.loads(line)
+    except ValueError:
+        return ()
+    if not isinstance(operation, dict):
+        return ()
+    paths = []
+    for field in ('target_path', 'destination_path'):
+        if isinstance(operation.get(field), str):
+            key = normalize(operation[field])
+            paths.append('remote:/' + (key + '/' if key else ''))
+    for field in ('file_path', 'local_download_path'):
+        if isinstance(operation.get(field), str):
+            paths.append('local:' + os.path.abspath(operation[field]).replace(os.sep, '/').rstrip('/') + '/')
+    return tuple(paths)
+
+
+def _overlap(paths, others) -> bool:
+    return any(path.startswith(other) or other.startswith(path) for path in paths for other in others)
+
+
+def _required(operation: dict, field: str):
+    value = operation.get(field)
+    if not value:
+        raise FileBrowserError(f"Operation {operation.get('op')} needs '{field}'", 17)
+    return value
+
+
+def _local_size(path) -> int:
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
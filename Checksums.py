@@ -0,0 +1,37 @@
+import hashlib
+
+from Defaults import ALGORITHMS, DEFAULT_ALGORITHM
+
+"""
+Checksums for transfer verification, with the algorithms FileBrowser computes server side through
+/api/resources/<path>?checksum=<algorithm>. Hashers are fed with the buffers of the transfer itself, file_digest is
+only for data that did not pass through the client (the uploaded prefix of a resumed upload, segmented downloads).
+"""
+
+
+def new_hasher(algorithm: str):
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f'Unsupported checksum algorithm {algorithm}, expected one of {ALGORITHMS}')
+    return hashlib.new(algorithm)
+
+
+# Feed a hasher with length bytes of a file starting at offset, through one reusable buffer
+def update_from_file(hasher, file_path, offset=0, length=None, buffer_size=1048576):
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(file_path, 'rb') as file:
+        file.seek(offset)
+        remaining = length
+        while remaining is None or remaining > 0:
+            read = file.readinto(view if remaining is None or remaining >= buffer_size else view[:remaining])
+            if not read:
+                break
+            hasher.update(view[:read])
+            if remaining is not None:
+                remaining -= read
+    view.release()
+    return hasher
+
+
+def file_digest(file_path, algorithm=DEFAULT_ALGORITHM) -> str:
+    return update_from_file(new_hasher(algorithm), file_path).hexdigest()
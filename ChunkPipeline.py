@@ -0,0 +1,121 @@
+import queue
+import threading
+
+"""
+Double-buffered chunk reader for uploads.
+A background thread fills a fixed pool of reusable bytearray buffers with readinto() while the caller sends the
+previous chunk, so disk reads overlap network sends and memory is bounded by depth * chunk_size. With a chunk_length
+callable (adaptive sizing) each chunk asks for its length when it is read and buffers grow on demand up to chunk_size.
+"""
+
+DEFAULT_DEPTH = 2
+
+
+# Bytes of buffer memory an upload of a file holds, used to budget concurrent uploads
+def buffer_bytes(size: int, chunk_size: int, depth=DEFAULT_DEPTH) -> int:
+    if size <= chunk_size:
+        return max(size, 1)
+    return chunk_size * depth
+
+
+class ChunkPipeline:
+    def __init__(self, file, chunk_size: int, size: int, offset=0, depth=DEFAULT_DEPTH, chunk_length=None):
+        self.file = file
+        self.size = size
+        self.chunk_size = chunk_size
+        self.chunk_length = chunk_length
+        remaining = max(size - offset, 0)
+        # a file that fits in one chunk needs neither a second buffer nor one larger than the file
+        buffer_size = 0 if chunk_length is not None else min(chunk_size, remaining)
+        self.depth = depth if remaining > chunk_size or chunk_length is not None else 1
+        self._free = queue.Queue()
+        for _ in range(self.depth):
+            self._free.put(bytearray(buffer_size))
+        self._current = None
+        self._thread = None
+        self._start(offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _start(self, offset):
+        self._stop = threading.Event()
+        self._filled = queue.Queue()
+        self._thread = threading.Thread(target=self._read, args=(offset, self._stop, self._filled),
+                                        name='chunk-reader', daemon=True)
+        self._thread.start()
+
+    def _read(self, offset, stop, filled):
+        try:
+            self.file.seek(offset)
+            while offset < self.size:
+                buffer = self._free.get()
+                if stop.is_set():
+                    self._free.put(buffer)
+                    return
+                want = min(self.chunk_size, self.size - offset)
+                if self.chunk_length is not None:
+                    want = min(max(self.chunk_length(), 1), want)
+                    if len(buffer) < want:
+                        buffer = bytearray(want)
+                view = memoryview(buffer)[:min(len(buffer), want)]
+                length = 0
+                while length < len(view):
+                    read = self.file.readinto(view[length:])
+                    if not read:
+                        break
+                    length += read
+                view.release()
+                if not length:
+                    self._free.put(buffer)
+                    raise IOError(f'{self.file.name} was truncated during upload at offset {offset}')
+                filled.put((offset, buffer, length))
+                offset += length
+            filled.put(None)
+        except BaseException as error:
+            filled.put(error)
+
+    # Next (offset, memoryview) chunk, None at the end of the file. The view stays valid until release()
+    def next(self):
+        item = self._filled.get()
+        if isinstance(item, BaseException):
+            raise item
+        if item is None:
+            return None
+        offset, self._current, length = item
+        return offset, memoryview(self._current)[:length]
+
+    def release(self):
+        if self._current is not None:
+            self._free.put(self._current)
+            self._current = None
+
+    # Stop the reader and hand every buffer back to the pool
+    def _stop_reader(self):
+        self._stop.set()
+        self.release()
+        self._drain()
+        self._thread.join()
+        self._drain()
+
+    def _drain(self):
+        while True:
+            try:
+                item = self._filled.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(item, tuple):
+                self._free.put(item[1])
+
+    # Continue from another offset, e.g. the one reported by the server after a failed chunk
+    def seek(self, offset):
+        self._stop_reader()
+        self._start(offset)
+
+    def close(self):
+        if self._thread is not None:
+            self._stop_reader()
+            self._thread = None
@@ -0,0 +1,67 @@
+import logging
+import threading
+from collections import Counter
+
+from Defaults import DEFAULT_MIN_CHUNK_SIZE, DEFAULT_MAX_CHUNK_SIZE
+
+"""
+Adaptive TUS chunk sizing.
+Every PATCH reports its size and duration; the chunk size follows the measured throughput so that one PATCH takes
+about target_seconds, growing at most 2x per step, and halves after a failure with growth paused for a few chunks.
+"""
+
+logger = logging.getLogger()
+
+_ALIGNMENT = 65536
+
+
+class AdaptiveChunkSizer:
+    def __init__(self, min_size=DEFAULT_MIN_CHUNK_SIZE, max_size=DEFAULT_MAX_CHUNK_SIZE, initial_size=4194304,
+                 target_seconds=2.0, cooldown=4):
+        if min_size <= 0 or max_size < min_size:
+            raise ValueError(f'Invalid chunk size bounds {min_size}..{max_size}')
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_seconds = target_seconds
+        self.cooldown = cooldown
+        self.size = self._clamp(initial_size)
+        self.sizes_used = Counter()
+        self._paused = 0
+        self._lock = threading.Lock()
+
+    def _clamp(self, size) -> int:
+        size = int(size) // _ALIGNMENT * _ALIGNMENT
+        return max(self.min_size, min(self.max_size, size))
+
+    def next_size(self) -> int:
+        return self.size
+
+    def record_success(self, length: int, seconds: float):
+        with self._lock:
+            # a short final chunk says little about the link
+            if length < self.size // 2 or seconds <= 0:
+                return
+            self.sizes_used[length] += 1
+            throughput = length / seconds
+            ideal = throughput * self.target_seconds
+            if self._paused:
+                self._paused -= 1
+                ideal = min(ideal, self.size)
+            new_size = self._clamp(max(min(ideal, self.size * 2), self.size // 4))
+            if new_size != self.size:
+                logger.info(f'Chunk size {self.size} -> {new_size} '
+                            f'({throughput / 1048576:.2f} MB/s, {seconds:.3f}s per PATCH)')
+                self.size = new_size
+
+    def record_failure(self):
+        with self._lock:
+            new_size = self._clamp(self.size // 2)
+            self._paused = self.cooldown
+            if new_size != self.size:
+                logger.info(f'Chunk size {self.size} -> {new_size} after a failed PATCH')
+                self.size = new_size
+
+    def summary(self) -> str:
+        with self._lock:
+            used = ', '.join(f'{size}x{count}' for size, count in sorted(self.sizes_used.items()))
+        return f'current {self.size}, used {used or "none"}'
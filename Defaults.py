@@ -0,0 +1,36 @@
+import os
+
+"""
+Constants shared by the command line and the client modules.
+Only the standard library is imported here, so api.py can build and parse its arguments before requests, urllib3 and
+the transfer modules are loaded.
+"""
+
+UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:135.0) Gecko/20100101 Firefox/135.0"
+
+DEFAULT_CHUNK_SIZE = 10485760
+
+# Bounds of the adaptive chunk size, see ChunkSizer
+DEFAULT_MIN_CHUNK_SIZE = 262144
+DEFAULT_MAX_CHUNK_SIZE = 67108864
+
+# Directory for the local state kept between invocations (upload journal, caches)
+STATE_DIR = os.getenv('FILEBROWSER_STATE_DIR', os.path.join(os.path.expanduser('~'), '.webfilebrowser'))
+
+# Checksum algorithms of /api/resources/<path>?checksum=<algorithm>, see Checksums
+ALGORITHMS = ('md5', 'sha1', 'sha256', 'sha512')
+DEFAULT_ALGORITHM = 'sha256'
+
+# Scheduling orders of FolderUploader
+ORDER_POLICIES = ('largest', 'smallest', 'walk')
+
+# algo parameter of /api/raw -> tarfile stream mode, None if it can only be saved as-is
+ARCHIVE_FORMATS = {
+    'zip': None,
+    'tar': 'r|',
+    'targz': 'r|gz',
+    'tarbz2': 'r|bz2',
+    'tarxz': 'r|xz',
+    'tarlz4': None,
+    'tarsz': None,
+}
@@ -0,0 +1,649 @@
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import FileBrowserProtocol as protocol
+from Defaults import DEFAULT_CHUNK_SIZE
+from TokenCache import token_expiry
+from ChunkPipeline import ChunkPipeline
+from Checksums import DEFAULT_ALGORITHM, new_hasher, update_from_file, file_digest
+
+"""
+Reusable FileBrowser client.
+Holds the server URLs, the access token and a pooled keep-alive requests.Session, so that every operation reuses
+warm connections instead of opening a new TCP+TLS connection per call.
+"""
+
+logger = logging.getLogger()
+
+# A cached token closer than this to its expiry (seconds) is renewed before use
+TOKEN_RENEW_MARGIN = 300
+
+
+class FileBrowserError(Exception):
+    # exit_code mirrors the exit codes of the command line tool, so the CLI can map failures back to them
+    def __init__(self, message, exit_code=1):
+        super().__init__(message)
+        self.exit_code = exit_code
+
+
+class FileBrowserClient:
+    def __init__(self, home_url, username='', password='', api_url=None, token=None, verify=True,
+                 pool_connections=4, pool_maxsize=16, pool_block=False, max_retries=0, journal=None, cache=None,
+                 token_cache=None, chunk_sizer=None, metrics=None, events=None):
+        self.home_url = home_url
+        self.hostname = urlparse(home_url).netloc
+        self.api_url = api_url or protocol.api_url_for(home_url)
+        self.username = username
+        self.password = password
+        self.verify = verify
+        self.journal = journal
+        self.cache = cache
+        self.token_cache = token_cache
+        # optional AdaptiveChunkSizer, chunk_size of the upload calls is then only the upper bound
+        self.chunk_sizer = chunk_sizer
+        # optional RequestMetrics fed with every HTTP response, and an event sink with emit(event, **fields)
+        self.metrics = metrics
+        self.events = events
+        # checksum algorithm to verify transfers with, and whether uploads skip remote files with the same checksum
+        self.verify_checksum = None
+        self.skip_identical = False
+        self._auth_lock = threading.RLock()
+
+        # one adapter per scheme, pool_connections is the number of hosts kept, pool_maxsize the connections per host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block,
+                              max_retries=max_retries)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.verify = verify
+        self.session.headers.update(protocol.session_headers(home_url))
+        self.session.hooks['response'].append(self._record_response)
+        self.session.hooks['response'].append(self._reauthenticate)
+
+        self._token = None
+        if token:
+            self.token = token
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        home_url = os.getenv('FILEBROWSER_HOME', 'https://demo.filebrowser.org/')
+        return cls(home_url,
+                   username=os.getenv('FILEBROWSER_USERNAME', 'demo'),
+                   password=os.getenv('FILEBROWSER_PASSWORD', 'demo'),
+                   api_url=os.getenv('FILEBROWSER_API'),
+                   **kwargs)
+
+    @property
+    def token(self):
+        return self._token
+
+    @token.setter
+    def token(self, value):
+        self._token = value
+        self.session.headers.pop('X-Auth', None)
+        self.session.headers.pop('Cookie', None)
+        self.session.headers.update(protocol.auth_headers(value))
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def _strip(target_path: str) -> str:
+        return protocol.strip(target_path)
+
+    # Get the access token from the FileBrowser server, only works if using http form authentication
+    def login(self) -> str:
+        logger.info('Requesting access token...')
+        url, headers, body = protocol.login_request(self.api_url, self.home_url, self.hostname, self.username,
+                                                    self.password)
+        try:
+            response = self.session.post(url, data=body, headers=headers)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as error:
+            raise FileBrowserError(f"Error while requesting access token: {str(error)}", 13) from error
+        token = protocol.decode_token(response.content, response.encoding)
+        if not token:
+            raise FileBrowserError('No access token received. Aborting.', 20)
+        logger.info('Access token received.')
+        self.token = token
+        if self.token_cache is not None:
+            self.token_cache.put(self.api_url, self.username, token)
+        return token
+
+    # Exchange the current token for a fresh one, None if the server rejects it (401)
+    def renew(self):
+        logger.info('Renewing access token...')
+        url, headers = protocol.renew_request(self.api_url)
+        try:
+            response = self.session.post(url, headers=headers)
+            if response.status_code == 401:
+                return None
+            response.raise_for_status()
+        except requests.exceptions.RequestException as error:
+            raise FileBrowserError(f"Error while renewing access token: {str(error)}", 13) from error
+        token = protocol.decode_token(response.content, response.encoding)
+        if not token:
+            return None
+        self.token = token
+        if self.token_cache is not None:
+            self.token_cache.put(self.api_url, self.username, token)
+        return token
+
+    # Make sure a usable token is set: reuse the current or cached one while it is valid, renew it shortly before it
+    # expires and only log in when there is nothing to reuse or the server rejects the renewal
+    def authenticate(self) -> str:
+        with self._auth_lock:
+            token = self.token
+            if not token and self.token_cache is not None:
+                token = self.token_cache.get(self.api_url, self.username)
+            expiry = token_expiry(token) if token else None
+            if expiry is None or expiry <= time.time():
+                return self.login()
+            self.token = token
+            if expiry - time.time() > TOKEN_RENEW_MARGIN:
+                logger.debug('Reusing cached access token.')
+                return token
+            return self.renew() or self.login()
+
+    # Response hook: a request rejected with 401 is sent once more after logging in again, unless another thread
+    # already replaced the rejected token
+    def _reauthenticate(self, response, *args, **kwargs):
+        if response.status_code != 401 or not self.username:
+            return response
+        request = response.request
+        if protocol.is_auth_url(self.api_url, request.url):
+            return response
+        if request.body is not None and not isinstance(request.body, (bytes, bytearray, memoryview, str)):
+            return response
+        with self._auth_lock:
+            if request.headers.get('X-Auth') == self.token:
+                logger.info('Access token rejected by the server, logging in again...')
+                self.login()
+        retry = request.copy()
+        retry.headers.update(protocol.auth_headers(self.token))
+        retry.hooks = {'response': [self._record_response]}
+        response.close()
+        return self.session.send(retry, **kwargs)
+
+    # Response hook: feed the request metrics, the body size of a streamed download comes from its Content-Length
+    def _record_response(self, response, *args, **kwargs):
+        if self.metrics is None:
+            return response
+        request = response.request
+        path = urlparse(request.url).path
+        endpoint = '/'.join(path.split('/')[:3]) if path.startswith('/api/') else path
+        body = request.body
+        sent = len(body) if isinstance(body, (bytes, bytearray, memoryview, str)) else 0
+        try:
+            received = int(response.headers.get('Content-Length') or 0)
+        except ValueError:
+            received = 0
+        self.metrics.record(request.method, endpoint, response.status_code, response.elapsed.total_seconds(), sent,
+                            received)
+        return response
+
+    # Connections opened so far by the pools of the session
+    def connections_opened(self) -> int:
+        opened = 0
+        for adapter in set(self.session.adapters.values()):
+            pools = getattr(adapter, 'poolmanager', None)
+            if pools is None:
+                continue
+            for key in pools.pools.keys():
+                pool = pools.pools.get(key)
+                opened += getattr(pool, 'num_connections', 0) if pool is not None else 0
+        return opened
+
+    def _emit(self, event, **fields):
+        if self.events is not None:
+            self.events.emit(event, **fields)
+
+    def create_folder(self, target_path: str, override=False):
+        if not target_path.endswith("/"):
+            target_path = target_path + "/"
+        target_path = self._strip(target_path)
+        logger.debug(f'Creating folder at {target_path}')
+        request_url, headers = protocol.create_folder_request(self.api_url, target_path, override)
+        try:
+            response = self.session.post(request_url, headers=headers)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as error:
+            raise FileBrowserError(f"Error while creating folder at {target_path}: {str(error)}", 15) from error
+        if self.cache is not None:
+            self.cache.record_write(target_path)
+        self._emit('folder_created', path=target_path)
+        logger.info(f'Folder created successfully at {target_path}.')
+
+    # With a cache the answer comes from the parent listing, which is fetched once and shared by all siblings
+    def check_remote_exists(self, target_path) -> bool:
+        logger.debug("Checking remote existence... " + target_path)
+        if self.cache is not None:
+            exists = self.cache.exists(target_path)
+            if exists is None:
+                key = target_path.strip('/')
+                self.get_file_info(key.rsplit('/', 1)[0] if '/' in key else '')
+                exists = self.cache.exists(target_path)
+            if exists is not None:
+                return exists
+        current_file, sub_files = self.get_file_info(target_path)
+        return current_file is not None
+
+    # With stream=True a ListingStream is returned instead of (current, children): the children are parsed while the
+    # body arrives and never held in memory all at once, the cache is bypassed. None if the path does not exist.
+    def get_file_info(self, target_path, allow_empty=True, stream=False):
+        target_path = self._strip(target_path)
+        if stream:
+            return self._stream_file_info(target_path, allow_empty)
+        if self.cache is not None:
+            cached = self.cache.get(target_path)
+            if cached is not None:
+                return cached
+        try:
+            response = self.session.get(protocol.resource_url(self.api_url, target_path))
+        except requests.exceptions.RequestException as error:
+            raise FileBrowserError(f"Error while getting file info: {str(error)}", 18) from error
+        logger.debug(f"status code: {response.status_code}")
+        if not response.ok:
+            logger.debug(f'get_file_info response: {response.text}')
+            if allow_empty and response.status_code == 404:
+                return None, []
+            raise FileBrowserError(f"Error while getting file info: {response.status_code} - {response.text}", 18)
+        current_file, sub_files = protocol.parse_resource(json.loads(response.text))
+        if self.cache is not None:
+            self.cache.put(target_path, current_file, sub_files)
+        return current_file, sub_files
+
+    def _stream_file_info(self, target_path, allow_empty):
+        try:
+            response = self.session.get(protocol.resource_url(self.api_url, target_path), stream=True)
+        except requests.exceptions.RequestException as error:
+            raise FileBrowserError(f"Error while getting file info: {str(error)}", 18) from error
+        if not response.ok:
+            text = response.text
+            response.close()
+            logger.debug(f'get_file_info response: {text}')
+            if allow_empty and response.status_code == 404:
+                return None
+            raise FileBrowserError(f"Error while getting file info: {response.status_code} - {text}", 18)
+        return ListingStream(response)
+
+    # Upload a file to the FileBrowser server through the TUS endpoint, with retry logic per chunk. With a journal
+    # set, an interrupted upload is kept on the server and continued from its Upload-Offset by the next call.
+    def upload_file(self, file_path, target_path, override=False, max_attempts=3, chunk_size=DEFAULT_CHUNK_SIZE):
+        target_path = self._strip(target_path)
+        logger.info(f'Uploading file {file_path} to remote {target_path}')
+        request_url = protocol.tus_url(self.api_url, target_path, override)
+        stat = os.stat(file_path)
+        file_size = stat.st_size
+        start = time.perf_counter()
+
+        offset = self._resume_offset(file_path, stat, target_path, request_url)
+        journaled = offset is not None
+        if offset is None and self.skip_identical and self._remote_identical(file_path, file_size, target_path):
+            logger.info(f'Remote {target_path} has the same checksum, skipping upload.')
+            self._emit('skipped', local=file_path, path=target_path, size=file_size)
+            return
+        if offset is None:
+            if not override and self.check_remote_exists(target_path):
+                raise FileBrowserError(f'Remote path already exists at {target_path}. Aborting.', 11)
+            try:
+                file_created = self.session.post(request_url, headers=protocol.tus_create_headers(file_size))
+                file_created.raise_for_status()
+            except requests.exceptions.RequestException as error:
+                raise FileBrowserError(f'Error while uploading file: {str(error)}', 16) from error
+            logger.debug(f"status code: {file_created.status_code} , response: {file_created.text}")
+            logger.debug('File created successfully. start uploading chunks...')
+            if self.cache is not None:
+                self.cache.record_write(target_path)
+            offset = 0
+            # a single chunk upload has nothing worth resuming, keep the journal for larger files only. An adaptive
+            # sizer may send any file larger than its minimum in several chunks
+            single_chunk = self.chunk_sizer.min_size if self.chunk_sizer is not None else chunk_size
+            if self.journal is not None and file_size > single_chunk:
+                self.journal.start(self.api_url, target_path, file_path, stat)
+                journaled = True
+        else:
+            logger.info(f'Resuming upload of {file_path} at offset {offset}/{file_size}')
+        self._emit('upload_start', local=file_path, path=target_path, size=file_size, offset=offset)
+        start_offset = offset
+        # hashed on the buffers that are sent, only the prefix of a resumed upload is read back from the file
+        hasher = new_hasher(self.verify_checksum) if self.verify_checksum else None
+        hashed = 0
+        if hasher is not None and offset:
+            update_from_file(hasher, file_path, 0, offset)
+            hashed = offset
+
+        completed = False
+        try:
+            headers = protocol.chunk_headers()
+            # the next chunk is read into a pooled buffer while the current one is being sent
+            chunk_length = self.chunk_sizer.next_size if self.chunk_sizer is not None else None
+            with open(file_path, 'rb') as file, \
+                    ChunkPipeline(file, chunk_size, file_size, offset, chunk_length=chunk_length) as pipeline:
+                while offset < file_size:
+                    chunk = pipeline.next()
+                    if chunk is None:
+                        raise IOError(f'{file_path} was truncated during upload at offset {offset}')
+                    chunk_offset, view = chunk
+                    logger.debug(f'Processing chunk at offset {chunk_offset}...')
+                    offset = self._upload_chunk(request_url, view, chunk_offset, headers, max_attempts, target_path)
+                    expected = chunk_offset + len(view)
+                    self._emit('chunk', path=target_path, offset=chunk_offset, bytes=offset - chunk_offset,
+                               size=file_size)
+                    if hasher is not None:
+                        hashed = self._hash_sent(hasher, hashed, file_path, view, chunk_offset, offset)
+                    view.release()
+                    pipeline.release()
+                    if offset != expected:
+                        pipeline.seek(offset)
+                    if journaled:
+                        self.journal.update(self.api_url, target_path, offset)
+            completed = True
+            logger.info('File uploaded successfully.')
+        except KeyboardInterrupt:
+            logger.info('Upload process cancelled by user.')
+            raise
+        except (requests.exceptions.RequestException, IOError) as error:
+            raise FileBrowserError(f'Error while uploading file: {str(error)}', 16) from error
+        finally:
+            logger.info('Finalizing upload...')
+            elapsed = time.perf_counter() - start
+            self._emit('upload_end', path=target_path, ok=completed, bytes=offset - start_offset, size=file_size,
+                       seconds=round(elapsed, 6),
+                       mb_per_s=round((offset - start_offset) / elapsed / 1048576, 3) if elapsed > 0 else None)
+            if completed:
+                if journaled:
+                    self.journal.remove(self.api_url, target_path)
+            elif journaled:
+                logger.info(f'Upload of {target_path} stopped at offset {offset}, run the upload again to resume.')
+            else:
+                logger.info('deleting unfinished file because of a failure...')
+                self.delete_file(target_path, file_size)
+        if hasher is not None:
+            self._verify_remote(target_path, hasher.hexdigest())
+
+    # Feed the hasher with the bytes of a chunk the server acknowledged, in file order. Bytes the server reports
+    # beyond what was sent (its offset jumped ahead after a failed attempt) are read back from the file.
+    @staticmethod
+    def _hash_sent(hasher, hashed, file_path, view, chunk_offset, offset) -> int:
+        end = min(offset, chunk_offset + len(view))
+        if chunk_offset <= hashed < end:
+            hasher.update(view[hashed - chunk_offset:end - chunk_offset])
+            hashed = end
+        if offset > hashed:
+            update_from_file(hasher, file_path, hashed, offset - hashed)
+            hashed = offset
+        return hashed
+
+    # Server side checksum of a file, computed by the server on request
+    def get_checksum(self, target_path, algorithm=DEFAULT_ALGORITHM) -> str:
+        target_path = self._strip(target_path)
+        try:
+            response = self.session.get(protocol.checksum_url(self.api_url, target_path, algorithm))
+            response.raise_for_status()
+        except requests.exceptions.RequestException as error:
+            raise FileBrowserError(f'Error while getting the checksum of {target_path}: {str(error)}', 18) from error
+        try:
+            return json.loads(response.text)['checksums'][algorithm].lower()
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise FileBrowserError(f'Server returned no {algorithm} checksum for {target_path}.', 23)
+
+    def _verify_remote(self, target_path, local_digest):
+        remote_digest = self.get_checksum(target_path, self.verify_checksum)
+        self._emit('verified', path=target_path, algorithm=self.verify_checksum, ok=remote_digest == local_digest,
+                   checksum=local_digest)
+        if remote_digest != local_digest:
+            raise FileBrowserError(f'{self.verify_checksum} of {target_path} does not match: local {local_digest}, '
+                                   f'remote {remote_digest}.', 23)
+        logger.info(f'{self.verify_checksum} of {target_path} verified.')
+
+    # Check a file that was written without passing through a hasher (e.g. a segmented download) against the server
+    def verify_file(self, local_path, target_path):
+        self._verify_remote(self._strip(target_path), file_digest(local_path, self.verify_checksum))
+
+    # Cheap checks first: only a remote file of the same size is hashed, locally and by the server
+    def _remote_identical(self, file_path, file_size, target_path) -> bool:
+        current, _ = self.get_file_info(target_path)
+        if current is None or current.isDir or current.size != file_size:
+            return False
+        algorithm = self.verify_checksum or DEFAULT_ALGORITHM
+        return self.get_checksum(target_path, algorithm) == file_digest(file_path, algorithm)
+
+    # Offset to continue a journaled upload from, or None when the file has to be uploaded from the start
+    def _resume_offset(self, file_path, stat, target_path, request_url):
+        if self.journal is None:
+            return None
+        entry = self.journal.get(self.api_url, target_path)
+        if entry is None:
+            return None
+        if not self.journal.matches(entry, file_path, stat):
+            logger.info(f'Local file {file_path} changed since the interrupted upload, starting over.')
+            self.delete_file(target_path)
+            self.journal.remove(self.api_url, target_path)
+            return None
+        offset = self._tus_offset(request_url)
+        if offset is None or offset > stat.st_size:
+            logger.info(f'Unfinished upload of {target_path} is gone from the server, starting over.')
+            self.journal.remove(self.api_url, target_path)
+            return None
+        return offset
+
+    # Ask the server how many bytes of the upload it already has, None if it does not know the upload
+    def _tus_offset(self, request_url):
+        try:
+            response = self.session.head(request_url, headers=protocol.tus_head_headers())
+            if not response.ok:
+                return None
+            return protocol.upload_offset(response.headers)
+        except requests.exceptions.RequestException as error:
+            logger.debug(f'Could not read the upload offset: {error}')
+            return None
+
+    # Send one chunk and return the new offset. After a failed attempt the server offset is re-read through HEAD,
+    # when the server already holds more (or less) than expected the caller re-reads the file from there.
+    def _upload_chunk(self, request_url, chunk, offset, headers, max_attempts, target_path=None):
+        headers['Upload-Offset'] = str(offset)
+        attempt = 0
+        while True:
+            try:
+                start = time.perf_counter()
+                response = self.session.patch(request_url, data=chunk, headers=headers)
+                response.raise_for_status()
+                if self.chunk_sizer is not None:
+                    self.chunk_sizer.record_success(len(chunk), time.perf_counter() - start)
+                logger.debug(f"processing chunk at {offset} "
+                             f"status code: {response.status_code} , response: {response.text}")
+                server_offset = protocol.upload_offset(response.headers)
+                return offset + len(chunk) if server_offset is None else server_offset
+            except requests.exceptions.RequestException as error:
+                attempt += 1
+                logger.error(f'Error while uploading chunk at {offset}, attempt {attempt}/{max_attempts}: {error}')
+                self._emit('retry', path=target_path, offset=offset, attempt=attempt, max_attempts=max_attempts,
+                           error=str(error))
+                if attempt >= max_attempts:
+                    raise FileBrowserError(f'Max attempts reached while processing chunk at {offset}. Aborting.',
+                                           16) from error
+                server_offset = self._tus_offset(request_url)
+                if server_offset is not None and server_offset != offset:
+                    logger.info(f'Server reports upload offset {server_offset}, continuing from there.')
+                    return server_offset
+                # retry with a smaller piece of the chunk, so a flaky link does not resend it in full
+                if self.chunk_sizer is not None:
+                    self.chunk_sizer.record_failure()
+                    chunk = chunk[:self.chunk_sizer.next_size()]
+
+    def upload_file_or_folder(self, file_path, target_path, override=False, max_attempts=3,
+                              chunk_size=DEFAULT_CHUNK_SIZE):
+        if not os.path.exists(file_path):
+            raise FileBrowserError(f"Local file '{file_path}' does not exist. Aborting.", 12)
+
+        if not os.path.isdir(file_path):
+            return self.upload_file(file_path, target_path, override=override, max_attempts=max_attempts,
+                                    chunk_size=chunk_size)
+
+        for root, dirs, files in os.walk(file_path):
+            # if uploading files first, it will create non-existing folders recursively first, this is safe.
+            # if creating folder first, it will yield error of 404 not found, it doesn't support create folder
+            # recursively
+            remote_root = _join_remote(target_path, os.path.relpath(root, file_path))
+            for file in files:
+                new_target_path = _join_remote(remote_root, file)
+                logger.info(f'Uploading file to remote path {new_target_path} ...')
+                self.upload_file(os.path.join(root, file), new_target_path, override=override,
+                                 max_attempts=max_attempts, chunk_size=chunk_size)
+            for dirname in dirs:
+                new_target_path = _join_remote(remote_root, dirname)
+                logger.info(f'Uploading directory to remote path {new_target_path} ...')
+                self.create_folder(new_target_path)
+        return None
+
+    def delete_file(self, target_path, compare_size=-1):
+        target_path = self._strip(target_path)
+        request_url = protocol.tus_url(self.api_url, target_path)
+        if compare_size > 0:
+            # the last chunk may have arrived even though its response did not, a complete file is kept
+            try:
+                current, _ = self.get_file_info(target_path)
+            except FileBrowserError as error:
+                logger.debug(f'Could not compare the remote size of {target_path}: {error}')
+                current = None
+            if current is not None and not current.isDir and current.size == compare_size:
+                logger.info(f'Remote {target_path} already has all {compare_size} bytes, keeping it.')
+                return
+        try:
+            self.session.delete(request_url)
+            self._emit('deleted', path=target_path)
+        except requests.exceptions.RequestException as error:
+            logger.error(f'Error while deleting {target_path}: {str(error)}')
+        finally:
+            if self.cache is not None:
+                self.cache.record_write(target_path, exists=False)
+
+    # Delete a file or a whole directory through the resources endpoint
+    def delete_resource(self, target_path):
+        target_path = self._strip(target_path)
+        try:
+            response = self.session.delete(protocol.resource_url(self.api_url, target_path))
+            response.raise_for_status()
+        except requests.exceptions.RequestException as error:
+            raise FileBrowserError(f'Error while deleting {target_path}: {str(error)}', 21) from error
+        finally:
+            if self.cache is not None:
+                self.cache.record_write(target_path, exists=False)
+        self._emit('deleted', path=target_path)
+        logger.info(f'Deleted {target_path}.')
+
+    # Copy a file or directory on the server, nothing passes through the client
+    def copy_resource(self, source_path, destination_path, override=False):
+        self._patch_resource('copy', source_path, destination_path, override)
+
+    # Move or rename a file or directory on the server
+    def move_resource(self, source_path, destination_path, override=False):
+        self._patch_resource('rename', source_path, destination_path, override)
+
+    def _patch_resource(self, action, source_path, destination_path, override):
+        source_path = self._strip(source_path)
+        destination_path = self._strip(destination_path)
+        verb = 'copying' if action == 'copy' else 'moving'
+        try:
+            response = self.session.patch(protocol.patch_resource_url(self.api_url, source_path, action,
+                                                                      destination_path, override))
+            response.raise_for_status()
+        except requests.exceptions.RequestException as error:
+            raise FileBrowserError(f'Error while {verb} {source_path} to {destination_path}: {str(error)}',
+                                   24) from error
+        if self.cache is not None:
+            self.cache.record_write(destination_path)
+            if action == 'rename':
+                self.cache.record_write(source_path, exists=False)
+        self._emit('copied' if action == 'copy' else 'moved', path=source_path, destination=destination_path)
+        logger.info(f'{"Copied" if action == "copy" else "Moved"} {source_path} to {destination_path}.')
+
+    def get_download_link(self, target_path):
+        return protocol.raw_url(self.api_url, target_path, self.token)
+
+    def download_file(self, target_path, local_download_path, chunk_size=DEFAULT_CHUNK_SIZE):
+        target_path = self._strip(target_path)
+        logger.info(f'Downloading file {target_path} to {local_download_path}...')
+        download_url = self.get_download_link(target_path)
+        self._emit('download_start', path=target_path, local=local_download_path)
+        start = time.perf_counter()
+        received = 0
+        completed = False
+        hasher = new_hasher(self.verify_checksum) if self.verify_checksum else None
+        try:
+            with self.session.get(download_url, stream=True) as response:
+                response.raise_for_status()
+                size = int(response.headers.get('Content-Length') or 0) or None
+                with open(local_download_path, 'wb') as file:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        file.write(chunk)
+                        if hasher is not None:
+                            hasher.update(chunk)
+                        self._emit('chunk', path=target_path, offset=received, bytes=len(chunk), size=size)
+                        received += len(chunk)
+            completed = True
+        except requests.exceptions.RequestException as error:
+            raise FileBrowserError(f'Error while requesting file download: {str(error)}', 19) from error
+        finally:
+            elapsed = time.perf_counter() - start
+            self._emit('download_end', path=target_path, ok=completed, bytes=received, seconds=round(elapsed, 6),
+                       mb_per_s=round(received / elapsed / 1048576, 3) if elapsed > 0 else None)
+        logger.info('File downloaded successfully.')
+        if hasher is not None:
+            self._verify_remote(target_path, hasher.hexdigest())
+
+
+# Children of a listing, parsed while the response body arrives. current (the listed resource itself) is set once
+# iteration has finished, the server sends it after the items.
+class ListingStream:
+    def __init__(self, response, chunk_size=65536):
+        self.response = response
+        self.chunk_size = chunk_size
+        self._parser = protocol.ListingParser()
+
+    @property
+    def current(self):
+        return self._parser.current
+
+    def __iter__(self):
+        try:
+            for data in self.response.iter_content(chunk_size=self.chunk_size):
+                yield from self._parser.feed(data)
+            yield from self._parser.close()
+        except requests.exceptions.RequestException as error:
+            raise FileBrowserError(f"Error while getting file info: {str(error)}", 18) from error
+        except ValueError as error:
+            raise FileBrowserError(f"Malformed file info response: {str(error)}", 18) from error
+        finally:
+            self.response.close()
+
+    def close(self):
+        self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# Join a remote directory and a (local, relative) child path with forward slashes
+def _join_remote(parent: str, child: str) -> str:
+    child = child.replace(os.sep, '/')
+    if child in ('', '.'):
+        return parent
+    return parent + child if parent.endswith('/') else parent + '/' + child
@@ -0,0 +1,270 @@
+import codecs
+import json
+import re
+from urllib.parse import quote
+
+from Defaults import UA
+from FileItem import FileItem
+
+"""
+Request building and response parsing of the FileBrowser HTTP API.
+Transport independent, shared by the blocking FileBrowserClient and the asyncio AsyncFileBrowserClient so both send
+exactly the same requests and build the same FileItem objects.
+"""
+
+TUS_VERSION = '1.0.0'
+
+
+def api_url_for(home_url: str) -> str:
+    return home_url + "api" if home_url.endswith("/") else home_url + "/api"
+
+
+def strip(target_path: str) -> str:
+    return target_path[1:] if target_path.startswith('/') else target_path
+
+
+# Headers sent with every request of a client
+def session_headers(home_url: str) -> dict:
+    return {
+        'User-Agent': UA,
+        'Connection': 'keep-alive',
+        'Accept': '*/*',
+        'Accept-Language': 'en-US,en;q=0.5',
+        'Referer': home_url,
+        'Origin': home_url,
+    }
+
+
+def auth_headers(token) -> dict:
+    if not token:
+        return {}
+    return {'X-Auth': token, 'Cookie': f'auth={token}'}
+
+
+# (url, headers, body) of the login request, only works if using http form authentication
+def login_request(api_url: str, home_url: str, hostname: str, username: str, password: str):
+    headers = {
+        'Content-Type': 'application/json',
+        'Accept': '*/*',  # now it returns text instead of json
+        'Accept-Encoding': '',  # do NOT use any compression
+        'Referer': home_url + '/login',
+        'Host': hostname,
+        'Sec-Fetch-Dest': 'empty',
+        'Sec-Fetch-Mode': 'cors',
+        'Sec-Fetch-Site': 'same-origin',
+        'Sec-GPC': '1'
+    }
+    data = {
+        'username': username,
+        'password': password,
+        'recaptcha': ''
+    }
+    return f'{api_url}/login', headers, json.dumps(data)
+
+
+def renew_request(api_url: str):
+    return f'{api_url}/renew', {'Accept-Encoding': ''}
+
+
+# Requests to these endpoints never trigger a new login when rejected
+def is_auth_url(api_url: str, url: str) -> bool:
+    return str(url).startswith((f'{api_url}/login', f'{api_url}/renew'))
+
+
+def resource_url(api_url: str, target_path: str) -> str:
+    return f'{api_url}/resources/{strip(target_path)}'
+
+
+# Server side copy or move (action rename) of a file or directory to another path
+def patch_resource_url(api_url: str, source: str, action: str, destination: str, override=False) -> str:
+    destination = quote('/' + strip(destination), safe='')
+    return f'{resource_url(api_url, source)}?action={action}&destination={destination}&override={str(override).lower()}'
+
+
+# The server answers with the file info and a checksums object holding the hex digest
+def checksum_url(api_url: str, target_path: str, algorithm: str) -> str:
+    return f'{resource_url(api_url, target_path)}?checksum={algorithm}'
+
+
+# (url, headers) of the request creating a folder, the trailing slash makes the server create a directory
+def create_folder_request(api_url: str, target_path: str, override=False):
+    if not target_path.endswith("/"):
+        target_path = target_path + "/"
+    headers = {
+        'Content-Type': 'text/plain;charset=UTF-8',
+        "Accept-Encoding": "gzip, deflate, br",
+    }
+    return f'{resource_url(api_url, target_path)}?override={str(override).lower()}', headers
+
+
+def tus_url(api_url: str, target_path: str, override=None) -> str:
+    url = f'{api_url}/tus/{strip(target_path)}'
+    return url if override is None else f'{url}?override={str(override).lower()}'
+
+
+def tus_create_headers(file_size: int) -> dict:
+    return {'Upload-Length': str(file_size), 'Tus-Resumable': TUS_VERSION}
+
+
+def tus_head_headers() -> dict:
+    return {'Tus-Resumable': TUS_VERSION}
+
+
+# Headers of a TUS PATCH, Upload-Offset is set per chunk
+def chunk_headers() -> dict:
+    return {
+        'Content-Type': 'application/offset+octet-stream',
+        # TODO ADJUST THIS PER FILETYPE (img, pdf, etc)?
+        "Tus-Resumable": TUS_VERSION,
+        "Accept-Encoding": "gzip, deflate, br",
+        "Sec-Fetch-Dest": "empty",
+        "Sec-Fetch-Mode": "cors",
+        "Sec-Fetch-Site": "same-origin",
+        "Sec-GPC": "1",
+    }
+
+
+# Upload-Offset of a TUS response, None if it is missing or malformed
+def upload_offset(headers):
+    try:
+        return int(headers['Upload-Offset'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def raw_url(api_url: str, target_path: str, token) -> str:
+    # Why use different endpoints for upload and download? (resources vs raw)
+    return f'{api_url}/raw/{strip(target_path)}?auth={token}'
+
+
+# Token in the body of a login or renew response
+def decode_token(content: bytes, encoding=None) -> str:
+    return content.decode(encoding or 'utf-8')
+
+
+# (current item, children) from a decoded /api/resources listing
+def parse_resource(decoded: dict):
+    current_file = FileItem.from_dict(decoded)
+    sub_files = [FileItem.from_dict(x) for x in decoded.get('items') or ()]
+    return current_file, sub_files
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_SEPARATOR = re.compile(r'[ \t\n\r]*,[ \t\n\r]*')
+_START, _KEY, _VALUE, _ITEMS, _DONE = range(5)
+
+
+# Incremental parser of an /api/resources listing. feed() takes the body as it arrives and returns the children parsed
+# so far, only the partial entry at the end of the received data is kept. The server sends the items before the fields
+# of the listed resource itself, so current is only set once the whole body was fed.
+class ListingParser:
+    def __init__(self):
+        self.current = None
+        self._fields = {}
+        self._key = None
+        self._state = _START
+        self._buffer = ''
+        self._pos = 0
+        self._decode = json.JSONDecoder().raw_decode
+        self._text = codecs.getincrementaldecoder('utf-8')()
+
+    def feed(self, data: bytes) -> list:
+        self._buffer = self._buffer[self._pos:] + self._text.decode(data)
+        self._pos = 0
+        return self._parse(False)
+
+    # Parse what is left at the end of the body, raises ValueError if the listing is incomplete
+    def close(self) -> list:
+        self._buffer = self._buffer[self._pos:] + self._text.decode(b'', final=True)
+        self._pos = 0
+        items = self._parse(True)
+        if self._state != _DONE:
+            raise ValueError('Listing ended unexpectedly')
+        return items
+
+    # A value that fails to decode is taken as incomplete and retried with more data, unless the body has ended
+    def _parse(self, eof) -> list:
+        items = []
+        buffer = self._buffer
+        size = len(buffer)
+        decode = self._decode
+        from_dict = FileItem.from_dict
+        pos = self._pos
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos >= size:
+                break
+            char = buffer[pos]
+            state = self._state
+            if state == _ITEMS:
+                if char == ',':
+                    pos += 1
+                    continue
+                if char == ']':
+                    self._state = _KEY
+                    pos += 1
+                    continue
+                # tight loop over "entry, entry, ...", the outer loop handles the end of the array and of the data
+                try:
+                    while True:
+                        value, pos = decode(buffer, pos)
+                        items.append(from_dict(value))
+                        separator = _SEPARATOR.match(buffer, pos)
+                        if separator is None:
+                            break
+                        pos = separator.end()
+                except ValueError:
+                    if eof:
+                        raise
+                    break
+            elif state == _KEY:
+                if char == ',':
+                    pos += 1
+                    continue
+                if char == '}':
+                    self._state = _DONE
+                    self.current = FileItem.from_dict(self._fields)
+                    pos += 1
+                    continue
+                try:
+                    key, pos_end = decode(buffer, pos)
+                except ValueError:
+                    if eof:
+                        raise
+                    break
+                colon = _WHITESPACE.match(buffer, pos_end).end()
+                if colon >= size:
+                    if eof:
+                        raise ValueError('Listing ended unexpectedly')
+                    break
+                if buffer[colon] != ':' or not isinstance(key, str):
+                    raise ValueError(f'Malformed listing at character {colon}')
+                self._key = key
+                self._state = _VALUE
+                pos = colon + 1
+            elif state == _VALUE:
+                if self._key == 'items' and char == '[':
+                    self._state = _ITEMS
+                    pos += 1
+                    continue
+                try:
+                    value, pos_end = decode(buffer, pos)
+                except ValueError:
+                    if eof:
+                        raise
+                    break
+                # a number at the end of the received data may continue in the next chunk
+                if pos_end >= size and not eof:
+                    break
+                self._fields[self._key] = value
+                self._state = _KEY
+                pos = pos_end
+            elif state == _START:
+                if char != '{':
+                    raise ValueError('Listing is not a JSON object')
+                self._state = _KEY
+                pos += 1
+            else:
+                raise ValueError(f'Unexpected data after the listing at character {pos}')
+        self._pos = pos
+        return items
@@ -1,6 +1,12 @@
 import json 
+import re
+from datetime import datetime
 
+# Listings can hold hundreds of thousands of items, so there is no per-instance __dict__ and the property dict is
+# only allocated when something is stored in it
 class FileItem:
+    __slots__ = ('name', 'size', 'path', 'extension', 'modified', 'mode', 'isDir', 'isSymlink', 'type', '_property')
+
     def __init__(self, name, size, path, extension, modified, mode, isDir, isSymlink, type):
         self.name = name
         self.size = size
@@ -12,12 +18,33 @@ class FileItem:
         self.isSymlink = isSymlink
         self.type = type
 
-        self.property = dict()
+        self._property = None
+
+    # Fast path for an entry of a decoded /api/resources listing
+    @classmethod
+    def from_dict(cls, x: dict):
+        item = cls.__new__(cls)
+        item.name = x['name']
+        item.size = x['size']
+        item.path = x['path']
+        item.extension = x['extension']
+        item.modified = x['modified']
+        item.mode = x['mode']
+        item.isDir = x['isDir']
+        item.isSymlink = x['isSymlink']
+        item.type = x['type']
+        item._property = None
+        return item
+
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'size': self.size, 'path': self.path, 'extension': self.extension,
+                'modified': self.modified, 'mode': self.mode, 'isDir': self.isDir, 'isSymlink': self.isSymlink,
+                'type': self.type, 'property': {} if self._property is None else self._property}
 
     def __str__(self):
         return f'{self.name}'
     def __repr__(self):
-        return f'{json.dumps(self.__dict__)}'
+        return f'{json.dumps(self.to_dict())}'
     def __eq__(self, other):
         return self.name == other.name and self.size == other.size and self.path == other.path and self.extension == other.extension and self.modified == other.modified and self.mode == other.mode and self.isDir == other.isDir and self.isSymlink == other.isSymlink and self.type == other.type
     def __ne__(self, other):
@@ -35,11 +62,29 @@ class FileItem:
     def __len__(self):
         return self.size
     def __getitem__(self, key):
-        return self.property[key]
+        if self._property is None:
+            raise KeyError(key)
+        return self._property[key]
     def __setitem__(self, key, value):
-
-        self.property[key] = value
+        if self._property is None:
+            self._property = dict()
+        self._property[key] = value
     def __delitem__(self, key):
-        del self.property[key]
+        if self._property is None:
+            raise KeyError(key)
+        del self._property[key]
+
+    # modified is RFC 3339 with up to nanosecond precision, e.g. 2024-01-02T03:04:05.123456789+01:00
+    def modified_timestamp(self) -> float:
+        text = re.sub(r'\.(\d+)', lambda m: '.' + (m.group(1) + '000000')[:6], self.modified).replace('Z', '+00:00')
+        return datetime.fromisoformat(text).timestamp()
+
+    
+
+    def _get_property(self) -> dict:
+        if self._property is None:
+            self._property = dict()
+        return self._property
 
-    
\ No newline at end of file
+    # defined last, the name shadows the builtin for the rest of the class body
+    property = property(_get_property)
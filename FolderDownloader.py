@@ -0,0 +1,118 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from FileBrowserClient import FileBrowserClient, FileBrowserError, DEFAULT_CHUNK_SIZE, _join_remote
+
+"""
+Recursive folder download.
+Lists the remote tree breadth-first with a bounded number of concurrent /api/resources calls and hands every file to
+a download pool as soon as its directory listing arrives, so transfers overlap with the traversal.
+"""
+
+logger = logging.getLogger()
+
+
+class FolderDownloadReport:
+    def __init__(self):
+        self.files_downloaded = 0
+        self.bytes_downloaded = 0
+        self.directories_created = 0
+        self.failures = []  # list of (remote path, local path, error message)
+        self.elapsed = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+    def __str__(self):
+        rate = self.bytes_downloaded / self.elapsed / 1048576 if self.elapsed > 0 else 0.0
+        return (f'{self.files_downloaded} files ({self.bytes_downloaded} bytes) downloaded, '
+                f'{self.directories_created} directories created, {len(self.failures)} failed, '
+                f'{self.elapsed:.2f}s, {rate:.2f} MB/s')
+
+
+class FolderDownloader:
+    def __init__(self, client: FileBrowserClient, workers=4, list_workers=4, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.client = client
+        self.workers = max(1, workers)
+        self.list_workers = max(1, list_workers)
+        self.chunk_size = chunk_size
+
+    def download(self, target_path, local_root, root_info=None) -> FolderDownloadReport:
+        if root_info is None:
+            root_info, _ = self.client.get_file_info(target_path, allow_empty=False)
+        if not root_info.isDir:
+            raise FileBrowserError(f'{target_path} is not a directory. Aborting.', 19)
+
+        report = FolderDownloadReport()
+        start = time.perf_counter()
+        try:
+            os.makedirs(local_root, exist_ok=True)
+        except OSError as error:
+            raise FileBrowserError(f"Cannot create local folder '{local_root}': {error}", 19) from error
+        report.directories_created += 1
+
+        with ThreadPoolExecutor(max_workers=self.list_workers, thread_name_prefix='list') as list_pool, \
+                ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='download') as download_pool:
+            # future -> ('list', remote dir, local dir) or ('file', remote path, local path, size)
+            pending = {list_pool.submit(self.client.get_file_info, target_path, False): ('list', target_path,
+                                                                                          local_root)}
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task = pending.pop(future)
+                        if task[0] == 'list':
+                            self._expand(future, task, pending, list_pool, download_pool, report)
+                        else:
+                            self._finish(future, task, report)
+            except KeyboardInterrupt:
+                for future in pending:
+                    future.cancel()
+                raise
+
+        report.elapsed = time.perf_counter() - start
+        logger.info(f'Folder download finished: {report}')
+        for remote_path, local_path, message in report.failures:
+            logger.error(f'Failed {remote_path} -> {local_path}: {message}')
+        return report
+
+    # Create the local directories of a finished listing and schedule its children
+    def _expand(self, future, task, pending, list_pool, download_pool, report):
+        _, remote_dir, local_dir = task
+        try:
+            _, children = future.result()
+        except FileBrowserError as error:
+            report.failures.append((remote_dir, local_dir, str(error)))
+            return
+        for child in children:
+            if child.name in ('', '.', '..') or '/' in child.name or os.sep in child.name:
+                report.failures.append((remote_dir, local_dir, f'refusing unsafe entry name {child.name!r}'))
+                continue
+            remote_path = _join_remote(remote_dir, child.name)
+            local_path = os.path.join(local_dir, child.name)
+            if child.isDir:
+                # an unwritable local directory only fails its own subtree
+                try:
+                    os.makedirs(local_path, exist_ok=True)
+                except OSError as error:
+                    report.failures.append((remote_path, local_path, str(error)))
+                    continue
+                report.directories_created += 1
+                future = list_pool.submit(self.client.get_file_info, remote_path, False)
+                pending[future] = ('list', remote_path, local_path)
+            else:
+                future = download_pool.submit(self.client.download_file, remote_path, local_path, self.chunk_size)
+                pending[future] = ('file', remote_path, local_path, child.size)
+
+    @staticmethod
+    def _finish(future, task, report):
+        _, remote_path, local_path, size = task
+        try:
+            future.result()
+            report.files_downloaded += 1
+            report.bytes_downloaded += size
+        except (FileBrowserError, OSError) as error:
+            report.failures.append((remote_path, local_path, str(error)))
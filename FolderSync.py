@@ -0,0 +1,307 @@
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from FileBrowserClient import FileBrowserClient, FileBrowserError, DEFAULT_CHUNK_SIZE, _join_remote
+
+"""
+Incremental one-way sync of a local tree to the server.
+A SQLite manifest remembers, per file, the local size/mtime and the remote size/modified seen at the last sync, and
+the directories known to exist on the server. Synced directories whose local files all match the manifest are skipped
+without listing the server; only directories with local changes or never synced (or all of them with full=True) are
+listed and compared by size and modified time. With delete=True every directory is listed, remote entries without a
+local counterpart can only be found in a listing.
+"""
+
+logger = logging.getLogger()
+
+
+class SyncManifest:
+    def __init__(self, path: str, server: str, remote_root: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.server = server
+        self.remote_root = remote_root.strip('/')
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                server TEXT NOT NULL,
+                remote_root TEXT NOT NULL,
+                path TEXT NOT NULL,
+                local_size INTEGER NOT NULL,
+                local_mtime_ns INTEGER NOT NULL,
+                remote_size INTEGER,
+                remote_modified TEXT,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (server, remote_root, path)
+            )''')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS directories (
+                server TEXT NOT NULL,
+                remote_root TEXT NOT NULL,
+                path TEXT NOT NULL,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (server, remote_root, path)
+            )''')
+        self.connection.commit()
+
+    # All rows of this server and remote root, keyed by relative path
+    def load(self) -> dict:
+        rows = self.connection.execute(
+            'SELECT path, local_size, local_mtime_ns, remote_size, remote_modified FROM files '
+            'WHERE server = ? AND remote_root = ?', (self.server, self.remote_root))
+        return {row[0]: row[1:] for row in rows}
+
+    def put(self, path, local_size, local_mtime_ns, remote_size, remote_modified):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (self.server, self.remote_root, path, local_size, local_mtime_ns, remote_size, remote_modified,
+             time.time()))
+
+    def remove(self, path):
+        self.connection.execute('DELETE FROM files WHERE server = ? AND remote_root = ? AND path = ?',
+                                (self.server, self.remote_root, path))
+
+    # Relative paths of the directories that existed on the server at the last sync
+    def load_directories(self) -> set:
+        rows = self.connection.execute('SELECT path FROM directories WHERE server = ? AND remote_root = ?',
+                                       (self.server, self.remote_root))
+        return {row[0] for row in rows}
+
+    def put_directory(self, path):
+        self.connection.execute('INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?)',
+                                (self.server, self.remote_root, path, time.time()))
+
+    def remove_directory(self, path):
+        self.connection.execute('DELETE FROM directories WHERE server = ? AND remote_root = ? AND path = ?',
+                                (self.server, self.remote_root, path))
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+class SyncReport:
+    def __init__(self):
+        self.uploaded = 0
+        self.bytes_uploaded = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.directories_listed = 0
+        self.directories_skipped = 0
+        self.failures = []  # list of (relative path, error message)
+        self.elapsed = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+    def __str__(self):
+        return (f'{self.uploaded} files ({self.bytes_uploaded} bytes) uploaded, {self.unchanged} unchanged, '
+                f'{self.deleted} remote entries deleted, {self.directories_listed} directories listed, '
+                f'{self.directories_skipped} skipped from the manifest, {len(self.failures)} failed, '
+                f'{self.elapsed:.2f}s')
+
+
+class FolderSync:
+    def __init__(self, client: FileBrowserClient, manifest: SyncManifest, workers=4, delete=False, full=False,
+                 max_attempts=3, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.client = client
+        self.manifest = manifest
+        self.workers = max(1, workers)
+        self.delete = delete
+        self.full = full
+        self.max_attempts = max_attempts
+        self.chunk_size = chunk_size
+
+    def sync(self, local_root, target_path) -> SyncReport:
+        if not os.path.isdir(local_root):
+            raise FileBrowserError(f"Local folder '{local_root}' does not exist. Aborting.", 12)
+        report = SyncReport()
+        start = time.perf_counter()
+        known = self.manifest.load()
+        known_dirs = self.manifest.load_directories()
+        local_dirs, unreadable = self._scan(local_root, report)
+
+        # directories to compare against the server: local changes, never synced (an empty directory has nothing else
+        # telling it apart from a synced one), or everything if full or delete
+        by_dir = {}
+        for path, row in known.items():
+            by_dir.setdefault(_dirname(path), {})[path] = row
+        to_list = []
+        for relative_dir, files in local_dirs.items():
+            recorded = by_dir.get(relative_dir, {})
+            current = {_join(relative_dir, name): stat for name, stat in files.items()}
+            unchanged = relative_dir in known_dirs and recorded.keys() == current.keys() and all(
+                recorded[path][0] == size and recorded[path][1] == mtime_ns
+                for path, (size, mtime_ns) in current.items())
+            if unchanged and not self.full and not self.delete:
+                report.directories_skipped += 1
+                report.unchanged += len(current)
+            else:
+                to_list.append(relative_dir)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='sync') as pool:
+            listings = dict(zip(to_list, pool.map(
+                lambda relative_dir: self._list(target_path, relative_dir), to_list)))
+            report.directories_listed += len(listings)
+
+            uploads = []
+            deletes = []
+            for relative_dir, remote in listings.items():
+                # missing remote directory, create it so empty directories are synced as well
+                if remote is not None or self._create_folder(_join_remote(target_path, relative_dir), relative_dir,
+                                                             report):
+                    self.manifest.put_directory(relative_dir)
+                remote = remote or {}
+                local_files = local_dirs[relative_dir]
+                for name, (size, mtime_ns) in local_files.items():
+                    path = _join(relative_dir, name)
+                    item = remote.get(name)
+                    if self._unchanged(known.get(path), item, size, mtime_ns):
+                        report.unchanged += 1
+                        self.manifest.put(path, size, mtime_ns, item.size, item.modified)
+                    else:
+                        uploads.append((path, size, mtime_ns, item is not None))
+                for name, item in remote.items():
+                    path = _join(relative_dir, name)
+                    if name not in local_files and path not in unreadable and not (item.isDir and path in local_dirs):
+                        deletes.append(path)
+
+            # manifest rows of files that vanished locally, a vanished directory is deleted as a whole. A file that
+            # could not be read keeps its row and its remote copy
+            for path in known:
+                relative_dir = _dirname(path)
+                if path in unreadable or (relative_dir in local_dirs and
+                                          os.path.basename(path) in local_dirs[relative_dir]):
+                    continue
+                self.manifest.remove(path)
+                if relative_dir not in local_dirs:
+                    while _dirname(relative_dir) not in local_dirs:
+                        relative_dir = _dirname(relative_dir)
+                    deletes.append(relative_dir)
+                elif relative_dir not in listings:
+                    deletes.append(path)
+            # synced directories that vanished locally, the files above only cover directories that had some
+            for relative_dir in known_dirs - local_dirs.keys():
+                self.manifest.remove_directory(relative_dir)
+                while _dirname(relative_dir) not in local_dirs:
+                    relative_dir = _dirname(relative_dir)
+                deletes.append(relative_dir)
+            self.manifest.commit()
+
+            self._upload_all(pool, local_root, target_path, uploads, report)
+            if self.delete:
+                self._delete_all(pool, target_path, sorted(set(deletes)), report)
+            elif deletes:
+                logger.info(f'{len(set(deletes))} remote entries have no local counterpart, use --delete to remove '
+                            f'them')
+
+            # record the remote state of what was just uploaded, one listing per touched directory
+            failed = {path for path, _ in report.failures}
+            touched = sorted({_dirname(path) for path, _, _, _ in uploads})
+            refreshed = dict(zip(touched, pool.map(lambda relative_dir: self._list(target_path, relative_dir),
+                                                   touched)))
+            for path, size, mtime_ns, _ in uploads:
+                item = (refreshed[_dirname(path)] or {}).get(os.path.basename(path))
+                if path not in failed and item is not None and item.size == size:
+                    self.manifest.put(path, size, mtime_ns, item.size, item.modified)
+            self.manifest.commit()
+
+        report.elapsed = time.perf_counter() - start
+        logger.info(f'Sync finished: {report}')
+        for path, message in report.failures:
+            logger.error(f'Failed {path}: {message}')
+        return report
+
+    # Local files per relative directory ('' for the root): name -> (size, mtime_ns), and the relative paths of the
+    # files that could not be read (vanished during the scan, broken symlinks), which are reported as failures
+    @staticmethod
+    def _scan(local_root, report):
+        local_dirs = {}
+        unreadable = set()
+        for root, dirs, files in os.walk(local_root):
+            relative = os.path.relpath(root, local_root)
+            relative = '' if relative == '.' else relative.replace(os.sep, '/')
+            entries = {}
+            for name in files:
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError as error:
+                    unreadable.add(_join(relative, name))
+                    report.failures.append((_join(relative, name), str(error)))
+                    continue
+                entries[name] = (stat.st_size, stat.st_mtime_ns)
+            local_dirs[relative] = entries
+        return local_dirs, unreadable
+
+    # Remote children of a directory by name, None if the directory does not exist
+    def _list(self, target_path, relative_dir):
+        current, children = self.client.get_file_info(_join_remote(target_path, relative_dir))
+        if current is None:
+            return None
+        return {child.name: child for child in children}
+
+    # A file is unchanged when the local side matches the manifest and the remote side matches it too. Without a
+    # manifest row, a remote file of the same size written after the local modification is adopted as synced.
+    @staticmethod
+    def _unchanged(row, item, size, mtime_ns) -> bool:
+        if item is None or item.isDir or item.size != size:
+            return False
+        if row is not None:
+            local_size, local_mtime_ns, remote_size, remote_modified = row
+            return (local_size == size and local_mtime_ns == mtime_ns and remote_size == item.size
+                    and remote_modified in (None, item.modified))
+        try:
+            return item.modified_timestamp() >= mtime_ns / 1e9
+        except ValueError:
+            return False
+
+    def _create_folder(self, remote_path, relative_dir, report) -> bool:
+        try:
+            self.client.create_folder(remote_path)
+            return True
+        except FileBrowserError as error:
+            report.failures.append((relative_dir, str(error)))
+            return False
+
+    def _upload_all(self, pool, local_root, target_path, uploads, report):
+        def upload(entry):
+            path, size, _, exists = entry
+            self.client.upload_file(os.path.join(local_root, *path.split('/')), _join_remote(target_path, path),
+                                    override=exists, max_attempts=self.max_attempts, chunk_size=self.chunk_size)
+
+        futures = [(pool.submit(upload, entry), entry) for entry in uploads]
+        for future, (path, size, _, _) in futures:
+            try:
+                future.result()
+                report.uploaded += 1
+                report.bytes_uploaded += size
+            except (FileBrowserError, OSError) as error:
+                report.failures.append((path, str(error)))
+
+    def _delete_all(self, pool, target_path, deletes, report):
+        # a deleted directory takes its children with it
+        deletes = [path for path in deletes if not any(path.startswith(other + '/') for other in deletes)]
+        futures = [(pool.submit(self.client.delete_resource, _join_remote(target_path, path)), path)
+                   for path in deletes]
+        for future, path in futures:
+            try:
+                future.result()
+                report.deleted += 1
+            except FileBrowserError as error:
+                report.failures.append((path, str(error)))
+
+
+def _join(relative_dir, name):
+    return f'{relative_dir}/{name}' if relative_dir else name
+
+
+def _dirname(path):
+    return path.rsplit('/', 1)[0] if '/' in path else ''
@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from FileBrowserClient import FileBrowserClient, FileBrowserError, DEFAULT_CHUNK_SIZE, _join_remote
+from ChunkPipeline import buffer_bytes
+from Defaults import ORDER_POLICIES
+
+"""
+Concurrent folder upload engine.
+Creates the remote directory tree level by level (each directory exactly once, parents before children), then
+uploads the files through a bounded thread pool sharing the client's connection pool.
+"""
+
+logger = logging.getLogger()
+
+
+# Counting semaphore over bytes, a single request larger than the limit is admitted alone instead of deadlocking
+class _ByteBudget:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, amount: int) -> int:
+        amount = min(amount, self.limit)
+        with self._cond:
+            while self.in_flight and self.in_flight + amount > self.limit:
+                self._cond.wait()
+            self.in_flight += amount
+        return amount
+
+    def release(self, amount: int):
+        with self._cond:
+            self.in_flight -= amount
+            self._cond.notify_all()
+
+
+class FolderUploadReport:
+    def __init__(self):
+        self.files_uploaded = 0
+        self.bytes_uploaded = 0
+        self.directories_created = 0
+        self.failures = []  # list of (local path, remote path, error message)
+        self.elapsed = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+    def __str__(self):
+        rate = self.bytes_uploaded / self.elapsed / 1048576 if self.elapsed > 0 else 0.0
+        return (f'{self.files_uploaded} files ({self.bytes_uploaded} bytes) uploaded, '
+                f'{self.directories_created} directories created, {len(self.failures)} failed, '
+                f'{self.elapsed:.2f}s, {rate:.2f} MB/s')
+
+
+class FolderUploader:
+    def __init__(self, client: FileBrowserClient, workers=4, order='largest', max_inflight_bytes=None,
+                 override=False, max_attempts=3, chunk_size=DEFAULT_CHUNK_SIZE):
+        if order not in ORDER_POLICIES:
+            raise ValueError(f'Unknown order policy {order}, expected one of {ORDER_POLICIES}')
+        self.client = client
+        self.workers = max(1, workers)
+        self.order = order
+        # every running upload holds at most its chunk buffers in memory, default to enough for every worker
+        self.max_inflight_bytes = max_inflight_bytes or buffer_bytes(chunk_size + 1, chunk_size) * self.workers
+        self.override = override
+        self.max_attempts = max_attempts
+        self.chunk_size = chunk_size
+
+    # Collect the remote directories (grouped by depth) and the files to upload from the local tree, files that cannot
+    # be read (vanished, broken symlinks) are reported as failures
+    def _scan(self, local_root, target_path, report):
+        levels = []
+        files = []
+        for root, dirs, names in os.walk(local_root):
+            relative = os.path.relpath(root, local_root)
+            depth = 0 if relative == '.' else relative.count(os.sep) + 1
+            remote_root = _join_remote(target_path, relative)
+            if dirs:
+                while len(levels) <= depth:
+                    levels.append([])
+                levels[depth].extend(_join_remote(remote_root, d) for d in dirs)
+            for name in names:
+                local_path = os.path.join(root, name)
+                try:
+                    files.append((local_path, _join_remote(remote_root, name), os.path.getsize(local_path)))
+                except OSError as error:
+                    report.failures.append((local_path, _join_remote(remote_root, name), str(error)))
+
+        if self.order == 'largest':
+            files.sort(key=lambda f: f[2], reverse=True)
+        elif self.order == 'smallest':
+            files.sort(key=lambda f: f[2])
+        return levels, files
+
+    def upload(self, local_root, target_path) -> FolderUploadReport:
+        if not os.path.isdir(local_root):
+            raise FileBrowserError(f"Local folder '{local_root}' does not exist. Aborting.", 12)
+        report = FolderUploadReport()
+        start = time.perf_counter()
+        levels, files = self._scan(local_root, target_path, report)
+        logger.info(f'Uploading {len(files)} files in {sum(len(x) for x in levels)} directories '
+                    f'with {self.workers} workers, order {self.order}')
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='upload') as pool:
+            self.client.create_folder(target_path)
+            report.directories_created += 1
+            # a level only starts once its parents exist
+            for level in levels:
+                futures = {pool.submit(self.client.create_folder, path): path for path in level}
+                for future, path in futures.items():
+                    try:
+                        future.result()
+                        report.directories_created += 1
+                    except FileBrowserError as error:
+                        report.failures.append((None, path, str(error)))
+            failed_dirs = tuple(path + '/' for local_path, path, _ in report.failures if local_path is None)
+
+            self._upload_files(pool, files, failed_dirs, report)
+
+        report.elapsed = time.perf_counter() - start
+        logger.info(f'Folder upload finished: {report}')
+        for local_path, remote_path, message in report.failures:
+            logger.error(f'Failed {local_path or ""} -> {remote_path}: {message}')
+        return report
+
+    def _upload_files(self, pool, files, failed_dirs, report):
+        budget = _ByteBudget(self.max_inflight_bytes)
+        pending = {}
+
+        def collect(done):
+            for future in done:
+                local_path, remote_path, size, reserved = pending.pop(future)
+                budget.release(reserved)
+                try:
+                    future.result()
+                    report.files_uploaded += 1
+                    report.bytes_uploaded += size
+                except (FileBrowserError, OSError) as error:
+                    report.failures.append((local_path, remote_path, str(error)))
+
+        try:
+            for local_path, remote_path, size in files:
+                if failed_dirs and remote_path.startswith(failed_dirs):
+                    report.failures.append((local_path, remote_path, 'parent directory could not be created'))
+                    continue
+                # reserve the memory the upload will hold: its chunk buffers, or the whole file if it is smaller
+                reserved = buffer_bytes(size, self.chunk_size)
+                while pending and budget.in_flight + min(reserved, budget.limit) > budget.limit:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                reserved = budget.acquire(reserved)
+                future = pool.submit(self.client.upload_file, local_path, remote_path, self.override,
+                                     self.max_attempts, self.chunk_size)
+                pending[future] = (local_path, remote_path, size, reserved)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        except KeyboardInterrupt:
+            for future in pending:
+                future.cancel()
+            raise
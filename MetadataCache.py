@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+
+"""
+TTL + LRU cache for /api/resources listings.
+Entries are keyed by normalized remote path. Existence checks are answered from the cached listing of the parent
+directory, so uploading many files into one directory costs one listing instead of one request per file.
+"""
+
+
+# Normalize a remote path to its cache key: no leading, trailing or repeated slashes, '' for the root
+def normalize(path: str) -> str:
+    return '/'.join(part for part in path.split('/') if part and part != '.')
+
+
+def _parent(key: str):
+    return key.rsplit('/', 1) if '/' in key else ('', key)
+
+
+class _Entry:
+    __slots__ = ('current', 'children', 'names', 'expires', 'stale')
+
+    def __init__(self, current, children, expires):
+        self.current = current
+        self.children = children
+        self.names = {child.name for child in children} if current is not None and current.isDir else None
+        self.expires = expires
+        # a write below this directory made the listing outdated, only the name set is still kept current
+        self.stale = False
+
+
+class MetadataCache:
+    def __init__(self, max_entries=1024, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    # Cached (current, children) of a path, None on a miss
+    def get(self, path):
+        with self._lock:
+            entry = self._lookup(normalize(path))
+            if entry is None or entry.stale:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry.current, entry.children
+
+    def put(self, path, current, children):
+        with self._lock:
+            key = normalize(path)
+            self._entries[key] = _Entry(current, children, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # True or False when the cached parent listing knows the answer, None when the parent is not cached
+    def exists(self, path):
+        key = normalize(path)
+        if not key:
+            return True
+        parent, name = _parent(key)
+        with self._lock:
+            entry = self._lookup(parent)
+            if entry is None or entry.names is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return name in entry.names
+
+    # Record a write we performed: the path itself and everything below it is dropped, the listings above it keep
+    # their name sets in sync so existence checks of siblings stay cached
+    def record_write(self, path, exists=True):
+        key = normalize(path)
+        with self._lock:
+            prefix = key + '/'
+            for cached in [k for k in self._entries if k == key or k.startswith(prefix) or not key]:
+                del self._entries[cached]
+            while key:
+                parent, name = _parent(key)
+                entry = self._lookup(parent)
+                if entry is not None:
+                    entry.stale = True
+                    if entry.names is not None:
+                        if exists:
+                            entry.names.add(name)
+                        else:
+                            entry.names.discard(name)
+                # a created path also creates its missing parents, a removal only touches its direct parent
+                if not exists:
+                    break
+                key = parent
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions}
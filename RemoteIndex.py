@@ -0,0 +1,257 @@
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from FileBrowserClient import FileBrowserClient, FileBrowserError, _join_remote
+from FileItem import FileItem
+from MetadataCache import normalize
+
+"""
+Local, queryable snapshot of a remote tree.
+RemoteIndexer crawls a remote subtree with a bounded number of concurrent /api/resources listings and stores every
+entry in a SQLite snapshot; du, find and ls are then answered from the snapshot without touching the server.
+Re-indexing is incremental: a directory's modified time changes when entries are added, removed or renamed in it, so
+a directory without subdirectories whose modified time is the one of its stored listing is not listed again. A
+directory with subdirectories is always listed, the modified times of its subdirectories only come with its listing.
+Files rewritten in place do not touch their directory, full=True lists everything to pick those up.
+"""
+
+logger = logging.getLogger()
+
+_COLUMNS = 'path, name, size, modified, mode, extension, type, is_dir, is_symlink'
+
+
+def _key(path: str) -> str:
+    return '/' + normalize(path)
+
+
+# SQL condition and parameters selecting a path and everything below it
+def _subtree(path: str):
+    if path == '/':
+        return '1', ()
+    return '(path = ? OR (path >= ? AND path < ?))', (path, path + '/', path + '0')
+
+
+def _item(row) -> FileItem:
+    path, name, size, modified, mode, extension, item_type, is_dir, is_symlink = row
+    return FileItem(name, size, path, extension, modified, mode, bool(is_dir), bool(is_symlink), item_type)
+
+
+def _timestamp(item: FileItem):
+    try:
+        return item.modified_timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class IndexSnapshot:
+    def __init__(self, path: str, server: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.server = server
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS items (
+                server TEXT NOT NULL,
+                path TEXT NOT NULL,
+                parent TEXT,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                modified TEXT NOT NULL,
+                mtime REAL,
+                mode INTEGER,
+                extension TEXT,
+                type TEXT,
+                is_dir INTEGER NOT NULL,
+                is_symlink INTEGER NOT NULL,
+                listed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (server, path)
+            )''')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS items_parent ON items (server, parent)')
+        self.connection.commit()
+
+    def _select(self, condition, parameters=(), order='path'):
+        return self.connection.execute(
+            f'SELECT {_COLUMNS} FROM items WHERE server = ? AND {condition} ORDER BY {order}',
+            (self.server, *parameters))
+
+    def get(self, path):
+        row = self._select('path = ?', (_key(path),)).fetchone()
+        return None if row is None else _item(row)
+
+    def children(self, path) -> list:
+        return [_item(row) for row in self._select('parent = ?', (_key(path),), order='name')]
+
+    # Every item of a subtree, the root first and the rest in path order
+    def walk(self, path):
+        condition, parameters = _subtree(_key(path))
+        for row in self._select(condition, parameters):
+            yield _item(row)
+
+    # Store the listing of a directory: the directory itself is marked as listed, children that are gone are removed
+    # with everything below them
+    def put_listing(self, path, current: FileItem, children: list):
+        path = _key(path)
+        names = {child.name for child in children}
+        for (name,) in self.connection.execute('SELECT name FROM items WHERE server = ? AND parent = ?',
+                                               (self.server, path)).fetchall():
+            if name not in names:
+                self.remove(_join_remote(path, name))
+        self._upsert(path, current, listed=current.isDir)
+        for child in children:
+            self._upsert(_join_remote(path, child.name), child)
+
+    # A directory keeps its listed flag only while its modified time is the one its listing was stored with
+    def _upsert(self, path, item: FileItem, listed=False):
+        parent = None if path == '/' else path.rsplit('/', 1)[0] or '/'
+        self.connection.execute('''
+            INSERT INTO items (server, path, parent, name, size, modified, mtime, mode, extension, type, is_dir,
+                               is_symlink, listed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (server, path) DO UPDATE SET
+                name = excluded.name, size = excluded.size, modified = excluded.modified, mtime = excluded.mtime,
+                mode = excluded.mode, extension = excluded.extension, type = excluded.type, is_dir = excluded.is_dir,
+                is_symlink = excluded.is_symlink,
+                listed = CASE WHEN excluded.listed THEN 1
+                              WHEN items.is_dir = excluded.is_dir AND items.modified = excluded.modified
+                              THEN items.listed ELSE 0 END''',
+            (self.server, path, parent, path.rsplit('/', 1)[-1] or item.name, item.size, item.modified,
+             _timestamp(item), item.mode, item.extension, item.type, int(item.isDir), int(item.isSymlink),
+             int(listed)))
+
+    # True when the stored listing of a directory is still current and it has no subdirectories to look into
+    def is_current_leaf(self, path) -> bool:
+        path = _key(path)
+        row = self.connection.execute('SELECT listed FROM items WHERE server = ? AND path = ? AND is_dir = 1',
+                                      (self.server, path)).fetchone()
+        if row is None or not row[0]:
+            return False
+        return self.connection.execute('SELECT 1 FROM items WHERE server = ? AND parent = ? AND is_dir = 1 LIMIT 1',
+                                       (self.server, path)).fetchone() is None
+
+    def remove(self, path):
+        condition, parameters = _subtree(_key(path))
+        self.connection.execute(f'DELETE FROM items WHERE server = ? AND {condition}', (self.server, *parameters))
+
+    # Total file bytes, file and directory counts of a path and of its subdirectories down to depth levels below it,
+    # as a list of (path, bytes, files, directories) in path order
+    def du(self, path, depth=0) -> list:
+        root = _key(path)
+        item = self.get(root)
+        if item is None:
+            return []
+        if not item.isDir:
+            return [(root, item.size, 1, 0)]
+        base = 0 if root == '/' else len(root.split('/')) - 1
+        totals = {}
+        condition, parameters = _subtree(root)
+        for item_path, size, is_dir in self.connection.execute(
+                f'SELECT path, size, is_dir FROM items WHERE server = ? AND {condition}', (self.server, *parameters)):
+            parts = [] if item_path == '/' else item_path.split('/')[1:]
+            if is_dir and len(parts) - base <= depth:
+                totals.setdefault(item_path, [0, 0, 0])
+            # an item counts for its ancestors within depth, a directory not for itself
+            for level in range(base, min(base + depth, len(parts) - 1) + 1):
+                total = totals.setdefault('/' + '/'.join(parts[:level]), [0, 0, 0])
+                if is_dir:
+                    total[2] += 1
+                else:
+                    total[0] += size
+                    total[1] += 1
+        return [(key, *total) for key, total in sorted(totals.items())]
+
+    # Items below a path matching all the given filters: name and path globs (SQLite GLOB, case sensitive), size
+    # bounds in bytes, modified time bounds as epoch seconds and 'f' or 'd' for files or directories only
+    def find(self, path, name=None, path_glob=None, min_size=None, max_size=None, newer=None, older=None,
+             item_type=None):
+        condition, parameters = _subtree(_key(path))
+        conditions, parameters = [condition], list(parameters)
+        for clause, value in (('name GLOB ?', name), ('path GLOB ?', path_glob), ('size >= ?', min_size),
+                              ('size <= ?', max_size), ('mtime >= ?', newer), ('mtime <= ?', older)):
+            if value is not None:
+                conditions.append(clause)
+                parameters.append(value)
+        if item_type is not None:
+            conditions.append('is_dir = ?')
+            parameters.append(int(item_type == 'd'))
+        for row in self._select(' AND '.join(conditions), parameters):
+            yield _item(row)
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+class IndexReport:
+    def __init__(self):
+        self.directories_listed = 0
+        self.directories_skipped = 0
+        self.entries = 0
+        self.failures = []  # list of (remote path, error message)
+        self.elapsed = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+    def __str__(self):
+        return (f'{self.entries} entries indexed, {self.directories_listed} directories listed, '
+                f'{self.directories_skipped} unchanged, {len(self.failures)} failed, {self.elapsed:.2f}s')
+
+
+class RemoteIndexer:
+    def __init__(self, client: FileBrowserClient, snapshot: IndexSnapshot, workers=4, full=False):
+        self.client = client
+        self.snapshot = snapshot
+        self.workers = max(1, workers)
+        self.full = full
+
+    def index(self, target_path) -> IndexReport:
+        report = IndexReport()
+        start = time.perf_counter()
+        # listings run on the pool, the snapshot is only written from this thread
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='index') as pool:
+            pending = {pool.submit(self.client.get_file_info, target_path, False): _key(target_path)}
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._store(future, pending.pop(future), pending, pool, report)
+                    self.snapshot.commit()
+            except KeyboardInterrupt:
+                for future in pending:
+                    future.cancel()
+                raise
+            finally:
+                self.snapshot.commit()
+
+        report.entries = sum(1 for _ in self.snapshot.walk(target_path))
+        report.elapsed = time.perf_counter() - start
+        logger.info(f'Index finished: {report}')
+        for remote_path, message in report.failures:
+            logger.error(f'Failed to list {remote_path}: {message}')
+        return report
+
+    def _store(self, future, path, pending, pool, report):
+        try:
+            current, children = future.result()
+        except FileBrowserError as error:
+            # the stored subtree is kept, the directory is listed again by the next run
+            report.failures.append((path, str(error)))
+            return
+        report.directories_listed += 1
+        self.snapshot.put_listing(path, current, children)
+        for child in children:
+            if not child.isDir:
+                continue
+            child_path = _join_remote(path, child.name)
+            if not self.full and self.snapshot.is_current_leaf(child_path):
+                report.directories_skipped += 1
+                continue
+            pending[pool.submit(self.client.get_file_info, child_path, False)] = child_path
@@ -0,0 +1,80 @@
+import logging
+import posixpath
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from FileBrowserClient import FileBrowserClient, FileBrowserError, _join_remote
+
+"""
+Server side copy, move and delete of many remote paths at once.
+Nothing is transferred through the client, the server copies, renames or deletes. The paths are handled concurrently
+on a bounded thread pool and every path gets its own result in the report.
+"""
+
+logger = logging.getLogger()
+
+
+class ResourceOperationReport:
+    def __init__(self, action):
+        self.action = action
+        self.results = []  # list of (source path, destination path or None, error message or None)
+        self.elapsed = 0.0
+
+    @property
+    def failures(self) -> list:
+        return [result for result in self.results if result[2] is not None]
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+    def __str__(self):
+        return (f'{self.action}: {len(self.results) - len(self.failures)} done, {len(self.failures)} failed, '
+                f'{self.elapsed:.2f}s')
+
+
+class ResourceOperations:
+    def __init__(self, client: FileBrowserClient, workers=4):
+        self.client = client
+        self.workers = max(1, workers)
+
+    # Like cp: several sources, or a destination ending with /, go into the destination directory under their own
+    # name, a single source is copied to the destination path itself
+    def copy(self, sources, destination, override=False) -> ResourceOperationReport:
+        return self._transfer('copy', self.client.copy_resource, sources, destination, override)
+
+    def move(self, sources, destination, override=False) -> ResourceOperationReport:
+        return self._transfer('move', self.client.move_resource, sources, destination, override)
+
+    def delete(self, paths) -> ResourceOperationReport:
+        return self._run('delete', [(path, None) for path in paths],
+                         lambda source, _: self.client.delete_resource(source))
+
+    def _transfer(self, action, operation, sources, destination, override) -> ResourceOperationReport:
+        if len(sources) > 1 or destination.endswith('/'):
+            self.client.create_folder(destination)
+            pairs = [(source, _join_remote(destination, posixpath.basename(source.rstrip('/'))))
+                     for source in sources]
+        else:
+            pairs = [(sources[0], destination)]
+        return self._run(action, pairs, lambda source, target: operation(source, target, override))
+
+    def _run(self, action, pairs, operation) -> ResourceOperationReport:
+        report = ResourceOperationReport(action)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=action) as pool:
+            futures = [(pool.submit(operation, source, target), source, target) for source, target in pairs]
+            for future, source, target in futures:
+                try:
+                    future.result()
+                    report.results.append((source, target, None))
+                except FileBrowserError as error:
+                    report.results.append((source, target, str(error)))
+        report.elapsed = time.perf_counter() - start
+        for source, target, message in report.results:
+            if message is None:
+                logger.info(f'{action} {source}{" -> " + target if target else ""}: ok')
+            else:
+                logger.error(f'{action} {source}{" -> " + target if target else ""}: {message}')
+        logger.info(f'Finished {report}')
+        return report
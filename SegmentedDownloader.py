@@ -0,0 +1,199 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from FileBrowserClient import FileBrowserClient, FileBrowserError, DEFAULT_CHUNK_SIZE
+
+"""
+Parallel multi-connection download.
+Preallocates the local file and fetches HTTP Range segments of /api/raw concurrently, writing each at its offset.
+A sidecar progress file records the finished segments so an interrupted download only fetches what is missing.
+"""
+
+logger = logging.getLogger()
+
+MIN_SEGMENT_SIZE = 1048576
+PROGRESS_SUFFIX = '.progress'
+
+
+class _RangeNotSupported(Exception):
+    pass
+
+
+# Sidecar file next to the download, valid only for the same remote file (size + modified) and segment layout
+class _SegmentProgress:
+    def __init__(self, path, size, modified, segment_size):
+        self.path = path
+        self.state = {'size': size, 'modified': modified, 'segment_size': segment_size, 'done': []}
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                saved = json.load(file)
+        except (OSError, ValueError):
+            return False
+        if any(saved.get(key) != self.state[key] for key in ('size', 'modified', 'segment_size')):
+            return False
+        self.state['done'] = saved.get('done', [])
+        return True
+
+    def done(self) -> set:
+        return set(self.state['done'])
+
+    def mark(self, index: int):
+        with self._lock:
+            self.state['done'].append(index)
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(self.state, file)
+            os.replace(temp_path, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class SegmentedDownloader:
+    def __init__(self, client: FileBrowserClient, connections=4, segment_size=None, max_attempts=3,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+        self.client = client
+        self.connections = max(1, connections)
+        self.segment_size = segment_size
+        self.max_attempts = max_attempts
+        # read size of each segment stream, kept small enough that connections * chunk_size stays modest
+        self.chunk_size = min(chunk_size, 1048576)
+
+    def download(self, target_path, local_download_path, current=None):
+        if current is None:
+            current, _ = self.client.get_file_info(target_path, allow_empty=False)
+        if current.isDir:
+            raise FileBrowserError(f'{target_path} is a directory. Aborting.', 19)
+        size = current.size
+        segment_size = self.segment_size or max(MIN_SEGMENT_SIZE, math.ceil(size / (self.connections * 4)))
+        if self.connections == 1 or size <= segment_size:
+            return self.client.download_file(target_path, local_download_path, self.chunk_size)
+
+        progress = _SegmentProgress(local_download_path + PROGRESS_SUFFIX, size, current.modified, segment_size)
+        resumed = progress.load() and os.path.exists(local_download_path)
+        if not resumed and not self._supports_range(target_path):
+            logger.info('Server ignores Range requests, falling back to a single stream download.')
+            return self.client.download_file(target_path, local_download_path, self.chunk_size)
+
+        segments = [(index, start, min(start + segment_size, size) - 1)
+                    for index, start in enumerate(range(0, size, segment_size))]
+        done = progress.done() if resumed else set()
+        pending = [segment for segment in segments if segment[0] not in done]
+        logger.info(f'Downloading {target_path} ({size} bytes) to {local_download_path} in {len(segments)} '
+                    f'segments over {self.connections} connections, {len(segments) - len(pending)} already done')
+
+        self.client._emit('download_start', path=target_path, local=local_download_path, segments=len(segments),
+                          resumed=len(segments) - len(pending))
+        start_time = time.perf_counter()
+        received = 0
+        failure = None
+        try:
+            # preallocate so every segment can be written at its own offset
+            with open(local_download_path, 'r+b' if resumed else 'wb') as file:
+                file.truncate(size)
+                fd = file.fileno()
+                write_lock = threading.Lock()
+                with ThreadPoolExecutor(max_workers=self.connections, thread_name_prefix='download') as pool:
+                    futures = {pool.submit(self._fetch_segment, target_path, fd, write_lock, file, segment, size):
+                               segment for segment in pending}
+                    # mark segments as they finish, so a failure or Ctrl-C keeps every segment already on disk
+                    for future in as_completed(futures):
+                        if future.cancelled():
+                            continue
+                        _, start, end = futures[future]
+                        try:
+                            future.result()
+                            progress.mark(futures[future][0])
+                            received += end - start + 1
+                        except (_RangeNotSupported, FileBrowserError, OSError) as error:
+                            if isinstance(error, OSError):
+                                error = FileBrowserError(f'Error while writing {local_download_path}: {error}', 19)
+                            failure = failure or error
+                            for other in futures:
+                                other.cancel()
+        except OSError as error:
+            failure = FileBrowserError(f'Error while writing {local_download_path}: {error}', 19)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.client._emit('download_end', path=target_path, ok=failure is None, bytes=received,
+                              seconds=round(elapsed, 6),
+                              mb_per_s=round(received / elapsed / 1048576, 3) if elapsed > 0 else None)
+        if isinstance(failure, _RangeNotSupported):
+            progress.remove()
+            logger.info('Server stopped honouring Range requests, falling back to a single stream download.')
+            return self.client.download_file(target_path, local_download_path, self.chunk_size)
+        if failure is not None:
+            raise failure
+
+        progress.remove()
+        rate = received / elapsed / 1048576 if elapsed > 0 else 0.0
+        logger.info(f'File downloaded successfully, {rate:.2f} MB/s.')
+        # segments arrive out of order, so the finished file is hashed in one pass
+        if self.client.verify_checksum:
+            self.client.verify_file(local_download_path, target_path)
+
+    # Probe with a one byte range, a server honouring it answers 206 Partial Content
+    def _supports_range(self, target_path) -> bool:
+        url = self.client.get_download_link(target_path)
+        try:
+            with self.client.session.get(url, headers={'Range': 'bytes=0-0', 'Accept-Encoding': 'identity'},
+                                         stream=True) as response:
+                response.raise_for_status()
+                return response.status_code == 206
+        except requests.exceptions.RequestException as error:
+            raise FileBrowserError(f'Error while requesting file download: {str(error)}', 19) from error
+
+    def _fetch_segment(self, target_path, fd, write_lock, file, segment, size):
+        index, start, end = segment
+        url = self.client.get_download_link(target_path)
+        attempt = 0
+        offset = start
+        while True:
+            headers = {'Range': f'bytes={offset}-{end}', 'Accept-Encoding': 'identity'}
+            try:
+                with self.client.session.get(url, headers=headers, stream=True) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise _RangeNotSupported()
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        _write_at(fd, write_lock, file, chunk, offset)
+                        self.client._emit('chunk', path=target_path, offset=offset, bytes=len(chunk), size=size)
+                        offset += len(chunk)
+                if offset != end + 1:
+                    raise requests.exceptions.RequestException(
+                        f'segment {index} ended at {offset}, expected {end + 1}')
+                return
+            except requests.exceptions.RequestException as error:
+                attempt += 1
+                logger.error(f'Error while downloading segment {index} at {offset}, '
+                             f'attempt {attempt}/{self.max_attempts}: {error}')
+                if attempt >= self.max_attempts:
+                    raise FileBrowserError(f'Max attempts reached while downloading segment {index}. Aborting.',
+                                           19) from error
+
+
+# os.pwrite is not available on Windows, fall back to seek + write under a lock there
+def _write_at(fd, write_lock, file, data, offset):
+    if hasattr(os, 'pwrite'):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+    else:
+        with write_lock:
+            file.seek(offset)
+            file.write(data)
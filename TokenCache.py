@@ -0,0 +1,71 @@
+import base64
+import json
+import logging
+import os
+import threading
+import time
+
+"""
+On-disk cache of FileBrowser access tokens, one per server and user.
+The file is only readable by its owner. Tokens are JWTs, their exp claim tells how long a cached one can be reused.
+"""
+
+logger = logging.getLogger()
+
+
+# Expiry (unix time) from the exp claim of a JWT, None if the token cannot be decoded
+def token_expiry(token: str):
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenCache:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(api_url: str, username: str) -> str:
+        return f'{username}@{api_url}'
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as error:
+            logger.warning(f'Ignoring unreadable token cache {self.path}: {error}')
+            return {}
+
+    # Cached token that stays valid for at least min_validity seconds, None otherwise
+    def get(self, api_url: str, username: str, min_validity=0.0):
+        with self._lock:
+            token = self._read().get(self.key(api_url, username))
+        if not token:
+            return None
+        expiry = token_expiry(token)
+        if expiry is None or expiry - time.time() <= min_validity:
+            return None
+        return token
+
+    def put(self, api_url: str, username: str, token):
+        with self._lock:
+            tokens = self._read()
+            if token:
+                tokens[self.key(api_url, username)] = token
+            else:
+                tokens.pop(self.key(api_url, username), None)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, mode=0o700, exist_ok=True)
+            temp_path = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            # create the file with owner only permissions before anything is written to it
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(tokens, file)
+            os.replace(temp_path, self.path)
@@ -0,0 +1,73 @@
+import json
+import math
+import sys
+import threading
+import time
+from collections import Counter
+
+"""
+Instrumentation of the HTTP calls of a client and newline-delimited JSON events for --json-output.
+RequestMetrics is fed by a response hook of the client session: one record per HTTP response with its latency (time
+until the response headers arrived) and body sizes. JsonEventWriter writes one JSON object per line, every event has
+a timestamp and an event name.
+"""
+
+
+# Nearest-rank percentile of sorted values: the smallest value with at least fraction of the values at or below it
+def percentile(values: list, fraction: float):
+    if not values:
+        return None
+    # rounded first, 0.07 * 100 is 7.000000000000001 and would take the 8th value
+    return values[min(len(values) - 1, max(0, math.ceil(round(fraction * len(values), 9)) - 1))]
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.by_endpoint = Counter()
+        self._latencies = []
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    def record(self, method: str, endpoint: str, status: int, seconds: float, sent: int, received: int):
+        with self._lock:
+            self.requests += 1
+            if status >= 400:
+                self.errors += 1
+            self.bytes_sent += sent
+            self.bytes_received += received
+            self.by_endpoint[f'{method} {endpoint}'] += 1
+            self._latencies.append(seconds)
+
+    def summary(self, connections=None) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            summary = {
+                'requests': self.requests,
+                'http_errors': self.errors,
+                'connections_opened': connections,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'requests_by_endpoint': dict(self.by_endpoint),
+            }
+        for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+            value = percentile(latencies, fraction)
+            summary[f'latency_{name}_ms'] = None if value is None else round(value * 1000, 3)
+        return summary
+
+
+class JsonEventWriter:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, **fields):
+        line = json.dumps({'ts': round(time.time(), 6), 'event': event, **fields}, default=str)
+        with self._lock:
+            self.counts[event] += 1
+            self.stream.write(line + '\n')
+            self.stream.flush()
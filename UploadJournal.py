@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+import threading
+import time
+
+"""
+Local journal of unfinished TUS uploads.
+Each entry records the local file (path, size, mtime), the remote target and the last acknowledged offset, so that a
+later upload of the same file, even from a new process after a crash or Ctrl-C, resumes instead of starting over.
+"""
+
+logger = logging.getLogger()
+
+
+class UploadJournal:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @staticmethod
+    def key(api_url: str, target_path: str) -> str:
+        return f'{api_url}|{target_path}'
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as file:
+                    self._entries = json.load(file)
+            except FileNotFoundError:
+                self._entries = {}
+            except (OSError, ValueError) as error:
+                logger.warning(f'Ignoring unreadable upload journal {self.path}: {error}')
+                self._entries = {}
+        return self._entries
+
+    # Write to a temporary file first so a crash never leaves a truncated journal behind
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self._entries, file)
+        os.replace(temp_path, self.path)
+
+    def get(self, api_url: str, target_path: str):
+        with self._lock:
+            return self._load().get(self.key(api_url, target_path))
+
+    def start(self, api_url: str, target_path: str, file_path: str, stat: os.stat_result, offset=0):
+        with self._lock:
+            self._load()[self.key(api_url, target_path)] = {
+                'file_path': os.path.abspath(file_path),
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'target_path': target_path,
+                'offset': offset,
+                'updated': time.time(),
+            }
+            self._save()
+
+    def update(self, api_url: str, target_path: str, offset: int):
+        with self._lock:
+            entry = self._load().get(self.key(api_url, target_path))
+            if entry is not None:
+                entry['offset'] = offset
+                entry['updated'] = time.time()
+                self._save()
+
+    def remove(self, api_url: str, target_path: str):
+        with self._lock:
+            if self._load().pop(self.key(api_url, target_path), None) is not None:
+                self._save()
+
+    # True if the entry was written for this exact local file, a changed file must be uploaded from scratch
+    @staticmethod
+    def matches(entry: dict, file_path: str, stat: os.stat_result) -> bool:
+        return (entry.get('file_path') == os.path.abspath(file_path) and entry.get('size') == stat.st_size
+                and entry.get('mtime') == stat.st_mtime)
@@ -19,7 +19,13 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=get_pyd("build", ".") + [],
-    hiddenimports=["requests"],
+    hiddenimports=[
+        "requests",
+        # standard library modules only imported by the compiled modules, invisible to the analysis of main.py
+        "concurrent.futures",  # FolderUploader, FolderDownloader, FolderSync, BatchRunner, ResourceOperations, RemoteIndex
+        "tarfile",  # ArchiveDownloader
+        "sqlite3",  # FolderSync manifest, RemoteIndex snapshot
+    ],
     datas=[],
     hookspath=[],
     hooksconfig={},
@@ -1,11 +1,13 @@
-import requests
 import os, sys
-import json
-import random
-import urllib3
-from FileItem import FileItem
+import functools
+# Only the standard library and Defaults are imported eagerly: requests, urllib3, json and the client and transfer
+# modules are imported by the sub-command that needs them, once the arguments are parsed. UA is re-exported for code
+# that used api.UA before it moved to Defaults
+from Defaults import UA, DEFAULT_CHUNK_SIZE, DEFAULT_MIN_CHUNK_SIZE, DEFAULT_MAX_CHUNK_SIZE, STATE_DIR, \
+    ORDER_POLICIES, ARCHIVE_FORMATS, ALGORITHMS, DEFAULT_ALGORITHM
 import argparse
 import logging
+import time
 from urllib.parse import urlparse
 
 """
@@ -18,9 +20,6 @@ Author: Eric You
 
 logger = logging.getLogger()
 
-# For windows curl to disable ssl certificate verification
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
 # Global variable for the API URL
 HOME_URL = os.getenv('FILEBROWSER_HOME', 'https://demo.filebrowser.org/')
 parsed_home_url = urlparse(HOME_URL)
@@ -32,290 +31,88 @@ FILEBROWSER_PASSWORD = os.getenv('FILEBROWSER_PASSWORD', 'demo')  # Default to '
 
 # For windows curl to disable ssl certificate verification
 DISABLE_VERIFY = True
-TEST_RANDOM_ERROR = False
 
-UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:135.0) Gecko/20100101 Firefox/135.0"
+
+_client = None
+
+
+# Return the shared client built from the environment globals, the pooled connections are reused across calls
+def get_client(token=None, **kwargs) -> 'FileBrowserClient':
+    global _client
+    if _client is None:
+        import urllib3
+        from FileBrowserClient import FileBrowserClient
+        # For windows curl to disable ssl certificate verification
+        if DISABLE_VERIFY:
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        _client = FileBrowserClient(HOME_URL, FILEBROWSER_USERNAME, FILEBROWSER_PASSWORD, api_url=API_URL,
+                                    verify=not DISABLE_VERIFY, **kwargs)
+    if token is not None and token != _client.token:
+        _client.token = token
+    return _client
+
+
+# The module level functions keep the old behaviour of the command line tool: log the error and exit with its code
+def _exit_on_error(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        from FileBrowserClient import FileBrowserError
+        try:
+            return func(*args, **kwargs)
+        except FileBrowserError as error:
+            logger.error(str(error))
+            exit(error.exit_code)
+        except KeyboardInterrupt:
+            exit(16)
+
+    return wrapper
 
 
 # Function to get the access token from the FileBrowser server, only works if using http form authentication
+@_exit_on_error
 def get_token():
-    logger.info('Requesting access token...')
-    try:
-        headers = {
-            'Content-Type': 'application/json',
-            'Accept': '*/*',  # now it returns text instead of json
-            'Accept-Encoding': '',  # do NOT use any compression
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Referer': HOME_URL + '/login',
-            'Origin': HOME_URL,
-            'User-Agent': UA,
-            'Connection': 'keep-alive',
-            'Host': HOSTNAME,
-            'Sec-Fetch-Dest': 'empty',
-            'Sec-Fetch-Mode': 'cors',
-            'Sec-Fetch-Site': 'same-origin',
-            'Sec-GPC': '1'
-        }
-
-        username = FILEBROWSER_USERNAME
-        password = FILEBROWSER_PASSWORD
-        data = {
-            'username': username,
-            'password': password,
-            'recaptcha': ''
-        }
-        logger.debug(json.dumps(data))
-        response = requests.post(f'{API_URL}/login', data=json.dumps(data), headers=headers,
-                                 verify=not DISABLE_VERIFY)
-        response.raise_for_status()
-        logger.info('Access token received.')
-        return response.content.decode(response.encoding or 'utf-8')
-    except requests.exceptions.RequestException as error:
-        logger.error(f"Error while requesting access token: {str(error)}")
-        exit(13)
+    return get_client().login()
 
 
+@_exit_on_error
 def create_folder(token: str, target_path: str, override=False):
-    if not target_path.endswith("/"):
-        target_path = target_path + "/"
-    if target_path.startswith("/"):
-        target_path = target_path[1:]
-    logger.debug('Creating folder at', target_path)
-    request_url = f'{API_URL}/resources/{target_path}?override={str(override)}'
-    try:
-        request_headers = {
-            'Content-Type': 'text/plain;charset=UTF-8',
-            'X-Auth': token,
-            "Referrer": HOME_URL,
-            "Origin": HOME_URL,
-            "User-Agent": UA,
-            "Connection": "keep-alive",
-            "Accept": "*/*",
-            "Accept-Encoding": "gzip, deflate, br",
-            "Accept-Language": "en-US,en;q=0.5",
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Site": "same-origin",
-            "Sec-GPC": "1",
-            "Cookie": f"auth={token}"
-        }
-        response = requests.post(request_url, headers=request_headers, verify=not DISABLE_VERIFY)
-        response.raise_for_status()
-
-        logger.info(f'Folder created successfully at {target_path}.')
-
-    except requests.exceptions.RequestException as error:
-        logger.error(f"Error while creating folder at {target_path}: {str(error)}")
-        exit(15)
-
-
-# Function to upload a chunk of the file
-def upload_chunk(url, chunk, headers, attempt, max_attempts):
-    while attempt < max_attempts:
-        try:
-            response = requests.patch(url, data=chunk, headers=headers, verify=not DISABLE_VERIFY)
-            response.raise_for_status()
-            return response.status_code, response.text
-        except requests.exceptions.RequestException as error:
-            attempt += 1
-            logger.error(
-                f"Error while uploading chunk at {headers.get('Upload-Offset', 0)}, "
-                f"attempt {attempt}/{max_attempts}: {str(error)}")
-            if attempt == max_attempts:
-                raise Exception(
-                    f"Max attempts reached while uploading chunk offset {headers.get('Upload-Offset', 0)}. Aborting.")
-    return None
+    get_client(token).create_folder(target_path, override)
 
 
 # Function to upload a text file to the FileBrowser server with retry logic
-def upload_file(token, file_path, target_path, override=False, max_attempts=3, chunk_size=10485760):
-    if target_path.startswith('/'):
-        target_path = target_path[1:]
-    logger.info(f'Uploading file {file_path} to remote {target_path}')
-    if check_remote_exists(token, target_path):
-        logger.error(f'Remote path already exists at {target_path}. Aborting.')
-        exit(11)
-    request_url = f'{API_URL}/tus/{target_path}?override={str(override)}'
-    failure = False
-    expected_file_size = -1 if os.path.isdir(file_path) else os.path.getsize(file_path)
+@_exit_on_error
+def upload_file(token, file_path, target_path, override=False, max_attempts=3, chunk_size=DEFAULT_CHUNK_SIZE):
+    get_client(token).upload_file(file_path, target_path, override, max_attempts, chunk_size)
 
-    try:
-        file_created = requests.post(request_url,
-                                     headers={'X-Auth': token},
-                                     verify=not DISABLE_VERIFY)
-        file_created.raise_for_status()
-        logger.debug(f"status code: {file_created.status_code} , response: {file_created.text}")
-        logger.debug('File created successfully. start uploading chunks...')
-
-        upload_chunk_headers = {
-            'Content-Type': 'application/offset+octet-stream',
-            #content_type,  #TODO ADJUST THIS PER FILETYPE (img, pdf, etc)?
-            'X-Auth': token,
-            "Tus-Resumable": "1.0.0",
-            "Referrer": HOME_URL,
-            "Origin": HOME_URL,
-            "User-Agent": UA,
-            "Connection": "keep-alive",
-            "Accept": "*/*",
-            "Accept-Encoding": "gzip, deflate, br",
-            "Accept-Language": "en-US,en;q=0.5",
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Site": "same-origin",
-            "Sec-GPC": "1",
-            "Cookie": f"auth={token}"
-        }
-
-        with open(file_path, 'rb') as file:
-            while chunk := file.read(chunk_size):
-                new_headers = upload_chunk_headers.copy()
-                new_headers['Upload-Offset'] = str(file.tell() - len(chunk))
-                logger.debug(f'Processing chunk at offset {new_headers["Upload-Offset"]}...')
-                attempt = 0
-                while attempt < max_attempts:
-                    try:
-                        if TEST_RANDOM_ERROR:
-                            test = random.randrange(1, 10)
-                            if test <= 6:
-                                failure = True
-                                raise requests.exceptions.RequestException('Random error')
-                        response = requests.patch(request_url, data=chunk, headers=new_headers,
-                                                  verify=not DISABLE_VERIFY)
-                        response.raise_for_status()
-                        logger.debug(
-                            f"processing chunk at {new_headers.get('Upload-Offset', 0)} "
-                            f"status code: {response.status_code} , response: {response.text}")
-                        break
-                    except requests.exceptions.RequestException as error:
-                        attempt += 1
-                        logger.error(
-                            f'Error while uploading chunk at {new_headers.get("Upload-Offset", 0)}, '
-                            f'attempt {attempt}/{max_attempts}:',
-                            error)
-                        if attempt == max_attempts:
-                            failure = True
-                            raise Exception(f'Max attempts reached while processing chunk at '
-                                            f'{new_headers.get("Upload-Offset", 0)}. Aborting.')
-
-        logger.info('File uploaded successfully.')
-    except (KeyboardInterrupt, SystemExit):
-        logger.info('Upload process cancelled by user.')
-        failure = True
-    except (requests.exceptions.RequestException, IOError) as error:
-        logger.error('Error while uploading file: ', error)
-        failure = True
-    finally:
-        logger.info('Finalizing upload...')
-        if failure:
-            logger.info('deleting unfinished file because of a failure...')
-            delete_file(token, target_path, expected_file_size)
-            exit(16)
-        else:
-            logger.info('file uploaded successfully.')
-
-
-def upload_file_or_folder(token, file_path, target_path, override=False, max_attempts=3, chunk_size=10485760):
-    if not os.path.exists(file_path):
-        logger.error(f"Local file '{file_path}' does not exist. Aborting.")
-        exit(12)
-
-    # now starts the os walk
-    if not os.path.isdir(file_path):
-        return upload_file(token, file_path, target_path, override=override, max_attempts=max_attempts,
-                           chunk_size=chunk_size)
-
-    for root, dirs, files in os.walk(file_path):
-        # if uploading files first, it will create non-existing folders recursively first, this is safe.
-        # if creating folder first, it will yield error of 404 not found, it doesn't support create folder recursively
-        for file in files:
-            new_src_path = os.path.join(root, file)
-            new_target_path = target_path + file if target_path.endswith('/') else target_path + '/' + file
-            logger.info(f'Uploading file to remote path {new_target_path} ...')
-            upload_file(token, new_src_path, new_target_path, override=override, max_attempts=max_attempts,
-                        chunk_size=chunk_size)
-        for dirname in dirs:
-            new_src_path = os.path.join(root, dirname)
-            new_target_path = target_path + dirname if target_path.endswith('/') else target_path + '/' + dirname
-            logger.info(f'Uploading directory to remote path {new_target_path} ...')
-            create_folder(token, new_target_path)
-            # os.walk() uses dfs, so no need to use recursion. just create all directory here.
-            # upload_file_or_folder(token, new_src_path, new_target_path, override=override, max_attempts=max_attempts,
-            #                       chunk_size=chunk_size)
-    return None
 
+@_exit_on_error
+def upload_file_or_folder(token, file_path, target_path, override=False, max_attempts=3,
+                          chunk_size=DEFAULT_CHUNK_SIZE):
+    return get_client(token).upload_file_or_folder(file_path, target_path, override, max_attempts, chunk_size)
 
-def delete_file(token, target_path, compare_size=-1):
-    if target_path.startswith('/'):
-        target_path = target_path[1:]
-    request_url = f'{API_URL}/tus/{target_path}'
 
-    if compare_size <= 0:
-        requests.delete(request_url, headers={'X-Auth': token}, verify=not DISABLE_VERIFY)
-    else:
-        #get file size and compare
-        logger.debug('not implemented the file size compare...')
-        requests.delete(request_url, headers={'X-Auth': token}, verify=not DISABLE_VERIFY)
-        pass
+def delete_file(token, target_path, compare_size=-1):
+    get_client(token).delete_file(target_path, compare_size)
 
 
+@_exit_on_error
 def check_remote_exists(token, target_path) -> bool:
-    logger.debug("Checking remote existence... " + target_path)
-    current_file, sub_files = get_file_info(token, target_path)
-    return current_file is not None
+    return get_client(token).check_remote_exists(target_path)
 
 
+@_exit_on_error
 def get_file_info(token, target_path, allow_empty=True):
-    if target_path.startswith('/'):
-        target_path = target_path[1:]
-    response = requests.get(f"{API_URL}/resources/{target_path}", headers={'X-Auth': token},
-                            verify=not DISABLE_VERIFY)
-    logger.debug(f"status code: {response.status_code}")
-    if not response.ok:
-        logger.debug(f'get_file_info response: {response.text}')
-        if allow_empty and response.status_code == 404:
-            return None, []
-        else:
-            logger.error(f"Error while getting file info: {response.status_code} - {response.text}")
-            exit(18)
-    decoded = json.loads(response.text)
-    current_file = FileItem(decoded['name'], decoded['size'], decoded['path'], decoded['extension'],
-                            decoded['modified'], decoded['mode'], decoded['isDir'], decoded['isSymlink'],
-                            decoded['type'])
-    sub_files = [
-        FileItem(x['name'], x['size'], x['path'], x['extension'], x['modified'], x['mode'], x['isDir'], x['isSymlink'],
-                 x['type']) for x in decoded.get('items', [])]
-    return current_file, sub_files
+    return get_client(token).get_file_info(target_path, allow_empty)
 
 
 # Function to download a text file from the FileBrowser server
 def get_download_link(token, target_path):
-    if target_path.startswith('/'):
-        target_path = target_path[1:]
-    # Why use different endpoints for upload and download? (resources vs raw)
-    return f'{API_URL}/raw/{target_path}?auth={token}'
+    return get_client(token).get_download_link(target_path)
 
 
-def download_file(token, target_path, local_download_path, chunk_size=10485760):
-    if target_path.startswith('/'):
-        target_path = target_path[1:]
-
-    logger.info(f'Downloading file {target_path} to {local_download_path}...')
-    download_url = get_download_link(token,
-                                     target_path)
-
-    headers = {
-        'X-Auth': token
-    }
-    try:
-        response = requests.get(download_url, headers=headers, stream=True, verify=not DISABLE_VERIFY)
-        response.raise_for_status()
-        with open(local_download_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=chunk_size):
-                file.write(chunk)
-        logger.info('File downloaded successfully.')
-    except requests.exceptions.RequestException as error:
-        logger.error('Error while requesting file download:', error)
-        exit(19)
+@_exit_on_error
+def download_file(token, target_path, local_download_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    get_client(token).download_file(target_path, local_download_path, chunk_size)
 
 
 # Function to configure the logger level
@@ -347,6 +144,206 @@ def configure_logging(to_file=False, to_stdout=True, filename='app.log'):
         logger.addHandler(console_handler)
 
 
+# Chunk size argument: a number of bytes, or auto for adaptive sizing
+def chunk_size_argument(value: str):
+    if value == 'auto':
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid chunk size '{value}', expected a number of bytes or auto")
+
+
+_SIZE_UNITS = {'K': 1024, 'M': 1048576, 'G': 1073741824, 'T': 1099511627776}
+
+
+# Size argument: a number of bytes with an optional K, M, G or T suffix
+def size_argument(value: str):
+    text = value.strip().upper().rstrip('B')
+    try:
+        if text[-1:] in _SIZE_UNITS:
+            return int(float(text[:-1]) * _SIZE_UNITS[text[-1]])
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size '{value}', expected bytes with an optional K/M/G/T suffix")
+
+
+_AGE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+# Time argument: an age like 30m, 12h or 7d before now, or an ISO date/time, as epoch seconds
+def time_argument(value: str):
+    from datetime import datetime
+    try:
+        if value[-1:] in _AGE_UNITS:
+            return time.time() - float(value[:-1]) * _AGE_UNITS[value[-1]]
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time '{value}', expected an age like 7d or an ISO date")
+
+
+# Log one resulting item, or emit it as an event with --json-output (stdout carries the events only)
+def _output_item(client: 'FileBrowserClient', item, line: str, event='item'):
+    if client.events is not None:
+        client.events.emit(event, **item.to_dict())
+    else:
+        logger.info(line, stacklevel=2)
+
+
+# Run one parsed sub-command against a logged in client, failures are raised as FileBrowserError
+def run_command(client: 'FileBrowserClient', args):
+    from FileBrowserClient import FileBrowserError
+    if getattr(args, 'verify', None):
+        client.verify_checksum = args.verify
+    client.skip_identical = getattr(args, 'skip_identical', False)
+    if getattr(args, 'chunk_size', None) == 'auto':
+        from ChunkSizer import AdaptiveChunkSizer
+        client.chunk_sizer = AdaptiveChunkSizer(args.min_chunk_size, args.max_chunk_size)
+        args.chunk_size = args.max_chunk_size
+
+    if args.command == 'upload':
+        from UploadJournal import UploadJournal
+        from FolderUploader import FolderUploader
+        if not args.no_resume:
+            client.journal = UploadJournal(os.path.join(STATE_DIR, 'upload_journal.json'))
+        if os.path.isdir(args.file_path):
+            # a folder always goes through FolderUploader, failed files are collected instead of ending the upload
+            uploader = FolderUploader(client, workers=args.workers, order=args.order,
+                                      max_inflight_bytes=args.max_inflight_bytes, override=args.override,
+                                      max_attempts=args.max_attempts, chunk_size=args.chunk_size)
+            report = uploader.upload(args.file_path, args.target_path)
+            if not report.ok:
+                raise FileBrowserError(f'{len(report.failures)} uploads failed.', 16)
+        else:
+            client.upload_file_or_folder(args.file_path, args.target_path, args.override, args.max_attempts,
+                                         args.chunk_size)
+
+    elif args.command == 'download':
+        from SegmentedDownloader import SegmentedDownloader
+        from FolderDownloader import FolderDownloader
+        from ArchiveDownloader import ArchiveDownloader
+        current, _ = client.get_file_info(args.target_path, allow_empty=False)
+        if current.isDir and args.archive:
+            downloader = ArchiveDownloader(client, algo=args.archive, chunk_size=args.chunk_size)
+            downloader.download(args.target_path, args.local_download_path, extract=not args.save_archive)
+        elif current.isDir:
+            downloader = FolderDownloader(client, workers=args.workers, list_workers=args.list_workers,
+                                          chunk_size=args.chunk_size)
+            report = downloader.download(args.target_path, args.local_download_path, current)
+            if not report.ok:
+                raise FileBrowserError(f'{len(report.failures)} downloads failed.', 19)
+        elif args.connections > 1:
+            downloader = SegmentedDownloader(client, connections=args.connections, segment_size=args.segment_size,
+                                             chunk_size=args.chunk_size)
+            downloader.download(args.target_path, args.local_download_path, current)
+        else:
+            client.download_file(args.target_path, args.local_download_path, args.chunk_size)
+
+    elif args.command == 'sync':
+        from UploadJournal import UploadJournal
+        from FolderSync import FolderSync, SyncManifest
+        if not args.no_resume:
+            client.journal = UploadJournal(os.path.join(STATE_DIR, 'upload_journal.json'))
+        manifest = SyncManifest(args.manifest or os.path.join(STATE_DIR, 'sync_manifest.sqlite'),
+                                f'{client.username}@{client.api_url}', args.target_path)
+        try:
+            report = FolderSync(client, manifest, workers=args.workers, delete=args.delete, full=args.full,
+                                max_attempts=args.max_attempts, chunk_size=args.chunk_size).sync(args.file_path,
+                                                                                                 args.target_path)
+        finally:
+            manifest.close()
+        if not report.ok:
+            raise FileBrowserError(f'{len(report.failures)} sync operations failed.', 16)
+
+    elif args.command == 'getdownloadlink':
+        link = client.get_download_link(args.target_path)
+        if client.events is not None:
+            client.events.emit('download_link', path=args.target_path, link=link)
+        else:
+            logger.info(link)
+
+    elif args.command == 'getfileinfo':
+        if args.stream:
+            # children are logged as they arrive, the listed resource itself comes last
+            with client.get_file_info(args.target_path, False, stream=True) as listing:
+                for child in listing:
+                    _output_item(client, child, repr(child))
+                _output_item(client, listing.current, repr(listing.current), event='current')
+            return
+        current, children = client.get_file_info(args.target_path, False)
+        _output_item(client, current, repr(current), event='current')
+        [_output_item(client, child, repr(child)) for child in children]
+    elif args.command in ('batch', 'serve'):
+        from UploadJournal import UploadJournal
+        from TransferMetrics import JsonEventWriter
+        from BatchRunner import BatchRunner
+        if not args.no_resume:
+            client.journal = UploadJournal(os.path.join(STATE_DIR, 'upload_journal.json'))
+        runner = BatchRunner(client, workers=args.workers, max_attempts=args.max_attempts, chunk_size=args.chunk_size,
+                             writer=client.events or JsonEventWriter(sys.stdout), renew=args.command == 'serve')
+        if args.command == 'serve' or args.manifest == '-':
+            ok, failed = runner.run(sys.stdin)
+        else:
+            with open(args.manifest, 'r', encoding='utf-8') as manifest:
+                ok, failed = runner.run(manifest)
+        # a server keeps going whatever single operations did, a batch reports failures through its exit code
+        if failed and args.command == 'batch':
+            raise FileBrowserError(f'{failed} of {ok + failed} batch operations failed.', 22)
+
+    elif args.command in ('copy', 'move'):
+        from ResourceOperations import ResourceOperations
+        operations = ResourceOperations(client, workers=args.workers)
+        transfer = operations.copy if args.command == 'copy' else operations.move
+        report = transfer(args.source_paths, args.destination_path, args.override)
+        if not report.ok:
+            raise FileBrowserError(f'{len(report.failures)} of {len(report.results)} paths failed.', 24)
+
+    elif args.command == 'delete':
+        from ResourceOperations import ResourceOperations
+        report = ResourceOperations(client, workers=args.workers).delete(args.target_paths)
+        if not report.ok:
+            raise FileBrowserError(f'{len(report.failures)} of {len(report.results)} paths failed.', 21)
+
+    elif args.command == 'index':
+        from RemoteIndex import IndexSnapshot, RemoteIndexer
+        snapshot = IndexSnapshot(args.snapshot or os.path.join(STATE_DIR, 'remote_index.sqlite'),
+                                 f'{client.username}@{client.api_url}')
+        try:
+            report = RemoteIndexer(client, snapshot, workers=args.workers, full=args.full).index(args.target_path)
+        finally:
+            snapshot.close()
+        if not report.ok:
+            raise FileBrowserError(f'{len(report.failures)} directory listings failed.', 18)
+
+    elif args.command == 'query':
+        from RemoteIndex import IndexSnapshot
+        snapshot = IndexSnapshot(args.snapshot or os.path.join(STATE_DIR, 'remote_index.sqlite'),
+                                 f'{client.username}@{client.api_url}')
+        try:
+            if snapshot.get(args.target_path) is None:
+                raise FileBrowserError(f'{args.target_path} is not in the snapshot, run index first.', 18)
+            if args.query_command == 'du':
+                for path, size, files, directories in snapshot.du(args.target_path, args.depth):
+                    if client.events is not None:
+                        client.events.emit('du', path=path, bytes=size, files=files, directories=directories)
+                    else:
+                        logger.info(f'{size}\t{files} files\t{directories} directories\t{path}')
+            elif args.query_command == 'find':
+                for item in snapshot.find(args.target_path, args.name, args.path, args.min_size, args.max_size,
+                                          args.newer, args.older, args.type):
+                    _output_item(client, item, item.path)
+            else:
+                items = snapshot.walk(args.target_path) if args.recursive else snapshot.children(args.target_path)
+                for item in items:
+                    _output_item(client, item, f"{'d' if item.isDir else '-'} {item.size:>14} {item.modified} "
+                                               f"{item.path}")
+        finally:
+            snapshot.close()
+
+    else:
+        raise FileBrowserError('Invalid command. Aborting.', 17)
+
+
 # Main function to control the flow of the program
 def main():
     def parse_arguments():
@@ -354,12 +351,16 @@ def main():
             description='FileBrowser API Client, a command line utility tool for HTTP File Browser, Author: Eric You')
 
         parser.add_argument('--json-output', action='store_true', default=False,
-                            help='Enable JSON output, will disable stdout log messages but produce formatted JSON '
-                                 'string reporting to stdout [NOT IMPLEMENTED YET]')
+                            help='Enable JSON output, will disable stdout log messages and write newline-delimited '
+                                 'JSON events (start, per-chunk progress, retries, errors, summary) to stdout')
 
         parser.add_argument('--loglevel', type=str, default='INFO',
                             help='Set the logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)')
         parser.add_argument('--logfile', type=str, default='app.log', help='Set the log file path')
+        parser.add_argument('--no_token_cache', action='store_true',
+                            help='Always log in instead of reusing the access token cached in the state dir')
+        parser.add_argument('--cache_ttl', type=float, default=30.0,
+                            help='Seconds a remote listing stays cached for existence checks, 0 disables the cache')
 
         subparsers = parser.add_subparsers(dest='command', required=True)
 
@@ -369,15 +370,76 @@ def main():
         upload_parser.add_argument('target_path', type=str, help='Target path on the server')
         upload_parser.add_argument('--override', action='store_true', help='Override existing file')
         upload_parser.add_argument('--max_attempts', type=int, default=3, help='Maximum upload attempts')
-        upload_parser.add_argument('--chunk_size', type=int, default=10485760, help='Chunk size in bytes')
+        upload_parser.add_argument('--verify', nargs='?', const=DEFAULT_ALGORITHM, choices=ALGORITHMS,
+                                   help='Verify every transferred file against the server checksum, hashed while '
+                                        f'transferring (default algorithm: {DEFAULT_ALGORITHM})')
+        upload_parser.add_argument('--chunk_size', type=chunk_size_argument, default=DEFAULT_CHUNK_SIZE,
+                                   help='Chunk size in bytes, or auto to adapt it to the measured throughput')
+        upload_parser.add_argument('--min_chunk_size', type=int, default=DEFAULT_MIN_CHUNK_SIZE,
+                                   help='Lower bound of --chunk_size auto')
+        upload_parser.add_argument('--max_chunk_size', type=int, default=DEFAULT_MAX_CHUNK_SIZE,
+                                   help='Upper bound of --chunk_size auto')
+        upload_parser.add_argument('--no_resume', action='store_true',
+                                   help='Do not journal unfinished uploads, delete them on failure instead of resuming')
+        upload_parser.add_argument('--workers', type=int, default=1,
+                                   help='Number of files uploaded concurrently when uploading a folder')
+        upload_parser.add_argument('--order', type=str, choices=ORDER_POLICIES, default='largest',
+                                   help='Order in which folder files are scheduled')
+        upload_parser.add_argument('--max_inflight_bytes', type=int, default=None,
+                                   help='Cap on the chunk bytes held in memory by concurrent uploads '
+                                        '(default: two chunk buffers per worker)')
+
+        upload_parser.add_argument('--skip_identical', '--skip-identical', action='store_true',
+                                   help='Skip files whose remote copy has the same size and checksum, combine with '
+                                        '--override to replace the ones that differ')
 
         # Download command
-        download_parser = subparsers.add_parser('download', help='Download a file')
+        download_parser = subparsers.add_parser('download', help='Download a file or a folder')
         download_parser.add_argument('target_path', type=str, help='Target path on the server')
         download_parser.add_argument('local_download_path', type=str,
-                                     help='Local path to save the downloaded file')
-        download_parser.add_argument('--chunk_size', type=int, default=10485760,
+                                     help='Local path to save the downloaded file or folder')
+        download_parser.add_argument('--verify', nargs='?', const=DEFAULT_ALGORITHM, choices=ALGORITHMS,
+                                     help='Verify every transferred file against the server checksum, hashed while '
+                                          f'transferring (default algorithm: {DEFAULT_ALGORITHM})')
+        download_parser.add_argument('--chunk_size', type=int, default=DEFAULT_CHUNK_SIZE,
                                      help='Chunk size in bytes')
+        download_parser.add_argument('--connections', type=int, default=1,
+                                     help='Number of concurrent HTTP Range requests, resumable when above 1')
+        download_parser.add_argument('--segment_size', type=int, default=None,
+                                     help='Size of each Range segment in bytes (default: derived from file size)')
+        download_parser.add_argument('--workers', type=int, default=4,
+                                     help='Number of files downloaded concurrently when downloading a folder')
+        download_parser.add_argument('--list_workers', type=int, default=4,
+                                     help='Number of concurrent directory listings when downloading a folder')
+        download_parser.add_argument('--archive', type=str, choices=tuple(ARCHIVE_FORMATS), default=None,
+                                     help='Download a folder as one server-side archive, extracted while it streams')
+        download_parser.add_argument('--save_archive', action='store_true',
+                                     help='With --archive, save the archive as-is to local_download_path')
+
+        # Sync command
+        sync_parser = subparsers.add_parser('sync', help='Upload only new or changed files of a folder')
+        sync_parser.add_argument('file_path', type=str, help='Path to the local folder to sync')
+        sync_parser.add_argument('target_path', type=str, help='Target folder on the server')
+        sync_parser.add_argument('--delete', action='store_true',
+                                 help='Delete remote files and folders that do not exist locally, lists every '
+                                      'remote directory to find them')
+        sync_parser.add_argument('--full', action='store_true',
+                                 help='List every remote directory instead of trusting the manifest for unchanged ones')
+        sync_parser.add_argument('--manifest', type=str, default=None,
+                                 help='Path of the SQLite manifest (default: sync_manifest.sqlite in the state dir)')
+        sync_parser.add_argument('--workers', type=int, default=4, help='Number of concurrent transfers')
+        sync_parser.add_argument('--max_attempts', type=int, default=3, help='Maximum upload attempts')
+        sync_parser.add_argument('--verify', nargs='?', const=DEFAULT_ALGORITHM, choices=ALGORITHMS,
+                                 help='Verify every transferred file against the server checksum, hashed while '
+                                      f'transferring (default algorithm: {DEFAULT_ALGORITHM})')
+        sync_parser.add_argument('--chunk_size', type=chunk_size_argument, default=DEFAULT_CHUNK_SIZE,
+                                 help='Chunk size in bytes, or auto to adapt it to the measured throughput')
+        sync_parser.add_argument('--min_chunk_size', type=int, default=DEFAULT_MIN_CHUNK_SIZE,
+                                 help='Lower bound of --chunk_size auto')
+        sync_parser.add_argument('--max_chunk_size', type=int, default=DEFAULT_MAX_CHUNK_SIZE,
+                                 help='Upper bound of --chunk_size auto')
+        sync_parser.add_argument('--no_resume', action='store_true',
+                                 help='Do not journal unfinished uploads, delete them on failure instead of resuming')
 
         # Get download link command
         get_download_link_parser = subparsers.add_parser('getdownloadlink', help='Get download link for a file')
@@ -386,6 +448,65 @@ def main():
         # Get file info command
         get_file_info_parser = subparsers.add_parser('getfileinfo', help='Get file information')
         get_file_info_parser.add_argument('target_path', type=str, help='Target path on the server')
+        get_file_info_parser.add_argument('--stream', action='store_true',
+                                          help='Parse and print the children while the listing is received, for '
+                                               'huge directories')
+
+        # Server side copy, move and delete, nothing is transferred through the client
+        copy_parser = subparsers.add_parser('copy', help='Copy files or folders on the server')
+        move_parser = subparsers.add_parser('move', help='Move or rename files or folders on the server')
+        for command_parser in (copy_parser, move_parser):
+            command_parser.add_argument('source_paths', type=str, nargs='+', help='Source paths on the server')
+            command_parser.add_argument('destination_path', type=str,
+                                        help='Destination path, a folder if several sources are given or it ends '
+                                             'with /')
+            command_parser.add_argument('--override', action='store_true', help='Override existing destinations')
+            command_parser.add_argument('--workers', type=int, default=4, help='Paths processed concurrently')
+        delete_parser = subparsers.add_parser('delete', help='Delete files or folders (recursively) on the server')
+        delete_parser.add_argument('target_paths', type=str, nargs='+', help='Paths on the server')
+        delete_parser.add_argument('--workers', type=int, default=4, help='Paths processed concurrently')
+
+        # Remote tree snapshot, index crawls the server and query answers from the snapshot only
+        index_parser = subparsers.add_parser('index', help='Crawl a remote folder into the local snapshot')
+        index_parser.add_argument('target_path', type=str, help='Target folder on the server')
+        index_parser.add_argument('--workers', type=int, default=4, help='Number of concurrent directory listings')
+        index_parser.add_argument('--full', action='store_true',
+                                  help='List every directory instead of trusting unchanged ones in the snapshot')
+        query_parser = subparsers.add_parser('query', help='Query the local snapshot without contacting the server')
+        query_subparsers = query_parser.add_subparsers(dest='query_command', required=True)
+        du_parser = query_subparsers.add_parser('du', help='Total size of a folder')
+        du_parser.add_argument('--depth', type=int, default=0, help='Also show subfolders down to this depth')
+        find_parser = query_subparsers.add_parser('find', help='Find files and folders by glob, size or time')
+        find_parser.add_argument('--name', type=str, default=None, help='Glob on the name, e.g. "*.parquet"')
+        find_parser.add_argument('--path', type=str, default=None, help='Glob on the full remote path')
+        find_parser.add_argument('--type', type=str, choices=('f', 'd'), default=None,
+                                 help='Only files (f) or folders (d)')
+        find_parser.add_argument('--min_size', type=size_argument, default=None, help='Minimum size, e.g. 10M')
+        find_parser.add_argument('--max_size', type=size_argument, default=None, help='Maximum size, e.g. 1G')
+        find_parser.add_argument('--newer', type=time_argument, default=None,
+                                 help='Modified after this time, an age like 7d or an ISO date')
+        find_parser.add_argument('--older', type=time_argument, default=None,
+                                 help='Modified before this time, an age like 7d or an ISO date')
+        ls_parser = query_subparsers.add_parser('ls', help='List a folder')
+        ls_parser.add_argument('-R', '--recursive', action='store_true', help='List the whole subtree')
+        for command_parser in (du_parser, find_parser, ls_parser):
+            command_parser.add_argument('target_path', type=str, help='Folder on the server')
+        for command_parser in (index_parser, du_parser, find_parser, ls_parser):
+            command_parser.add_argument('--snapshot', type=str, default=None,
+                                        help='Path of the SQLite snapshot (default: remote_index.sqlite in the state '
+                                             'dir)')
+
+        # Batch commands, one JSON operation per line and one JSON result per operation on stdout
+        batch_parser = subparsers.add_parser('batch', help='Run the operations of a JSONL manifest in one process')
+        batch_parser.add_argument('manifest', type=str, help='JSONL file of operations, - for stdin')
+        serve_parser = subparsers.add_parser('serve', help='Run JSONL operations read from stdin until it is closed')
+        for command_parser in (batch_parser, serve_parser):
+            command_parser.add_argument('--workers', type=int, default=4, help='Operations running at the same time')
+            command_parser.add_argument('--max_attempts', type=int, default=3, help='Default attempts per chunk')
+            command_parser.add_argument('--chunk_size', type=int, default=DEFAULT_CHUNK_SIZE,
+                                        help='Default chunk size in bytes')
+            command_parser.add_argument('--no_resume', action='store_true',
+                                        help='Do not journal unfinished uploads')
 
         return parser.parse_args()
 
@@ -401,38 +522,63 @@ def main():
 
     configure_logging()
     configure_logger_level(numeric_level)
-    if enable_json_output:
+    # stdout carries the JSON lines only
+    if enable_json_output or args.command in ('batch', 'serve'):
         if args.logfile:
             configure_logging(to_file=True, to_stdout=False, filename=args.logfile)
         else:
             configure_logging(to_file=False, to_stdout=False)
 
-    token_data = get_token()
-    if not token_data:
-        logger.error('No access token received. Aborting.')
-        exit(20)
-    token = token_data
-    # parse commands
-    if args.command == 'upload':
-        upload_file_or_folder(token, args.file_path, args.target_path, args.override, args.max_attempts,
-                              args.chunk_size)
-
-    elif args.command == 'download':
-        download_file(token, args.target_path, args.local_download_path, args.chunk_size)
+    from FileBrowserClient import FileBrowserError
+    client = get_client(pool_maxsize=max(16, getattr(args, 'workers', 1), getattr(args, 'connections', 1)))
+    if args.cache_ttl > 0:
+        from MetadataCache import MetadataCache
+        client.cache = MetadataCache(ttl=args.cache_ttl)
+    if not args.no_token_cache:
+        from TokenCache import TokenCache
+        client.token_cache = TokenCache(os.path.join(STATE_DIR, 'tokens.json'))
+    if enable_json_output:
+        from TransferMetrics import RequestMetrics, JsonEventWriter
+        client.metrics = RequestMetrics()
+        client.events = JsonEventWriter(sys.stdout)
+        client.events.emit('start', command=args.command,
+                           arguments={key: value for key, value in vars(args).items() if key != 'command'})
+    exit_code = 0
+    try:
+        # queries are answered from the local snapshot alone
+        if args.command != 'query':
+            client.authenticate()
+        run_command(client, args)
+        if client.cache is not None:
+            logger.debug(f'Metadata cache: {client.cache.stats()}')
+        if client.chunk_sizer is not None:
+            logger.info(f'Adaptive chunk sizes: {client.chunk_sizer.summary()}')
+    except FileBrowserError as error:
+        logger.error(str(error))
+        exit_code = error.exit_code
+        if client.events is not None:
+            client.events.emit('error', message=str(error), exit_code=error.exit_code)
+    except KeyboardInterrupt:
+        logger.info('Cancelled by user.')
+        exit_code = 16
+        if client.events is not None:
+            client.events.emit('error', message='Cancelled by user.', exit_code=exit_code)
+    finally:
+        if client.events is not None:
+            emit_summary(client, args.command, exit_code)
+        client.close()
 
-    elif args.command == 'getdownloadlink':
-        logger.info(get_download_link(token, args.target_path))
+    exit(exit_code)
 
-    elif args.command == 'getfileinfo':
-        current, children = get_file_info(token, args.target_path, False)
-        logger.info(repr(current))
-        [logger.info(repr(child)) for child in children]
-    # TODO delete file/folder sub-command
-    else:
-        logger.error('Invalid command. Aborting.')
-        exit(17)
 
-    exit(0)
+# Final event of --json-output: transfer totals and the request metrics collected by the client's response hook
+def emit_summary(client: 'FileBrowserClient', command, exit_code):
+    metrics = client.metrics.summary(connections=client.connections_opened())
+    elapsed = time.perf_counter() - client.metrics.started
+    total = metrics['bytes_sent'] + metrics['bytes_received']
+    client.events.emit('summary', command=command, ok=exit_code == 0, exit_code=exit_code, bytes=total,
+                       seconds=round(elapsed, 6), mb_per_s=round(total / elapsed / 1048576, 3) if elapsed > 0 else None,
+                       retries=client.events.counts['retry'], **metrics)
 
 
 # Start the program
@@ -0,0 +1,110 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from FileBrowserProtocol import ListingParser, parse_resource  # noqa: E402
+
+"""
+Listing parser benchmark: time and memory of turning an /api/resources body with many entries into FileItem objects.
+  legacy  json.loads of the whole text and a __dict__ based FileItem per entry (the implementation before __slots__)
+  slots   json.loads and FileItem.from_dict, the list is still materialized
+  stream  ListingParser fed 64 KiB chunks, entries are counted and dropped as they are parsed
+Usage: python benchmark/bench_listing.py [--entries 200000] [--json]
+"""
+
+
+# FileItem as it was before the __slots__ layout
+class LegacyFileItem:
+    def __init__(self, name, size, path, extension, modified, mode, isDir, isSymlink, type):
+        self.name = name
+        self.size = size
+        self.path = path
+        self.extension = extension
+        self.modified = modified
+        self.mode = mode
+        self.isDir = isDir
+        self.isSymlink = isSymlink
+        self.type = type
+
+        self.property = dict()
+
+
+def legacy_parse(body: bytes):
+    decoded = json.loads(body.decode('utf-8'))
+    current_file = LegacyFileItem(decoded['name'], decoded['size'], decoded['path'], decoded['extension'],
+                                  decoded['modified'], decoded['mode'], decoded['isDir'], decoded['isSymlink'],
+                                  decoded['type'])
+    sub_files = [
+        LegacyFileItem(x['name'], x['size'], x['path'], x['extension'], x['modified'], x['mode'], x['isDir'],
+                       x['isSymlink'], x['type']) for x in decoded.get('items', [])]
+    return current_file, sub_files
+
+
+def slots_parse(body: bytes):
+    return parse_resource(json.loads(body.decode('utf-8')))
+
+
+def stream_parse(body: bytes, chunk_size=65536):
+    parser = ListingParser()
+    count = 0
+    for start in range(0, len(body), chunk_size):
+        count += len(parser.feed(body[start:start + chunk_size]))
+    count += len(parser.close())
+    return parser.current, count
+
+
+# Body shaped like the server's: the items first, then the fields of the directory itself
+def make_listing(entries: int) -> bytes:
+    items = [{'path': f'/bench/file-{i:07d}.dat', 'name': f'file-{i:07d}.dat', 'size': i * 4099 % 1000003,
+              'extension': '.dat', 'modified': '2024-05-06T07:08:09.123456789+02:00', 'mode': 420, 'isDir': False,
+              'isSymlink': False, 'type': 'blob'} for i in range(entries)]
+    return json.dumps({'items': items, 'numDirs': 0, 'numFiles': entries, 'sorting': {'by': 'name', 'asc': True},
+                       'path': '/bench', 'name': 'bench', 'size': 4096, 'extension': '', 'modified':
+                       '2024-05-06T07:08:09Z', 'mode': 2147484141, 'isDir': True, 'isSymlink': False,
+                       'type': ''}).encode('utf-8')
+
+
+# (seconds, peak bytes while parsing, bytes still held by the result)
+def measure(function, body):
+    gc.collect()
+    start = time.perf_counter()
+    function(body)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    result = function(body)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, peak, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the listing parsers')
+    parser.add_argument('--entries', type=int, default=200000, help='Entries in the listing')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    body = make_listing(args.entries)
+    results = {}
+    for name, function in (('legacy', legacy_parse), ('slots', slots_parse), ('stream', stream_parse)):
+        elapsed, peak, retained = measure(function, body)
+        results[name] = {'seconds': round(elapsed, 4), 'peak_bytes': peak, 'retained_bytes': retained}
+
+    if args.json:
+        print(json.dumps({'entries': args.entries, 'body_bytes': len(body), 'results': results}, indent=2))
+        return
+    print(f'{args.entries} entries, {len(body) / 1048576:.1f} MiB body')
+    for name, result in results.items():
+        print(f'{name:>7}: {result["seconds"]:7.3f}s  peak {result["peak_bytes"] / 1048576:8.1f} MiB  '
+              f'retained {result["retained_bytes"] / 1048576:8.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
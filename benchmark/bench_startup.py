@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_filebrowser import FakeFileBrowser  # noqa: E402
+
+"""
+Startup benchmark of the command line tool against the in-process FakeFileBrowser.
+Every case runs the CLI as a fresh process a number of times and reports the wall time until it exits and the time
+from spawning it to the first request the server receives, which is the startup cost a small command pays before
+doing any work. One more run per case with -X importtime reports the total import time and the slowest top-level
+imports. The help case must not import any network library: argument parsing comes before them.
+Results are written as JSON; --compare prints the change against an earlier results file and --max-regression makes
+the run fail when a case got slower than that.
+Usage:
+    python benchmark/bench_startup.py --repeat 10 --output startup.json --compare baseline.json --max-regression 20
+    python benchmark/bench_startup.py --command dist/WebFileBrowserClient.exe
+"""
+
+CASES = {
+    'help': ['--help'],
+    'getdownloadlink': ['getdownloadlink', '/startup.bin'],
+    'getfileinfo': ['getfileinfo', '/'],
+}
+
+NETWORK_MODULES = ('requests', 'urllib3', 'aiohttp', 'http.client', 'ssl')
+
+_API = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api.py')
+
+
+# Self and cumulative import times of the -X importtime output, in milliseconds, with the nesting depth
+def parse_importtime(stderr: str) -> list:
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        imports.append({'module': stripped, 'depth': (len(name) - len(stripped) - 1) // 2,
+                        'self_ms': int(fields[0]) / 1000, 'cumulative_ms': int(fields[1]) / 1000})
+    return imports
+
+
+def import_profile(command: list, arguments: list, env: dict, top: int) -> dict:
+    completed = subprocess.run([command[0], '-X', 'importtime', *command[1:], *arguments], env=env,
+                               capture_output=True, text=True)
+    imports = parse_importtime(completed.stderr)
+    modules = {entry['module'] for entry in imports}
+    slowest = sorted((entry for entry in imports if entry['depth'] == 0), key=lambda entry: -entry['cumulative_ms'])
+    return {'total_ms': round(sum(entry['self_ms'] for entry in imports), 3), 'modules': len(modules),
+            'network_modules': [name for name in NETWORK_MODULES if name in modules],
+            'slowest': [{'module': entry['module'], 'cumulative_ms': entry['cumulative_ms']}
+                        for entry in slowest[:top]]}
+
+
+def run_case(name: str, command: list, env: dict, server: FakeFileBrowser, repeat: int, profile: bool,
+             top: int) -> dict:
+    arguments = CASES[name]
+    walls, first_requests, exit_codes = [], [], set()
+    # the first run pays for cold disk caches and byte code compilation, it is not recorded
+    for run in range(repeat + 1):
+        server.first_request = None
+        start = time.perf_counter()
+        completed = subprocess.run([*command, *arguments], env=env, capture_output=True)
+        end = time.perf_counter()
+        if run == 0:
+            continue
+        exit_codes.add(completed.returncode)
+        walls.append(end - start)
+        if server.first_request is not None:
+            first_requests.append(server.first_request - start)
+    result = {'case': name, 'arguments': arguments, 'runs': repeat, 'exit_codes': sorted(exit_codes),
+              'wall_ms': _summary(walls), 'first_request_ms': _summary(first_requests) if first_requests else None}
+    result['imports'] = import_profile(command, arguments, env, top) if profile else None
+    return result
+
+
+def _summary(values: list) -> dict:
+    return {'median': round(statistics.median(values) * 1000, 3), 'min': round(min(values) * 1000, 3),
+            'max': round(max(values) * 1000, 3)}
+
+
+# Prints the median changes against a baseline and returns the names of the cases slower than max_regression percent
+def compare(results: list, baseline_path: str, max_regression=None) -> list:
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = {entry['case']: entry for entry in json.load(file)['results']}
+    print(f'Compared with {baseline_path}:')
+    regressions = []
+    for entry in results:
+        before = baseline.get(entry['case'])
+        if before is None:
+            print(f"  {entry['case']}: not in the baseline")
+            continue
+        changes = []
+        for metric in ('wall_ms', 'first_request_ms'):
+            old, new = (before.get(metric) or {}).get('median'), (entry.get(metric) or {}).get('median')
+            if not old or not new:
+                continue
+            change = (new - old) / old * 100
+            changes.append(f'{metric} {old:.1f} -> {new:.1f} ({change:+.1f}%)')
+            if max_regression is not None and change > max_regression and entry['case'] not in regressions:
+                regressions.append(entry['case'])
+        print(f"  {entry['case']}: {', '.join(changes) or 'no comparable timings'}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup benchmark of the command line tool')
+    parser.add_argument('--cases', default=','.join(CASES), help=f'Comma separated cases out of {", ".join(CASES)}')
+    parser.add_argument('--repeat', type=int, default=5, help='Recorded runs per case')
+    parser.add_argument('--command', default=None,
+                        help='Executable to benchmark instead of api.py, e.g. the PyInstaller build; import '
+                             'profiles need a Python interpreter and are skipped')
+    parser.add_argument('--top', type=int, default=10, help='Slowest top-level imports listed per case')
+    parser.add_argument('--output', default='bench_startup.json', help='JSON file for the results')
+    parser.add_argument('--compare', default=None, help='Earlier results file to compare the timings with')
+    parser.add_argument('--max-regression', type=float, default=None,
+                        help='With --compare, fail when a median got slower by more than this percentage')
+    args = parser.parse_args()
+
+    command = [args.command] if args.command else [sys.executable, _API]
+    names = [name for name in args.cases.split(',') if name]
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f'unknown cases {unknown}, expected some of {tuple(CASES)}')
+
+    results = []
+    with FakeFileBrowser() as server, tempfile.TemporaryDirectory(prefix='bench-') as state_dir:
+        with open(os.path.join(server.root, 'startup.bin'), 'wb') as file:
+            file.write(b'startup')
+        env = dict(os.environ, FILEBROWSER_HOME=server.home_url, FILEBROWSER_USERNAME=server.username,
+                   FILEBROWSER_PASSWORD=server.password, FILEBROWSER_STATE_DIR=state_dir)
+        env.pop('FILEBROWSER_API', None)
+        for name in names:
+            result = run_case(name, command, env, server, args.repeat, args.command is None, args.top)
+            results.append(result)
+            first = result['first_request_ms']
+            imports = result['imports']
+            print(f"{name}: wall {result['wall_ms']['median']:.1f} ms" +
+                  ('' if first is None else f", first request {first['median']:.1f} ms") +
+                  ('' if imports is None else f", imports {imports['total_ms']:.1f} ms ({imports['modules']} "
+                                              f"modules)") +
+                  ('' if result['exit_codes'] == [0] else f", exit codes {result['exit_codes']}"))
+
+    failed = []
+    help_result = next((result for result in results if result['case'] == 'help'), None)
+    if help_result is not None and help_result['imports'] and help_result['imports']['network_modules']:
+        print(f"help imports network modules before parsing: {help_result['imports']['network_modules']}")
+        failed.append('help')
+
+    report = {
+        'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'python': platform.python_version(),
+                 'platform': platform.platform(), 'command': command, 'repeat': args.repeat},
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f'Results written to {args.output}')
+    if args.compare:
+        failed += compare(results, args.compare, args.max_regression)
+    if failed:
+        print(f'Startup regressions: {", ".join(failed)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_filebrowser import FakeFileBrowser  # noqa: E402
+from TransferMetrics import percentile  # noqa: E402
+
+"""
+Transfer benchmark against the in-process FakeFileBrowser, no real server needed.
+Runs a matrix of file sizes, file counts, chunk sizes and concurrency levels. Every case uploads a set of files and
+downloads them again in a fresh subprocess, so its peak RSS is the client's own. A case reports upload/download
+throughput, per-request latency percentiles (time to response headers, per method and endpoint) and peak RSS.
+Results are written as JSON; --compare prints the throughput change against an earlier results file.
+Usage:
+    python benchmark/bench_transfer.py --file-sizes 1M,64M --file-counts 1,50 --chunk-sizes 1M,10M \\
+        --concurrency 1,4 --latency 0.01 --bandwidth 200M --error-rate 0.02 --output results.json
+"""
+
+_UNITS = {'': 1, 'K': 1024, 'M': 1048576, 'G': 1073741824}
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper().rstrip('B')
+    unit = text[-1:] if text[-1:] in _UNITS else ''
+    return int(float(text[:len(text) - len(unit)]) * _UNITS[unit])
+
+
+def size_list(text: str) -> list:
+    return [parse_size(part) for part in text.split(',') if part]
+
+
+def int_list(text: str) -> list:
+    return [int(part) for part in text.split(',') if part]
+
+
+def percentiles(values: list) -> dict:
+    values = sorted(values)
+
+    def pick(fraction):
+        return round(percentile(values, fraction) * 1000, 3)
+
+    return {'count': len(values), 'p50_ms': pick(0.5), 'p90_ms': pick(0.9), 'p99_ms': pick(0.99),
+            'max_ms': round(values[-1] * 1000, 3)}
+
+
+# Peak resident set size of this process in bytes, None where it cannot be read
+def peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return _peak_rss_windows()
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def _peak_rss_windows():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        return None
+
+
+# Runs in the subprocess: upload then download one case and print its result as JSON
+def run_case(case: dict) -> dict:
+    from FileBrowserClient import FileBrowserClient, FileBrowserError
+    from FolderUploader import FolderUploader
+    from FolderDownloader import FolderDownloader
+    from SegmentedDownloader import SegmentedDownloader
+
+    latencies = defaultdict(list)
+
+    def record(response, *args, **kwargs):
+        path = response.request.path_url.split('?')[0]
+        endpoint = '/'.join(path.split('/')[:3])
+        latencies[f'{response.request.method} {endpoint}'].append(response.elapsed.total_seconds())
+
+    size, count, chunk_size, concurrency = case['file_size'], case['file_count'], case['chunk_size'], \
+        case['concurrency']
+    work = tempfile.mkdtemp(prefix='bench-transfer-')
+    remote = f"/bench/{case['name']}"
+    result = {'case': case, 'upload': None, 'download': None}
+    try:
+        source = os.path.join(work, 'source')
+        os.makedirs(source)
+        for index in range(count):
+            with open(os.path.join(source, f'file-{index:05d}.bin'), 'wb') as file:
+                remaining = size
+                while remaining > 0:
+                    piece = min(remaining, 4194304)
+                    file.write(os.urandom(piece))
+                    remaining -= piece
+        total = size * count
+
+        with FileBrowserClient(case['home_url'], case['username'], case['password'],
+                               pool_maxsize=max(16, concurrency)) as client:
+            client.session.hooks['response'].append(record)
+            client.authenticate()
+
+            start = time.perf_counter()
+            try:
+                if count == 1:
+                    client.upload_file(os.path.join(source, 'file-00000.bin'), remote + '.bin', override=True,
+                                       max_attempts=case['max_attempts'], chunk_size=chunk_size)
+                    ok = True
+                else:
+                    ok = FolderUploader(client, workers=concurrency, override=True,
+                                        max_attempts=case['max_attempts'], chunk_size=chunk_size).upload(
+                        source, remote).ok
+                error = None
+            except FileBrowserError as failure:
+                ok, error = False, str(failure)
+            result['upload'] = _transfer(total, time.perf_counter() - start, ok, error)
+
+            target = os.path.join(work, 'target')
+            start = time.perf_counter()
+            try:
+                if count == 1:
+                    SegmentedDownloader(client, connections=concurrency, max_attempts=case['max_attempts'],
+                                        chunk_size=chunk_size).download(remote + '.bin', target)
+                    ok = os.path.getsize(target) == size
+                else:
+                    ok = FolderDownloader(client, workers=concurrency, chunk_size=chunk_size).download(
+                        remote, target).ok
+                error = None
+            except FileBrowserError as failure:
+                ok, error = False, str(failure)
+            result['download'] = _transfer(total, time.perf_counter() - start, ok, error)
+            client.delete_resource(remote + '.bin' if count == 1 else remote)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    result['latency'] = {key: percentiles(values) for key, values in sorted(latencies.items())}
+    result['peak_rss_bytes'] = peak_rss()
+    return result
+
+
+def _transfer(total, elapsed, ok, error) -> dict:
+    return {'ok': ok, 'error': error, 'bytes': total, 'seconds': round(elapsed, 4),
+            'mb_per_s': round(total / elapsed / 1048576, 3) if ok and elapsed > 0 else None}
+
+
+def _case_key(case: dict) -> str:
+    return f"size={case['file_size']} count={case['file_count']} chunk={case['chunk_size']} " \
+           f"concurrency={case['concurrency']}"
+
+
+def compare(results: list, baseline_path: str):
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = {_case_key(entry['case']): entry for entry in json.load(file)['results']}
+    print(f'Compared with {baseline_path}:')
+    for entry in results:
+        key = _case_key(entry['case'])
+        before = baseline.get(key)
+        if before is None:
+            print(f'  {key}: not in the baseline')
+            continue
+        changes = []
+        for direction in ('upload', 'download'):
+            old, new = (before.get(direction) or {}).get('mb_per_s'), (entry.get(direction) or {}).get('mb_per_s')
+            if old and new:
+                changes.append(f'{direction} {old:.2f} -> {new:.2f} MB/s ({(new - old) / old * 100:+.1f}%)')
+        print(f"  {key}: {', '.join(changes) or 'no comparable throughput'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Transfer benchmark against a local fake FileBrowser')
+    parser.add_argument('--file-sizes', type=size_list, default=size_list('1M,32M'),
+                        help='Comma separated file sizes, with K/M/G suffixes')
+    parser.add_argument('--file-counts', type=int_list, default=[1, 20], help='Comma separated file counts')
+    parser.add_argument('--chunk-sizes', type=size_list, default=size_list('1M,10M'),
+                        help='Comma separated TUS chunk sizes')
+    parser.add_argument('--concurrency', type=int_list, default=[1, 4],
+                        help='Comma separated worker/connection counts')
+    parser.add_argument('--latency', type=float, default=0.0, help='Injected latency per request in seconds')
+    parser.add_argument('--bandwidth', type=parse_size, default=None,
+                        help='Bandwidth cap in bytes per second shared by all connections, e.g. 100M')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of TUS PATCH and raw GET requests answered with an error')
+    parser.add_argument('--max-attempts', type=int, default=5, help='Attempts per chunk/segment')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the injected errors')
+    parser.add_argument('--output', default='bench_results.json', help='JSON file for the results')
+    parser.add_argument('--compare', default=None, help='Earlier results file to compare the throughput with')
+    parser.add_argument('--case', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        print(json.dumps(run_case(json.loads(args.case))))
+        return
+
+    results = []
+    with FakeFileBrowser(latency=args.latency, bandwidth=args.bandwidth, error_rate=args.error_rate,
+                         seed=args.seed) as server:
+        matrix = list(itertools.product(args.file_sizes, args.file_counts, args.chunk_sizes, args.concurrency))
+        for number, (size, count, chunk_size, concurrency) in enumerate(matrix, 1):
+            case = {'name': f'case-{number}', 'file_size': size, 'file_count': count, 'chunk_size': chunk_size,
+                    'concurrency': concurrency, 'max_attempts': args.max_attempts, 'home_url': server.home_url,
+                    'username': server.username, 'password': server.password}
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--case', json.dumps(case)],
+                                       capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(f'[{number}/{len(matrix)}] {_case_key(case)} crashed:\n{completed.stderr}', file=sys.stderr)
+                continue
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            for key in ('home_url', 'username', 'password'):
+                result['case'].pop(key)
+            results.append(result)
+            upload, download = result['upload'], result['download']
+            print(f"[{number}/{len(matrix)}] {_case_key(case)}: upload {upload['mb_per_s']} MB/s"
+                  f"{'' if upload['ok'] else ' FAILED'}, download {download['mb_per_s']} MB/s"
+                  f"{'' if download['ok'] else ' FAILED'}, peak RSS {(result['peak_rss_bytes'] or 0) / 1048576:.1f} "
+                  f"MiB")
+        server_stats = dict(server.stats)
+
+    report = {
+        'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'python': platform.python_version(),
+                 'platform': platform.platform(), 'latency': args.latency, 'bandwidth': args.bandwidth,
+                 'error_rate': args.error_rate, 'seed': args.seed, 'server_stats': server_stats},
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f'Results written to {args.output}')
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+import base64
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+
+"""
+In-process stand-in for a FileBrowser server, for benchmarks that must not touch a real one.
+Implements the endpoints the client uses: /api/login, /api/renew, /api/resources (GET with ?checksum=<algorithm>,
+POST, PATCH copy/rename, DELETE), /api/tus (POST/PATCH/HEAD/DELETE) and /api/raw with Range support. Files are stored
+under a local directory.
+Network conditions are simulated with a fixed latency per request, a bandwidth cap shared by all connections and an
+error rate on the data transfer requests (TUS PATCH and raw GET), which are the ones the client retries.
+Usage:
+    with FakeFileBrowser(latency=0.02, bandwidth=50 * 1048576, error_rate=0.05) as server:
+        client = FileBrowserClient(server.home_url, server.username, server.password)
+"""
+
+_PIECE = 65536
+
+
+# Pacing shared by all connections, so concurrent transfers split the configured bandwidth
+class _Throttle:
+    def __init__(self, rate):
+        self.rate = rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._next = max(self._next, now) + amount / self.rate
+            delay = self._next - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class FakeFileBrowser:
+    def __init__(self, root=None, latency=0.0, bandwidth=None, error_rate=0.0, error_status=503, seed=None,
+                 username='bench', password='bench', token_ttl=7200, host='127.0.0.1', port=0):
+        self._owns_root = root is None
+        self.root = root or tempfile.mkdtemp(prefix='fake-filebrowser-')
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.username = username
+        self.password = password
+        self.token_ttl = token_ttl
+        self.throttle = _Throttle(bandwidth)
+        self.stats = Counter()
+        # perf_counter() of the first request received, reset it to None to time the next one
+        self.first_request = None
+        self._random = random.Random(seed)
+        self._tokens = set()
+        self._upload_lengths = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def home_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-filebrowser', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        if self._owns_root:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # Unsigned JWT shaped token, enough for the client to read its exp claim
+    def issue_token(self) -> str:
+        payload = json.dumps({'exp': int(time.time()) + self.token_ttl, 'user': self.username,
+                              'nonce': self._random.getrandbits(32)}).encode()
+        token = 'eyJhbGciOiJub25lIn0.' + base64.urlsafe_b64encode(payload).decode().rstrip('=') + '.'
+        with self._lock:
+            self._tokens.add(token)
+        return token
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _received(self):
+        with self._lock:
+            if self.first_request is None:
+                self.first_request = time.perf_counter()
+
+    def revoke_tokens(self):
+        with self._lock:
+            self._tokens.clear()
+
+    def _inject_error(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def local_path(self, remote_path: str) -> str:
+        parts = [part for part in unquote(remote_path).split('/') if part not in ('', '.')]
+        if '..' in parts:
+            raise ValueError(f'Invalid path {remote_path}')
+        return os.path.join(self.root, *parts)
+
+    def item(self, local_path: str, remote_path: str) -> dict:
+        stat = os.stat(local_path)
+        is_dir = os.path.isdir(local_path)
+        name = os.path.basename(local_path.rstrip(os.sep)) if remote_path.strip('/') else ''
+        return {'path': '/' + remote_path.strip('/'), 'name': name, 'size': 4096 if is_dir else stat.st_size,
+                'extension': '' if is_dir else os.path.splitext(name)[1],
+                'modified': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(stat.st_mtime)) +
+                f'.{stat.st_mtime_ns % 1000000000:09d}Z',
+                'mode': stat.st_mode, 'isDir': is_dir, 'isSymlink': False, 'type': 'directory' if is_dir else 'blob'}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(_Handler):
+            fake = server
+
+        return Handler
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    fake = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=b'', headers=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD' and body:
+            self._write(body)
+
+    def _write(self, data):
+        for start in range(0, len(data), _PIECE):
+            piece = data[start:start + _PIECE]
+            self.fake.throttle.consume(len(piece))
+            self.wfile.write(piece)
+        self.fake.count('bytes_out', len(data))
+
+    def _read_body(self) -> bytes:
+        remaining = int(self.headers.get('Content-Length') or 0)
+        pieces = []
+        while remaining > 0:
+            piece = self.rfile.read(min(_PIECE, remaining))
+            if not piece:
+                break
+            self.fake.throttle.consume(len(piece))
+            pieces.append(piece)
+            remaining -= len(piece)
+        body = b''.join(pieces)
+        self.fake.count('bytes_in', len(body))
+        return body
+
+    def _authorized(self, query) -> bool:
+        token = self.headers.get('X-Auth') or query.get('auth', [''])[0]
+        cookie = self.headers.get('Cookie', '')
+        if not token and cookie.startswith('auth='):
+            token = cookie[5:]
+        return token in self.fake._tokens
+
+    def _handle(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        endpoint = url.path
+        kind = next((prefix for prefix in ('/api/resources', '/api/tus', '/api/raw') if endpoint.startswith(prefix)),
+                    endpoint)
+        self.fake._received()
+        self.fake.count(f'{self.command} {kind}')
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+        try:
+            if endpoint == '/api/login':
+                return self._login()
+            if not self._authorized(query):
+                self._read_body()
+                return self._reply(401, '401 Unauthorized')
+            if endpoint == '/api/renew':
+                return self._reply(200, self.fake.issue_token())
+            if kind == '/api/resources':
+                return self._resources(endpoint[len(kind):], query)
+            if kind == '/api/tus':
+                return self._tus(endpoint[len(kind):], query)
+            if kind == '/api/raw':
+                return self._raw(endpoint[len(kind):])
+            self._reply(404, '404 Not Found')
+        except ValueError as error:
+            self._reply(400, str(error))
+
+    do_GET = do_POST = do_PATCH = do_DELETE = do_HEAD = _handle
+
+    def _login(self):
+        try:
+            credentials = json.loads(self._read_body() or b'{}')
+        except ValueError:
+            credentials = {}
+        if credentials.get('username') != self.fake.username or credentials.get('password') != self.fake.password:
+            return self._reply(403, '403 Forbidden')
+        self._reply(200, self.fake.issue_token())
+
+    def _resources(self, remote_path, query):
+        local_path = self.fake.local_path(remote_path)
+        if self.command == 'GET':
+            if not os.path.exists(local_path):
+                return self._reply(404, '404 Not Found')
+            current = self.fake.item(local_path, remote_path)
+            algorithm = query.get('checksum', [None])[0]
+            if algorithm and not current['isDir']:
+                if algorithm not in hashlib.algorithms_available:
+                    return self._reply(400, f'unsupported checksum {algorithm}')
+                hasher = hashlib.new(algorithm)
+                with open(local_path, 'rb') as file:
+                    for piece in iter(lambda: file.read(1048576), b''):
+                        hasher.update(piece)
+                current['checksums'] = {algorithm: hasher.hexdigest()}
+            if current['isDir']:
+                # like the real server, the items come before the fields of the directory itself
+                items = [self.fake.item(os.path.join(local_path, name), remote_path.rstrip('/') + '/' + name)
+                         for name in sorted(os.listdir(local_path))]
+                current = {'items': items, 'numDirs': sum(item['isDir'] for item in items),
+                           'numFiles': sum(not item['isDir'] for item in items), **current}
+            return self._reply(200, json.dumps(current), {'Content-Type': 'application/json; charset=utf-8'})
+        if self.command == 'POST':
+            self._read_body()
+            if not remote_path.endswith('/'):
+                return self._reply(400, 'only directories can be created here')
+            if os.path.exists(local_path) and query.get('override', ['false'])[0] != 'true' and \
+                    not os.path.isdir(local_path):
+                return self._reply(409, '409 Conflict')
+            os.makedirs(local_path, exist_ok=True)
+            return self._reply(200)
+        if self.command == 'PATCH':
+            self._read_body()
+            action = query.get('action', [''])[0]
+            destination = self.fake.local_path(query.get('destination', [''])[0])
+            if action not in ('copy', 'rename') or not os.path.exists(local_path) or destination == self.fake.root:
+                return self._reply(400 if os.path.exists(local_path) else 404)
+            if os.path.exists(destination):
+                if query.get('override', ['false'])[0] != 'true':
+                    return self._reply(409, '409 Conflict')
+                shutil.rmtree(destination) if os.path.isdir(destination) else os.remove(destination)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            if action == 'copy':
+                (shutil.copytree if os.path.isdir(local_path) else shutil.copy2)(local_path, destination)
+            else:
+                shutil.move(local_path, destination)
+            return self._reply(200)
+        if self.command == 'DELETE':
+            if not os.path.exists(local_path) or local_path == self.fake.root:
+                return self._reply(404, '404 Not Found')
+            if os.path.isdir(local_path):
+                shutil.rmtree(local_path)
+            else:
+                os.remove(local_path)
+            return self._reply(200)
+        self._reply(405)
+
+    def _tus(self, remote_path, query):
+        local_path = self.fake.local_path(remote_path)
+        if self.command == 'POST':
+            self._read_body()
+            if os.path.exists(local_path) and query.get('override', ['false'])[0] != 'true':
+                return self._reply(409, '409 Conflict')
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            open(local_path, 'wb').close()
+            self.fake._upload_lengths[local_path] = int(self.headers.get('Upload-Length') or 0)
+            return self._reply(201)
+        if self.command == 'HEAD':
+            if not os.path.isfile(local_path):
+                return self._reply(404)
+            return self._reply(200, headers={'Upload-Offset': str(os.path.getsize(local_path)),
+                                             'Upload-Length': str(self.fake._upload_lengths.get(local_path, 0))})
+        if self.command == 'PATCH':
+            body = self._read_body()
+            if self.fake._inject_error():
+                self.fake.count('errors_injected')
+                return self._reply(self.fake.error_status, 'injected error')
+            offset = int(self.headers.get('Upload-Offset') or -1)
+            if not os.path.isfile(local_path) or os.path.getsize(local_path) != offset:
+                return self._reply(409, 'offset mismatch')
+            with open(local_path, 'ab') as file:
+                file.write(body)
+            return self._reply(204, headers={'Upload-Offset': str(offset + len(body))})
+        if self.command == 'DELETE':
+            self.fake._upload_lengths.pop(local_path, None)
+            if os.path.isfile(local_path):
+                os.remove(local_path)
+            return self._reply(204)
+        self._reply(405)
+
+    def _raw(self, remote_path):
+        local_path = self.fake.local_path(remote_path)
+        if self.command != 'GET':
+            return self._reply(405)
+        if not os.path.isfile(local_path):
+            return self._reply(404, '404 Not Found')
+        if self.fake._inject_error():
+            self.fake.count('errors_injected')
+            return self._reply(self.fake.error_status, 'injected error')
+        size = os.path.getsize(local_path)
+        start, end, status = 0, size - 1, 200
+        headers = {'Accept-Ranges': 'bytes', 'Content-Type': 'application/octet-stream'}
+        requested = self.headers.get('Range')
+        if requested:
+            try:
+                first, last = requested.split('=', 1)[1].split(',')[0].split('-')
+                start = int(first) if first else size - int(last)
+                end = min(int(last), size - 1) if first and last else size - 1
+            except (IndexError, ValueError):
+                start = size
+            if start >= size or start > end or start < 0:
+                return self._reply(416, headers={'Content-Range': f'bytes */{size}'})
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        with open(local_path, 'rb') as file:
+            file.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                piece = file.read(min(_PIECE, remaining))
+                if not piece:
+                    break
+                self.fake.throttle.consume(len(piece))
+                self.wfile.write(piece)
+                remaining -= len(piece)
+                self.fake.count('bytes_out', len(piece))
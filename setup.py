@@ -6,11 +6,106 @@ from setuptools.extension import Extension
 extensions = [
     # you can also include all py files using sources=["*.py"]
 
+    Extension(
+        name="Defaults",
+        sources=["Defaults.py"],
+    ),
+
     Extension(
         name="FileItem",
         sources=["FileItem.py"],  # Will ALSO be compiled
     ),
 
+    Extension(
+        name="TokenCache",
+        sources=["TokenCache.py"],
+    ),
+
+    Extension(
+        name="Checksums",
+        sources=["Checksums.py"],
+    ),
+
+    Extension(
+        name="ChunkPipeline",
+        sources=["ChunkPipeline.py"],
+    ),
+
+    Extension(
+        name="ChunkSizer",
+        sources=["ChunkSizer.py"],
+    ),
+
+    Extension(
+        name="TransferMetrics",
+        sources=["TransferMetrics.py"],
+    ),
+
+    Extension(
+        name="FileBrowserProtocol",
+        sources=["FileBrowserProtocol.py"],
+    ),
+
+    Extension(
+        name="FileBrowserClient",
+        sources=["FileBrowserClient.py"],
+    ),
+
+    Extension(
+        name="AsyncFileBrowserClient",
+        sources=["AsyncFileBrowserClient.py"],
+    ),
+
+    Extension(
+        name="FolderUploader",
+        sources=["FolderUploader.py"],
+    ),
+
+    Extension(
+        name="UploadJournal",
+        sources=["UploadJournal.py"],
+    ),
+
+    Extension(
+        name="SegmentedDownloader",
+        sources=["SegmentedDownloader.py"],
+    ),
+
+    Extension(
+        name="FolderDownloader",
+        sources=["FolderDownloader.py"],
+    ),
+
+    Extension(
+        name="ArchiveDownloader",
+        sources=["ArchiveDownloader.py"],
+    ),
+
+    Extension(
+        name="MetadataCache",
+        sources=["MetadataCache.py"],
+    ),
+
+    Extension(
+        name="FolderSync",
+        sources=["FolderSync.py"],
+    ),
+
+    Extension(
+        name="ResourceOperations",
+        sources=["ResourceOperations.py"],
+    ),
+
+    Extension(
+        name="RemoteIndex",
+        sources=["RemoteIndex.py"],
+    ),
+
+    Extension(
+        name="BatchRunner",
+        sources=["BatchRunner.py"],
+    ),
+
     Extension(
         name="WebFileBrowserAPI",  # This controls the name of the .pyd file (my_hello.pyd)
         sources=["api.py"],        # Your .pyx source file
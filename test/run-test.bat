@@ -1,2 +1,3 @@
 python api.py getdownloadlink "cat.jpg"
-python api.py getfileinfo "/"
\ No newline at end of file
+python api.py getfileinfo "/"
+python -m pytest -q test
\ No newline at end of file
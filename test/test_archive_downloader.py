@@ -0,0 +1,120 @@
+import io
+import os
+import sys
+import tarfile
+import zipfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ArchiveDownloader import _extract_tar_stream, _extract_zip_stream  # noqa: E402
+from Defaults import ARCHIVE_FORMATS  # noqa: E402
+
+# a stored entry with a data descriptor has no size up front, its data even contains the descriptor signature
+FILES = {
+    'docs/a.txt': b'hello archive\n' * 1000,
+    'docs/sub/b.bin': bytes(range(256)) * 300 + b'PK\x07\x08' + b'\x00' * 12 + b'tail',
+    'docs/sub/empty.txt': b'',
+    'docs/Übersicht.txt': 'ünïcödé'.encode('utf-8'),
+}
+
+
+# Hands the archive out in small reads, like a slow response, so entries straddle every boundary
+class _SlowStream:
+    def __init__(self, data, step=7):
+        self.stream = io.BytesIO(data)
+        self.step = step
+
+    def read(self, size=-1):
+        return self.stream.read(self.step if size < 0 else min(size, self.step))
+
+
+# Write-only stream without tell/seek, which makes zipfile write a data descriptor after every entry
+class _Unseekable(io.RawIOBase):
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+
+def _zip(method, descriptor, files=FILES) -> bytes:
+    target = _Unseekable() if descriptor else io.BytesIO()
+    with zipfile.ZipFile(target, 'w', compression=method) as archive:
+        archive.writestr(zipfile.ZipInfo('docs/'), b'')
+        archive.writestr(zipfile.ZipInfo('docs/sub/'), b'')
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return bytes(target.data) if descriptor else target.getvalue()
+
+
+def _assert_extracted(dest):
+    for name, data in FILES.items():
+        with open(os.path.join(dest, *name.split('/')[1:]), 'rb') as file:
+            assert file.read() == data
+    assert sorted(os.listdir(dest)) == sorted(['a.txt', 'sub', 'Übersicht.txt'])
+
+
+@pytest.mark.parametrize('method', [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED], ids=['stored', 'deflated'])
+@pytest.mark.parametrize('descriptor', [False, True], ids=['sizes', 'descriptor'])
+def test_zip_stream(tmp_path, method, descriptor):
+    data = _zip(method, descriptor)
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert all(bool(info.flag_bits & 0x08) == descriptor for info in archive.infolist())
+    assert _extract_zip_stream(_SlowStream(data), str(tmp_path), 'docs/') == len(FILES)
+    _assert_extracted(str(tmp_path))
+
+
+def test_zip_stream_rejects_corrupted_entry(tmp_path):
+    data = _zip(zipfile.ZIP_STORED, False)
+    index = data.index(b'hello archive')
+    data = data[:index] + b'j' + data[index + 1:]
+    with pytest.raises(ValueError):
+        _extract_zip_stream(_SlowStream(data, step=4096), str(tmp_path), 'docs/')
+
+
+@pytest.mark.parametrize('algo', ['tar', 'targz'])
+def test_tar_stream(tmp_path, algo):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz' if algo == 'targz' else 'w') as archive:
+        for name in ('docs', 'docs/sub'):
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.DIRTYPE
+            archive.addfile(info)
+        for name, data in FILES.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = 1700000000
+            archive.addfile(info, io.BytesIO(data))
+        link = tarfile.TarInfo('docs/link')
+        link.type = tarfile.SYMTYPE
+        link.linkname = '/etc/passwd'
+        archive.addfile(link)
+    files = _extract_tar_stream(_SlowStream(buffer.getvalue()), str(tmp_path), 'docs/', ARCHIVE_FORMATS[algo])
+    assert files == len(FILES)
+    _assert_extracted(str(tmp_path))
+    assert os.path.getmtime(os.path.join(str(tmp_path), 'a.txt')) == 1700000000
+
+
+@pytest.mark.parametrize('name', ['docs/../escaped.txt', '../escaped.txt', 'docs/sub/../../../escaped.txt'])
+def test_parent_references_are_rejected(tmp_path, name):
+    dest = tmp_path / 'dest'
+    dest.mkdir()
+    data = _zip(zipfile.ZIP_DEFLATED, True, files={name: b'evil'})
+    with pytest.raises(ValueError, match='unsafe'):
+        _extract_zip_stream(_SlowStream(data), str(dest), 'docs/')
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        info = tarfile.TarInfo(name)
+        info.size = 4
+        archive.addfile(info, io.BytesIO(b'evil'))
+    with pytest.raises(ValueError, match='unsafe'):
+        _extract_tar_stream(_SlowStream(buffer.getvalue()), str(dest), 'docs/', ARCHIVE_FORMATS['targz'])
+    assert not (tmp_path / 'escaped.txt').exists()
@@ -0,0 +1,111 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ChunkPipeline import ChunkPipeline  # noqa: E402
+
+
+def _file(tmp_path, size):
+    path = tmp_path / 'data.bin'
+    path.write_bytes(os.urandom(size))
+    return path
+
+
+# Every (offset, bytes) chunk up to the end of the file, each buffer handed back before the next one is read
+def _chunks(pipeline):
+    chunks = []
+    while (chunk := pipeline.next()) is not None:
+        offset, view = chunk
+        chunks.append((offset, bytes(view)))
+        pipeline.release()
+    return chunks
+
+
+@pytest.mark.parametrize('size', [0, 1, 999, 1000, 1001, 4000, 4567])
+def test_chunks_cover_the_file_up_to_its_end(tmp_path, size):
+    path = _file(tmp_path, size)
+    with open(path, 'rb') as file, ChunkPipeline(file, 1000, size) as pipeline:
+        chunks = _chunks(pipeline)
+    assert b''.join(data for _, data in chunks) == path.read_bytes()
+    assert [offset for offset, _ in chunks] == list(range(0, size, 1000))
+    assert all(len(data) == 1000 for _, data in chunks[:-1])
+    # a file that fits in one chunk gets a single buffer of its own size
+    assert pipeline.depth == (1 if size <= 1000 else 2)
+
+
+def test_starts_at_an_offset_and_seeks(tmp_path):
+    path = _file(tmp_path, 5000)
+    data = path.read_bytes()
+    with open(path, 'rb') as file, ChunkPipeline(file, 1000, 5000, offset=2500) as pipeline:
+        offset, view = pipeline.next()
+        assert (offset, bytes(view)) == (2500, data[2500:3500])
+        # the server reported an earlier offset after a failed chunk, the buffer in use is handed back by seek
+        pipeline.seek(1200)
+        chunks = _chunks(pipeline)
+    assert chunks[0][0] == 1200
+    assert b''.join(chunk for _, chunk in chunks) == data[1200:]
+
+
+def test_adaptive_chunk_lengths(tmp_path):
+    path = _file(tmp_path, 3000)
+    lengths = iter([100, 700, 0, 5000, 250])
+    with open(path, 'rb') as file, ChunkPipeline(file, 1000, 3000,
+                                                 chunk_length=lambda: next(lengths, 1000)) as pipeline:
+        chunks = _chunks(pipeline)
+    # a length below one byte reads one byte, one above chunk_size is capped
+    assert [len(data) for _, data in chunks] == [100, 700, 1, 1000, 250, 949]
+    assert b''.join(data for _, data in chunks) == path.read_bytes()
+
+
+def test_truncated_file_raises_after_the_data_that_is_left(tmp_path):
+    path = _file(tmp_path, 1500)
+    with open(path, 'rb') as file, ChunkPipeline(file, 1000, 3000) as pipeline:
+        assert pipeline.next()[0] == 0
+        pipeline.release()
+        assert pipeline.next()[0] == 1000
+        pipeline.release()
+        with pytest.raises(IOError, match='truncated during upload at offset 1500'):
+            pipeline.next()
+
+
+class _FailingFile:
+    name = 'failing.bin'
+
+    def __init__(self, fail_at):
+        self.fail_at = fail_at
+        self.position = 0
+
+    def seek(self, offset):
+        self.position = offset
+
+    def readinto(self, view):
+        if self.position >= self.fail_at:
+            raise OSError(5, 'Input/output error')
+        length = min(len(view), self.fail_at - self.position)
+        view[:length] = b'x' * length
+        self.position += length
+        return length
+
+
+def test_read_errors_reach_the_caller():
+    with ChunkPipeline(_FailingFile(1500), 1000, 5000) as pipeline:
+        assert pipeline.next()[0] == 0
+        pipeline.release()
+        # the bytes read before the error are not handed out as a short chunk
+        with pytest.raises(OSError, match='Input/output error'):
+            pipeline.next()
+
+
+def test_close_stops_a_reader_waiting_for_a_buffer(tmp_path):
+    path = _file(tmp_path, 10000)
+    with open(path, 'rb') as file:
+        pipeline = ChunkPipeline(file, 1000, 10000)
+        # the reader fills both buffers and waits for one to be released
+        pipeline.next()
+        pipeline.close()
+        assert pipeline._thread is None
+        assert pipeline._free.qsize() == 2
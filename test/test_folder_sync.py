@@ -0,0 +1,99 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmark'))
+
+from FileBrowserClient import FileBrowserClient  # noqa: E402
+from FolderSync import FolderSync, SyncManifest  # noqa: E402
+from fake_filebrowser import FakeFileBrowser  # noqa: E402
+
+
+def _sync(server, manifest_path, local_root, delete=False):
+    with FileBrowserClient(server.home_url, server.username, server.password) as client:
+        client.authenticate()
+        manifest = SyncManifest(str(manifest_path), server.home_url, '/backup')
+        try:
+            return FolderSync(client, manifest, workers=2, delete=delete).sync(str(local_root), '/backup')
+        finally:
+            manifest.close()
+
+
+def test_empty_directories_are_created_and_deleted(tmp_path):
+    local_root = tmp_path / 'local'
+    (local_root / 'empty').mkdir(parents=True)
+    (local_root / 'data').mkdir()
+    (local_root / 'data' / 'a.bin').write_bytes(b'a')
+    manifest_path = tmp_path / 'manifest.sqlite'
+
+    with FakeFileBrowser(root=str(tmp_path / 'server')) as server:
+        report = _sync(server, manifest_path, local_root)
+        assert report.ok
+        assert os.path.isdir(os.path.join(server.root, 'backup', 'empty'))
+        assert os.path.isfile(os.path.join(server.root, 'backup', 'data', 'a.bin'))
+
+        # everything is in the manifest now, nothing is listed again
+        report = _sync(server, manifest_path, local_root)
+        assert report.ok
+        assert report.directories_listed == 0
+        assert report.directories_skipped == 3
+
+        os.rmdir(local_root / 'empty')
+        report = _sync(server, manifest_path, local_root, delete=True)
+        assert report.ok
+        assert not os.path.exists(os.path.join(server.root, 'backup', 'empty'))
+
+
+def test_changed_file_is_uploaded_again(tmp_path):
+    local_root = tmp_path / 'local'
+    local_root.mkdir()
+    (local_root / 'a.bin').write_bytes(b'first')
+    manifest_path = tmp_path / 'manifest.sqlite'
+
+    with FakeFileBrowser(root=str(tmp_path / 'server')) as server:
+        assert _sync(server, manifest_path, local_root).ok
+        (local_root / 'a.bin').write_bytes(b'second version')
+        report = _sync(server, manifest_path, local_root)
+        assert report.ok and report.uploaded == 1
+        with open(os.path.join(server.root, 'backup', 'a.bin'), 'rb') as file:
+            assert file.read() == b'second version'
+
+
+def test_delete_removes_remote_extras_in_unchanged_directories(tmp_path):
+    local_root = tmp_path / 'local'
+    (local_root / 'data').mkdir(parents=True)
+    (local_root / 'data' / 'a.bin').write_bytes(b'a')
+    manifest_path = tmp_path / 'manifest.sqlite'
+
+    with FakeFileBrowser(root=str(tmp_path / 'server')) as server:
+        assert _sync(server, manifest_path, local_root).ok
+        extra = os.path.join(server.root, 'backup', 'data', 'extra.txt')
+        with open(extra, 'wb') as file:
+            file.write(b'only on the server')
+
+        report = _sync(server, manifest_path, local_root, delete=True)
+        assert report.ok
+        assert report.deleted == 1
+        assert not os.path.exists(extra)
+        assert os.path.isfile(os.path.join(server.root, 'backup', 'data', 'a.bin'))
+
+
+def test_dangling_symlink_is_reported_and_keeps_its_remote_copy(tmp_path):
+    local_root = tmp_path / 'local'
+    local_root.mkdir()
+    (local_root / 'a.bin').write_bytes(b'a')
+    (local_root / 'b.bin').write_bytes(b'b')
+    manifest_path = tmp_path / 'manifest.sqlite'
+
+    with FakeFileBrowser(root=str(tmp_path / 'server')) as server:
+        assert _sync(server, manifest_path, local_root).ok
+        os.remove(local_root / 'b.bin')
+        os.symlink(str(tmp_path / 'missing'), str(local_root / 'b.bin'))
+        os.symlink(str(tmp_path / 'missing'), str(local_root / 'broken.bin'))
+
+        report = _sync(server, manifest_path, local_root, delete=True)
+        assert sorted(path for path, _ in report.failures) == ['b.bin', 'broken.bin']
+        assert report.deleted == 0
+        assert os.path.isfile(os.path.join(server.root, 'backup', 'b.bin'))
+        assert os.path.isfile(os.path.join(server.root, 'backup', 'a.bin'))
@@ -0,0 +1,116 @@
+import json
+import os
+import random
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from FileBrowserProtocol import ListingParser, parse_resource  # noqa: E402
+
+
+def _entry(name, size, is_dir=False):
+    return {'name': name, 'size': size, 'path': f'/data/{name}', 'extension': os.path.splitext(name)[1],
+            'modified': '2024-05-17T09:31:04.123456789+02:00', 'mode': 2147484141 if is_dir else 420,
+            'isDir': is_dir, 'isSymlink': False, 'type': '' if is_dir else 'blob'}
+
+
+# A listing as the server sends it: the items first, then the fields of the listed directory, sizes last
+def _listing() -> bytes:
+    items = [_entry('report.pdf', 1234567890123), _entry('Übersicht 日本語 😀.txt', 7),
+             _entry('photos', 4096, is_dir=True), _entry('empty', 0), _entry('ünïcödé', 98765)]
+    listing = {'items': items, 'numDirs': 1, 'numFiles': 4, 'sorting': {'by': 'name', 'asc': False}}
+    listing.update({key: value for key, value in _entry('data', 4096, is_dir=True).items() if key != 'size'})
+    listing['path'] = '/data/'
+    listing['size'] = 1234567998124
+    return json.dumps(listing, ensure_ascii=False, indent=1).encode('utf-8')
+
+
+def _parse(chunks):
+    parser = ListingParser()
+    items = []
+    for chunk in chunks:
+        items += parser.feed(chunk)
+    items += parser.close()
+    return parser.current, items
+
+
+def _split(body, cuts):
+    cuts = [0, *sorted(cuts), len(body)]
+    return [body[start:end] for start, end in zip(cuts, cuts[1:])]
+
+
+def test_every_split_point_gives_the_whole_listing():
+    body = _listing()
+    expected_current, expected_items = parse_resource(json.loads(body))
+    for cut in range(len(body) + 1):
+        current, items = _parse(_split(body, [cut]))
+        assert items == expected_items, cut
+        assert current == expected_current, cut
+        assert current.size == 1234567998124
+
+
+def test_random_chunk_splits():
+    body = _listing()
+    expected_current, expected_items = parse_resource(json.loads(body))
+    generator = random.Random(1234)
+    for _ in range(200):
+        cuts = generator.sample(range(1, len(body)), generator.randint(1, 40))
+        current, items = _parse(_split(body, cuts))
+        assert items == expected_items
+        assert current == expected_current
+    current, items = _parse([body[index:index + 1] for index in range(len(body))])
+    assert items == expected_items
+    assert current == expected_current
+
+
+def test_numbers_split_at_chunk_boundaries():
+    body = _listing()
+    for number in (b'1234567998124', b'1234567890123', b'98765'):
+        start = body.index(number)
+        for cut in range(start + 1, start + len(number)):
+            current, items = _parse(_split(body, [cut]))
+            assert current.size == 1234567998124
+            assert [item.size for item in items] == [1234567890123, 7, 4096, 0, 98765]
+
+
+def test_multibyte_characters_split_across_chunks():
+    body = _listing()
+    name = 'Übersicht 日本語 😀.txt'
+    start = body.index(name.encode('utf-8'))
+    for cut in range(start + 1, start + len(name.encode('utf-8'))):
+        _, items = _parse(_split(body, [cut]))
+        assert items[1].name == name
+    # every byte of the four byte emoji in its own chunk
+    emoji = body.index('😀'.encode('utf-8'))
+    _, items = _parse(_split(body, range(emoji, emoji + 5)))
+    assert items[1].name == name
+
+
+def test_truncated_body_fails_on_close():
+    body = _listing()
+    for length in (0, 1, len(body) // 2, body.index(b'1234567998124') + 5, len(body) - 1):
+        parser = ListingParser()
+        parser.feed(body[:length])
+        with pytest.raises(ValueError):
+            parser.close()
+        assert parser.current is None
+    # the body ends inside a multibyte character
+    name = 'Übersicht'.encode('utf-8')
+    parser = ListingParser()
+    parser.feed(body[:body.index(name) + 1])
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_trailing_data():
+    body = _listing()
+    current, _ = _parse([body, b' \r\n\t'])
+    assert current.name == 'data'
+    for garbage in (b'x', b' {}', b',', b'\n]'):
+        with pytest.raises(ValueError):
+            _parse([body + garbage])
+        with pytest.raises(ValueError):
+            _parse([body, garbage])
@@ -0,0 +1,120 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmark'))
+
+import MetadataCache as metadata_cache  # noqa: E402
+from FileBrowserClient import FileBrowserClient  # noqa: E402
+from FileItem import FileItem  # noqa: E402
+from MetadataCache import MetadataCache  # noqa: E402
+from fake_filebrowser import FakeFileBrowser  # noqa: E402
+
+
+def _item(path, is_dir=False):
+    name = path.rstrip('/').rsplit('/', 1)[-1]
+    return FileItem(name, 0, path, '', '2024-01-01T00:00:00Z', 420, is_dir, False, '' if is_dir else 'blob')
+
+
+def _listing(path, *names):
+    return _item(path, is_dir=True), [_item(f'{path.rstrip("/")}/{name}') for name in names]
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(metadata_cache.time, 'monotonic', clock)
+    cache = MetadataCache(ttl=30.0)
+    cache.put('/data', *_listing('/data', 'a.bin'))
+
+    clock.now += 29.9
+    assert cache.get('data/') is not None
+    assert cache.exists('/data/a.bin') is True
+    clock.now += 0.2
+    assert cache.get('/data') is None
+    assert cache.exists('/data/a.bin') is None
+    assert cache.stats() == {'entries': 0, 'hits': 2, 'misses': 2, 'evictions': 0}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = MetadataCache(max_entries=2)
+    cache.put('/a', *_listing('/a'))
+    cache.put('/b', *_listing('/b'))
+    # reading /a makes /b the least recently used one
+    assert cache.get('/a') is not None
+    cache.put('/c', *_listing('/c'))
+    assert cache.get('/b') is None
+    assert cache.get('/a') is not None
+    assert cache.get('/c') is not None
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['entries'] == 2
+
+
+def test_exists_is_answered_from_the_parent_listing():
+    cache = MetadataCache()
+    assert cache.exists('/') is True
+    assert cache.exists('/data/a.bin') is None
+    cache.put('/data', *_listing('/data', 'a.bin', 'b.bin'))
+    assert cache.exists('/data/a.bin') is True
+    assert cache.exists('//data/./b.bin/') is True
+    assert cache.exists('/data/c.bin') is False
+    # a file has no children to answer from
+    cache.put('/data/a.bin', _item('/data/a.bin'), [])
+    assert cache.exists('/data/a.bin/x') is None
+
+
+def test_record_write_invalidates_the_path_and_updates_its_parents():
+    cache = MetadataCache()
+    cache.put('/', *_listing('/', 'data'))
+    cache.put('/data', *_listing('/data', 'a.bin'))
+    cache.put('/data/sub', *_listing('/data/sub', 'x'))
+    cache.put('/other', *_listing('/other', 'y'))
+
+    cache.record_write('/data/sub')
+    assert cache.get('/data/sub') is None
+    assert cache.exists('/data/sub/x') is None
+    # the parent listing is outdated, its names still answer existence checks
+    assert cache.get('/data') is None
+    assert cache.exists('/data/sub') is True
+    assert cache.exists('/data/a.bin') is True
+    assert cache.get('/other') is not None
+
+    # a created path also creates its missing parents
+    cache.record_write('/data/new/deep/file.bin')
+    assert cache.exists('/data/new') is True
+
+    cache.record_write('/data/a.bin', exists=False)
+    assert cache.exists('/data/a.bin') is False
+    assert cache.exists('/data') is True
+
+    # the root drops everything
+    cache.record_write('/')
+    assert cache.stats()['entries'] == 0
+
+
+def test_client_checks_siblings_with_one_listing(tmp_path):
+    with FakeFileBrowser(root=str(tmp_path)) as server:
+        os.makedirs(os.path.join(server.root, 'data'))
+        for name in ('a.bin', 'b.bin'):
+            with open(os.path.join(server.root, 'data', name), 'wb') as file:
+                file.write(b'x')
+        with FileBrowserClient(server.home_url, server.username, server.password,
+                               cache=MetadataCache()) as client:
+            client.authenticate()
+            before = server.stats['GET /api/resources']
+            assert client.check_remote_exists('/data/a.bin')
+            assert client.check_remote_exists('/data/b.bin')
+            assert not client.check_remote_exists('/data/c.bin')
+            assert server.stats['GET /api/resources'] - before == 1
+
+            client.delete_file('/data/b.bin')
+            assert not client.check_remote_exists('/data/b.bin')
+            assert server.stats['GET /api/resources'] - before == 1
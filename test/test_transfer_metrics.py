@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from TransferMetrics import RequestMetrics, percentile  # noqa: E402
+
+
+def test_percentile_of_no_values():
+    assert percentile([], 0.5) is None
+
+
+@pytest.mark.parametrize('fraction', [0.0, 0.01, 0.5, 0.99, 1.0])
+def test_percentile_of_one_value(fraction):
+    assert percentile([42], fraction) == 42
+
+
+def test_percentile_edges():
+    values = list(range(1, 11))
+    assert percentile(values, 0.0) == 1
+    assert percentile(values, 1.0) == 10
+    # out of range fractions are clamped to the first and last value
+    assert percentile(values, -0.5) == 1
+    assert percentile(values, 1.5) == 10
+
+
+# nearest rank: the smallest value with at least fraction of the values at or below it
+@pytest.mark.parametrize('fraction, expected', [(0.1, 1), (0.11, 2), (0.5, 5), (0.51, 6), (0.95, 10), (0.99, 10)])
+def test_percentile_nearest_rank(fraction, expected):
+    assert percentile(list(range(1, 11)), fraction) == expected
+
+
+def test_percentile_is_exact_for_fractions_without_a_float_representation():
+    values = list(range(1, 101))
+    assert percentile(values, 0.07) == 7
+    assert percentile(values, 0.95) == 95
+    assert percentile(values, 0.99) == 99
+
+
+def test_summary_latency_percentiles():
+    metrics = RequestMetrics()
+    for milliseconds in (40, 10, 30, 20):
+        metrics.record('GET', '/api/resources', 200, milliseconds / 1000, 0, 100)
+    metrics.record('PATCH', '/api/tus', 500, 0.05, 10, 0)
+    summary = metrics.summary()
+    assert (summary['requests'], summary['http_errors'], summary['bytes_received']) == (5, 1, 400)
+    assert summary['latency_p50_ms'] == 30.0
+    assert summary['latency_p99_ms'] == 50.0
+    assert RequestMetrics().summary()['latency_p50_ms'] is None
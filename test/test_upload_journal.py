@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmark'))
+
+from ChunkSizer import AdaptiveChunkSizer  # noqa: E402
+from FileBrowserClient import FileBrowserClient, FileBrowserError  # noqa: E402
+from UploadJournal import UploadJournal  # noqa: E402
+from fake_filebrowser import FakeFileBrowser  # noqa: E402
+
+CHUNK = 65536
+
+
+def test_adaptive_upload_smaller_than_the_max_chunk_resumes(tmp_path):
+    local_path = tmp_path / 'data.bin'
+    data = os.urandom(3 * CHUNK + 100)
+    local_path.write_bytes(data)
+    journal_path = str(tmp_path / 'journal.json')
+
+    with FakeFileBrowser(root=str(tmp_path / 'server')) as server:
+        with FileBrowserClient(server.home_url, server.username, server.password,
+                               journal=UploadJournal(journal_path),
+                               chunk_sizer=AdaptiveChunkSizer(CHUNK, 64 * CHUNK, initial_size=CHUNK)) as client:
+            client.authenticate()
+            send_chunk = client._upload_chunk
+
+            # the connection drops after the first chunk
+            def fail_after_first(request_url, chunk, offset, *args):
+                if offset:
+                    raise FileBrowserError('Max attempts reached while processing chunk. Aborting.', 16)
+                return send_chunk(request_url, chunk, offset, *args)
+
+            client._upload_chunk = fail_after_first
+            # the nominal chunk size is the sizer's maximum, larger than the whole file
+            with pytest.raises(FileBrowserError):
+                client.upload_file(str(local_path), '/data.bin', chunk_size=64 * CHUNK)
+            entry = UploadJournal(journal_path).get(client.api_url, 'data.bin')
+            assert entry is not None
+            assert os.path.getsize(os.path.join(server.root, 'data.bin')) == CHUNK
+
+            client._upload_chunk = send_chunk
+            client.upload_file(str(local_path), '/data.bin', chunk_size=64 * CHUNK)
+            assert server.stats['POST /api/tus'] == 1
+            assert UploadJournal(journal_path).get(client.api_url, 'data.bin') is None
+
+        with open(os.path.join(server.root, 'data.bin'), 'rb') as file:
+            assert file.read() == data